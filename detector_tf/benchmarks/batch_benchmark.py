@@ -0,0 +1,51 @@
+'''
+Throughput of ``TensorflowObjectDetector`` on CPU when frames are run in
+batches of 1, 4 and 8: the detector is given lists of frames, as produced by
+``BatchProducer``, and runs a single ``session.run`` per list.
+The model is downloaded on the first run, unless a local one is given.
+
+Usage: python batch_benchmark.py [--frames 64] [--batch-sizes 1 4 8] [--architecture ssd-mobilenetv2] [--path-to-pb-file model.pb]
+'''
+import argparse
+import timeit
+
+import numpy as np
+from videoflow.core.constants import CPU
+
+from videoflow_contrib.detector_tf import TensorflowObjectDetector
+
+def run(detector, frames, batch_size):
+    '''
+    Gives ``frames`` to ``detector.process`` in lists of ``batch_size`` and returns \
+        the frames per second.
+    '''
+    start = timeit.default_timer()
+    for i in range(0, len(frames), batch_size):
+        detector.process(frames[i:i + batch_size])
+    return len(frames) / (timeit.default_timer() - start)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frames', type = int, default = 64)
+    parser.add_argument('--batch-sizes', type = int, nargs = '+', default = [1, 4, 8])
+    parser.add_argument('--architecture', default = 'ssd-mobilenetv2')
+    parser.add_argument('--path-to-pb-file', default = None)
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(0)
+    frames = [rng.randint(0, 255, size = (480, 640, 3), dtype = np.uint8) for _ in range(args.frames)]
+    detector = TensorflowObjectDetector(path_to_pb_file = args.path_to_pb_file, architecture = args.architecture,
+        dataset = 'coco', device_type = CPU)
+    detector.open()
+    print(f'{"batch size":>10} {"frames/s":>9} {"gain":>6}')
+    reference = None
+    for batch_size in args.batch_sizes:
+        # Warm up
+        run(detector, frames[:batch_size], batch_size)
+        fps = run(detector, frames, batch_size)
+        reference = reference or fps
+        print(f'{batch_size:>10} {fps:>9.1f} {fps / reference:>6.2f}')
+    detector.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import time
+
+import pytest
+
+from videoflow.core.node import ProducerNode
+from videoflow.producers import IntProducer
+from videoflow_contrib.detector_tf import BatchProducer
+
+class SlowProducer(ProducerNode):
+    '''
+    Produces ``0, 1, ...`` with the given delays in seconds before each item, \
+        then raises ``error`` if it is not None.
+    '''
+    def __init__(self, delays, error = None):
+        self._delays = list(delays)
+        self._error = error
+        self._nb_items = 0
+        self.closed = False
+        super(SlowProducer, self).__init__()
+
+    def close(self):
+        self.closed = True
+
+    def next(self):
+        if self._nb_items == len(self._delays):
+            if self._error is not None:
+                raise self._error
+            raise StopIteration()
+        time.sleep(self._delays[self._nb_items])
+        self._nb_items += 1
+        return self._nb_items - 1
+
+def produce_all(producer):
+    producer.open()
+    items = []
+    try:
+        while True:
+            try:
+                items.append(producer.next())
+            except StopIteration:
+                break
+    finally:
+        producer.close()
+    return items
+
+@pytest.mark.parametrize('timeout', [None, 1000])
+def test_batch_producer_groups_items_in_order(timeout):
+    batches = produce_all(BatchProducer(IntProducer(0, 9), batch_size = 4, timeout = timeout))
+    assert batches == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]]
+
+def test_batch_producer_rejects_invalid_arguments():
+    with pytest.raises(ValueError):
+        BatchProducer(IntProducer(0, 9), batch_size = 0)
+    with pytest.raises(ValueError):
+        BatchProducer(IntProducer(0, 9), batch_size = 4, timeout = -1)
+
+def test_batch_producer_does_not_wait_longer_than_timeout():
+    # Items 3 and 6 come late: the lists before them are produced on timeout
+    delays = [0, 0, 0, 0.5, 0, 0, 0.5, 0]
+    producer = SlowProducer(delays)
+    batches = produce_all(BatchProducer(producer, batch_size = 8, timeout = 100))
+    assert batches == [[0, 1, 2], [3, 4, 5], [6, 7]]
+    assert producer.closed
+
+def test_batch_producer_without_timeout_waits_for_full_lists():
+    producer = SlowProducer([0, 0, 0, 0.2, 0, 0, 0.2, 0])
+    batches = produce_all(BatchProducer(producer, batch_size = 8))
+    assert batches == [list(range(8))]
+
+def test_batch_producer_raises_errors_of_producer_after_its_items():
+    producer = BatchProducer(SlowProducer([0, 0], error = RuntimeError('camera lost')), batch_size = 4, timeout = 100)
+    producer.open()
+    assert producer.next() == [0, 1]
+    with pytest.raises(RuntimeError):
+        producer.next()
+    producer.close()
+
+def test_batch_producer_closes_while_producer_is_ahead():
+    producer = SlowProducer([0] * 100)
+    batcher = BatchProducer(producer, batch_size = 2, timeout = 100)
+    batcher.open()
+    assert batcher.next() == [0, 1]
+    batcher.close()
+    assert producer.closed
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,43 @@
+import pytest
+
+import numpy as np
+
+# The detector imports tensorflow
+pytest.importorskip('tensorflow')
+
+from videoflow.core.constants import CPU
+from videoflow_contrib.detector_tf import TensorflowObjectDetector
+
+class FakeModel:
+    '''
+    Detects one box per frame, at the mean of the frame, and a second one \
+        below the score threshold.
+    '''
+    def __init__(self):
+        self.batch_sizes = []
+
+    def run_on_input(self, batch):
+        self.batch_sizes.append(len(batch))
+        n = len(batch)
+        means = batch.reshape(n, -1).mean(axis = 1) / 255.
+        boxes = np.stack([np.stack([means] * 4, axis = 1), np.zeros((n, 4))], axis = 1)
+        scores = np.stack([np.full(n, 0.9), np.full(n, 0.1)], axis = 1)
+        classes = np.ones((n, 2))
+        return boxes, scores, classes, np.full(n, 2)
+
+def test_detector_runs_lists_in_one_run_per_shape():
+    detector = TensorflowObjectDetector(path_to_pb_file = 'model.pb', device_type = CPU)
+    detector._tensorflow_model = FakeModel()
+    frames = [np.full((20 + 10 * (i % 2), 40, 3), i * 20, dtype = np.uint8) for i in range(8)]
+    dets = detector.process(frames)
+    assert sorted(detector._tensorflow_model.batch_sizes) == [4, 4]
+    assert len(dets) == len(frames)
+    for frame, d in zip(frames, dets):
+        h, w, _ = frame.shape
+        mean = frame[0, 0, 0] / 255.
+        assert d.shape == (1, 6)
+        assert np.allclose(d[0], [mean * h, mean * w, mean * h, mean * w, 1, 0.9])
+        assert np.allclose(detector.process(frame), d)
+
+if __name__ == "__main__":
+    pytest.main([__file__])
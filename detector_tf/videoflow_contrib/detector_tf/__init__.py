@@ -1,3 +1,6 @@
 from contextlib import suppress
 
-from .tf_object_detector import TensorflowObjectDetector, TfliteObjectDetector, BASE_URL_DETECTION
\ No newline at end of file
+from .batching import BatchProducer
+
+with suppress(ImportError):
+    from .tf_object_detector import TensorflowObjectDetector, TfliteObjectDetector, BASE_URL_DETECTION
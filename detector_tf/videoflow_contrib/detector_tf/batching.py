@@ -0,0 +1,144 @@
+'''
+Batching of frames inside the flow: a producer that groups the items of
+another producer into lists, so that nodes down the flow (such as
+``TensorflowObjectDetector``) can run a whole list at once.
+
+Videoflow nodes return one output per input, so lists cannot be split back
+into single items further down the flow: every node that receives the lists,
+directly or through other nodes, must accept lists. ``TensorflowObjectDetector``
+is the node of this package that does.
+'''
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import queue
+import threading
+import timeit
+
+from videoflow.core.node import ProducerNode
+
+# How often, in seconds, the reading thread checks that the node is not closed
+# while the list of items waiting to be batched is full
+_POLL_INTERVAL = 0.1
+
+class _EndOfItems:
+    '''
+    Put in the queue once the items of the producer run out, with the \
+        exception raised by the producer if it failed.
+    '''
+    def __init__(self, error = None):
+        self.error = error
+
+class BatchProducer(ProducerNode):
+    '''
+    Produces lists of up to ``batch_size`` consecutive items of ``producer``, \
+        in order. The last list is shorter if the items of ``producer`` run out.
+
+    With ``timeout``, a list is also produced once ``timeout`` milliseconds \
+        have passed since its first item arrived, even if it holds less than \
+        ``batch_size`` items, so that a slow producer (such as a live camera) \
+        does not hold frames back. Items of ``producer`` are then read in a \
+        background thread.
+
+    Every node that receives the lists must accept lists: \
+        ``TensorflowObjectDetector.process`` given a list of frames returns \
+        the list of their detections.
+
+    - Arguments:
+        - producer (ProducerNode): producer of the items to batch. It is opened \
+            and closed with this node, and must not be part of the flow itself.
+        - batch_size (int): largest number of items in a list
+        - timeout (float): If None, lists wait until they hold ``batch_size`` \
+            items. Otherwise the longest time in milliseconds that a list waits \
+            for more items after its first one.
+    '''
+    def __init__(self, producer, batch_size, timeout = None):
+        if batch_size < 1:
+            raise ValueError('batch_size must be at least 1')
+        if timeout is not None and timeout < 0:
+            raise ValueError('timeout cannot be negative')
+        self._producer = producer
+        self._batch_size = batch_size
+        self._timeout = timeout
+        self._queue = None
+        self._thread = None
+        self._closed = None
+        super(BatchProducer, self).__init__()
+
+    def open(self):
+        self._producer.open()
+        if self._timeout is not None:
+            self._queue = queue.Queue(maxsize = self._batch_size)
+            self._closed = threading.Event()
+            self._thread = threading.Thread(target = self._read, daemon = True)
+            self._thread.start()
+
+    def close(self):
+        if self._thread is not None:
+            self._closed.set()
+            self._thread.join()
+            self._thread = None
+        self._producer.close()
+
+    def _read(self):
+        '''
+        Puts the items of ``producer`` in the queue, followed by ``_EndOfItems``.
+        '''
+        item = self._producer_next()
+        while not self._closed.is_set():
+            try:
+                self._queue.put(item, timeout = _POLL_INTERVAL)
+            except queue.Full:
+                continue
+            if isinstance(item, _EndOfItems):
+                return
+            item = self._producer_next()
+
+    def _producer_next(self):
+        try:
+            return self._producer.next()
+        except StopIteration:
+            return _EndOfItems()
+        except Exception as error:
+            return _EndOfItems(error)
+
+    def _next_with_timeout(self) -> list:
+        items = []
+        item = self._queue.get()
+        deadline = timeit.default_timer() + self._timeout / 1000.
+        while not isinstance(item, _EndOfItems):
+            items.append(item)
+            if len(items) == self._batch_size:
+                return items
+            try:
+                item = self._queue.get(timeout = max(deadline - timeit.default_timer(), 0))
+            except queue.Empty:
+                return items
+        # Following calls also find the end of the items
+        self._queue.put(item)
+        if items:
+            return items
+        if item.error is not None:
+            raise item.error
+        raise StopIteration()
+
+    def next(self) -> list:
+        '''
+        - Returns:
+            - items: list of up to ``batch_size`` items of ``producer``
+
+        - Raises:
+            - StopIteration: once all the items of ``producer`` have been returned
+        '''
+        if self._timeout is not None:
+            return self._next_with_timeout()
+        items = []
+        while len(items) < self._batch_size:
+            try:
+                items.append(self._producer.next())
+            except StopIteration:
+                break
+        if not items:
+            raise StopIteration()
+        return items
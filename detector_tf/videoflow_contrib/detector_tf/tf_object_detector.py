@@ -91,6 +91,10 @@ class TensorflowObjectDetector(ObjectDetector):
         - architecture (str): One of the architectures mentioned in the tables above.
         - dataset (str): `coco`, `kitti` and `oidv4` are accepted.
         - min_score_threshold (float): detection will filter out entries with score below threshold score
+
+    ``process`` also accepts a list of frames, such as the lists produced by \
+    ``BatchProducer``. The frames of the same shape are then stacked and run with a \
+    single ``session.run``, and it returns the list of the detections of each frame.
     '''
     supported_models = [
         "ssd-mobilenetv2_coco",
@@ -163,16 +167,48 @@ class TensorflowObjectDetector(ObjectDetector):
             - dets: np.array of shape (nb_boxes, 6) \
                 Specifically (nb_boxes, [ymin, xmin, ymax, xmax, class_index, score])
         '''
-        h, w, _ = im.shape
-        im_expanded = np.expand_dims(im, axis = 0)
-        boxes, scores, classes, num = self._tensorflow_model.run_on_input(im_expanded)
-        boxes, scores, classes = np.squeeze(boxes, axis = 0), np.squeeze(scores, axis = 0), np.squeeze(classes, axis = 0)
+        return self._detect_batch([im])[0]
+
+    def process(self, im):
+        '''
+        - Arguments:
+            - im (np.array or list(np.array)): (h, w, 3), or a list of them
         
-        # boxes denormalization
-        boxes[:,[0, 2]] = boxes[:,[0, 2]] * h
-        boxes[:,[1, 3]] = boxes[:,[1, 3]] * w
+        - Returns:
+            - dets: np.array of shape (nb_boxes, 6) \
+                Specifically (nb_boxes, [ymin, xmin, ymax, xmax, class_index, score]). \
+                If ``im`` is a list, the list of the detections of each frame.
+        '''
+        if isinstance(im, list):
+            return self._detect_batch(im)
+        return self._detect(im)
 
-        indexes = np.where(scores > self._min_score_threshold)[0]
-        boxes, scores, classes = boxes[indexes], scores[indexes], classes[indexes]
-        scores, classes = np.expand_dims(scores, axis = 1), np.expand_dims(classes, axis = 1)
-        return np.concatenate((boxes, classes, scores), axis = 1)
+    def _detect_batch(self, ims) -> list:
+        '''
+        Runs the frames of the same shape in a single ``session.run``.
+
+        - Arguments:
+            - ims (list(np.array)): list of (h, w, 3)
+        
+        - Returns:
+            - dets_l: list of np.array of shape (nb_boxes, 6), the detections of \
+                each frame in the order of ``ims``
+        '''
+        dets_l = [None] * len(ims)
+        shapes = {}
+        for i, im in enumerate(ims):
+            shapes.setdefault(im.shape, []).append(i)
+
+        for (h, w, _), indexes in shapes.items():
+            batch = np.stack([ims[i] for i in indexes], axis = 0)
+            boxes_b, scores_b, classes_b, num_b = self._tensorflow_model.run_on_input(batch)
+            for i, boxes, scores, classes in zip(indexes, boxes_b, scores_b, classes_b):
+                # boxes denormalization
+                boxes[:,[0, 2]] = boxes[:,[0, 2]] * h
+                boxes[:,[1, 3]] = boxes[:,[1, 3]] * w
+
+                indexes_above = np.where(scores > self._min_score_threshold)[0]
+                boxes, scores, classes = boxes[indexes_above], scores[indexes_above], classes[indexes_above]
+                scores, classes = np.expand_dims(scores, axis = 1), np.expand_dims(classes, axis = 1)
+                dets_l[i] = np.concatenate((boxes, classes, scores), axis = 1)
+        return dets_l
@@ -0,0 +1,37 @@
+from setuptools import setup
+from setuptools import find_packages
+import os.path
+
+name = 'videoflow_contrib_features'
+install_requires = [
+    'numpy'
+]
+
+setup(name=name,
+      version='0.1',
+      description='Nearest neighbor indexes and compression of appearance features',
+      author='Jadiel de Armas',
+      author_email='jadielam@gmail.com',
+      url='https://github.com/videoflow/videoflow-contrib',
+      license='MIT',
+      packages = ['videoflow_contrib.features'],
+      zip_safe = False,
+      install_requires=install_requires,
+      extras_require={
+          'tests': ['pytest',
+                    'pytest-pep8',
+                    'pytest-xdist',
+                    'pytest-cov'],
+      },
+      classifiers=[
+          'Development Status :: 3 - Alpha',
+          'Intended Audience :: Developers',
+          'Intended Audience :: Education',
+          'Intended Audience :: Science/Research',
+          'License :: OSI Approved :: MIT License',
+          'Programming Language :: Python :: 3',
+          'Programming Language :: Python :: 3.6',
+          'Topic :: Software Development :: Libraries',
+          'Topic :: Software Development :: Libraries :: Python Modules'
+      ]
+)
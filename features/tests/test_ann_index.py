@@ -0,0 +1,73 @@
+import pytest
+
+import numpy as np
+from videoflow_contrib.features import ann_index
+from videoflow_contrib.features.ann_index import index_factory
+
+INDEXES = [
+    ('exact', {}),
+    ('ivf', {'nb_lists': 16, 'nb_probes': 16, 'nb_training_vectors': 512}),
+    ('ivf', {'nb_lists': 16, 'nb_probes': 4, 'nb_subquantizers': 8, 'nb_training_vectors': 512}),
+]
+if ann_index.faiss is not None:
+    INDEXES.append(('faiss', {'description': 'Flat'}))
+    INDEXES.append(('faiss', {'description': 'IVF16,Flat', 'nb_probes': 16, 'nb_training_vectors': 512}))
+
+def clustered_data(nb_vectors, dim, seed):
+    rng = np.random.RandomState(seed)
+    centers = rng.normal(size = (nb_vectors, dim)).astype(np.float32)
+    vectors = centers + 0.1 * rng.normal(size = centers.shape).astype(np.float32)
+    queries = centers + 0.1 * rng.normal(size = centers.shape).astype(np.float32)
+    return vectors, queries
+
+def brute_force(vectors, queries, metric):
+    if metric == 'cosine':
+        vectors = vectors / np.linalg.norm(vectors, axis = 1, keepdims = True)
+        queries = queries / np.linalg.norm(queries, axis = 1, keepdims = True)
+        return 1. - queries @ vectors.T
+    return np.square(queries[:, None] - vectors[None]).sum(axis = 2)
+
+@pytest.mark.parametrize('metric', ['cosine', 'euclidean'])
+def test_exact_index_matches_brute_force(metric):
+    vectors, queries = clustered_data(300, 16, 0)
+    index = index_factory('exact', metric)
+    index.add(np.arange(300) * 10, vectors)
+    distances, ids = index.search(queries[:50], 5)
+    expected = brute_force(vectors, queries[:50], metric)
+    expected_ids = np.argsort(expected, axis = 1)[:, :5]
+    assert np.array_equal(ids, expected_ids * 10)
+    assert np.allclose(distances, np.take_along_axis(expected, expected_ids, axis = 1), atol = 1e-4)
+
+@pytest.mark.parametrize('index_type, params', INDEXES)
+def test_index_recall_add_and_remove(index_type, params):
+    vectors, queries = clustered_data(2000, 32, 1)
+    index = index_factory(index_type, 'cosine', **params)
+    for start in range(0, 2000, 250):
+        index.add(np.arange(start, start + 250), vectors[start:start + 250])
+    assert len(index) == 2000
+    _, ids = index.search(queries, 1)
+    assert np.mean(ids[:, 0] == np.arange(2000)) > 0.9
+
+    index.remove(np.arange(0, 2000, 2))
+    index.remove([-5, 0])
+    assert len(index) == 1000
+    _, ids = index.search(queries, 3)
+    assert np.all(ids[ids >= 0] % 2 == 1)
+
+    # Adding an id that is stored replaces its vector
+    index.add([1], vectors[4])
+    assert len(index) == 1000
+    _, ids = index.search(queries[4:5], 1)
+    assert ids[0, 0] == 1
+
+def test_search_pads_missing_neighbors():
+    index = index_factory('exact')
+    distances, ids = index.search(np.ones((2, 4)), 3)
+    assert np.all(ids == -1) and np.all(np.isinf(distances))
+    index.add([7], np.ones((1, 4)))
+    distances, ids = index.search(np.ones((2, 4)), 3)
+    assert ids[:, 0].tolist() == [7, 7] and np.all(ids[:, 1:] == -1)
+    assert np.allclose(distances[:, 0], 0., atol = 1e-6)
+
+if __name__ == "__main__":
+    pytest.main([__file__])
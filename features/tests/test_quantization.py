@@ -0,0 +1,20 @@
+import pytest
+
+import numpy as np
+from videoflow_contrib.features.quantization import check_dtype, quantize, dequantize
+
+def test_quantize_round_trip_and_idempotence():
+    rng = np.random.RandomState(0)
+    features = rng.normal(size = (20, 64)) * rng.uniform(0.1, 10, size = (20, 1))
+    codes, scales = quantize(features, 'int8', return_scales = True)
+    assert codes.dtype == np.int8 and np.all(np.abs(codes).max(axis = 1) == 127)
+    assert np.allclose(dequantize(codes, scales), features, atol = scales.max())
+    assert np.array_equal(quantize(codes.astype(float), 'int8'), codes)
+    half = quantize(features, 'float16')
+    assert np.array_equal(quantize(half.astype(float), 'float16'), half)
+    assert quantize(np.zeros((0, 64)), 'int8').shape == (0, 64)
+    with pytest.raises(ValueError):
+        check_dtype('float64')
+
+if __name__ == "__main__":
+    pytest.main([__file__])
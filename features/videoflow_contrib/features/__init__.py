@@ -0,0 +1,2 @@
+from .ann_index import index_factory
+from .quantization import FEATURE_DTYPES, check_dtype, quantize, dequantize
@@ -0,0 +1,505 @@
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import numpy as np
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+'''
+Nearest neighbor indexes over feature vectors. All of them share the same
+interface:
+
+- ``add(ids, vectors)`` stores vectors under integer ids.  Storing an id that \
+    is already in the index replaces its vector.
+- ``remove(ids)`` forgets the given ids.  Ids that are not stored are ignored.
+- ``search(queries, k)`` returns ``(distances, ids)``, two np.array of shape \
+    (nb_queries, k) sorted by increasing distance.  Missing neighbors have id -1 \
+    and distance ``np.inf``.
+
+Distances are squared euclidean distances for the ``euclidean`` metric and \
+``1 - cosine similarity`` for the ``cosine`` metric.  For the ``cosine`` metric \
+vectors are normalized when they are stored, so that it reduces to half the \
+squared euclidean distance between unit vectors.
+'''
+
+METRICS = ('euclidean', 'cosine')
+
+def _check_metric(metric):
+    if metric not in METRICS:
+        raise ValueError("Invalid metric {}; must be one of {}".format(metric, METRICS))
+
+def _prepare(vectors, metric):
+    vectors = np.asarray(vectors, dtype = np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors.reshape(1, -1)
+    if metric == 'cosine':
+        norms = np.linalg.norm(vectors, axis = 1, keepdims = True)
+        vectors = vectors / np.maximum(norms, np.finfo(np.float32).tiny)
+    return np.ascontiguousarray(vectors)
+
+def _from_sq_l2(distances, metric):
+    return distances / 2. if metric == 'cosine' else distances
+
+def _sq_l2(a, b, b_sq_norms = None):
+    '''
+    Squared euclidean distance between the rows of ``a`` and ``b``, as an \
+        np.array of shape (len(a), len(b))
+    '''
+    if b_sq_norms is None:
+        b_sq_norms = np.square(b).sum(axis = 1)
+    d = np.square(a).sum(axis = 1)[:, None] - 2. * (a @ b.T) + b_sq_norms[None, :]
+    return np.maximum(d, 0., out = d)
+
+def _top_k(distances, ids, k):
+    '''
+    Keeps the ``k`` smallest ``distances`` of each row, sorted, padding with \
+        -1 ids and ``np.inf`` distances.
+    '''
+    nb_rows, nb_cols = distances.shape
+    if nb_cols > k:
+        part = np.argpartition(distances, k - 1, axis = 1)[:, :k]
+        distances = np.take_along_axis(distances, part, axis = 1)
+        ids = np.take_along_axis(ids, part, axis = 1)
+    order = np.argsort(distances, axis = 1, kind = 'stable')
+    distances = np.take_along_axis(distances, order, axis = 1)
+    ids = np.take_along_axis(ids, order, axis = 1)
+    ids = np.where(np.isfinite(distances), ids, -1)
+    if nb_cols < k:
+        distances = np.concatenate([distances, np.full((nb_rows, k - nb_cols), np.inf, dtype = distances.dtype)], axis = 1)
+        ids = np.concatenate([ids, np.full((nb_rows, k - nb_cols), -1, dtype = ids.dtype)], axis = 1)
+    return distances, ids
+
+def kmeans(vectors, nb_clusters, nb_iterations = 20, seed = 0):
+    '''
+    Lloyd's k-means.  Clusters that become empty are reseeded with the point \
+        that is farthest from its centroid.
+
+    - Arguments:
+        - vectors: np.array of shape (n, dim)
+        - nb_clusters: number of clusters. It must be <= n
+
+    - Returns:
+        - centroids: np.array of shape (nb_clusters, dim)
+    '''
+    rng = np.random.RandomState(seed)
+    centroids = vectors[rng.choice(len(vectors), nb_clusters, replace = False)].copy()
+    for _ in range(nb_iterations):
+        distances = _sq_l2(vectors, centroids)
+        assignment = distances.argmin(axis = 1)
+        counts = np.bincount(assignment, minlength = nb_clusters)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        non_empty = counts > 0
+        centroids[non_empty] = sums[non_empty] / counts[non_empty, None]
+        empty = np.flatnonzero(~non_empty)
+        if len(empty):
+            farthest = np.argsort(distances[np.arange(len(vectors)), assignment])[::-1]
+            centroids[empty] = vectors[farthest[:len(empty)]]
+    return centroids
+
+class _VectorStore(object):
+    '''
+    Growable table of stored items.  Removed positions are recycled by later adds.
+    '''
+    def __init__(self, fields, capacity = 1024):
+        '''
+        - Arguments:
+            - fields: dict of field name -> (shape of one item, dtype)
+        '''
+        self._fields = fields
+        self.ids = np.full(capacity, -1, dtype = np.int64)
+        self.alive = np.zeros(capacity, dtype = bool)
+        for name, (shape, dtype) in fields.items():
+            setattr(self, name, np.zeros((capacity,) + shape, dtype = dtype))
+        self._positions = {}
+        self._free = list(range(capacity - 1, -1, -1))
+
+    def __len__(self):
+        return len(self._positions)
+
+    def _grow(self, capacity):
+        old_capacity = len(self.ids)
+        self.ids = np.r_[self.ids, np.full(capacity - old_capacity, -1, dtype = np.int64)]
+        self.alive = np.r_[self.alive, np.zeros(capacity - old_capacity, dtype = bool)]
+        for name, (shape, dtype) in self._fields.items():
+            grown = np.zeros((capacity,) + shape, dtype = dtype)
+            grown[:old_capacity] = getattr(self, name)
+            setattr(self, name, grown)
+        self._free = list(range(capacity - 1, old_capacity - 1, -1)) + self._free
+
+    def remove(self, ids):
+        '''
+        Returns the positions that were freed
+        '''
+        positions = [self._positions.pop(i) for i in np.asarray(ids).tolist() if i in self._positions]
+        positions = np.array(positions, dtype = int)
+        self.alive[positions] = False
+        self.ids[positions] = -1
+        self._free.extend(positions.tolist())
+        return positions
+
+    def add(self, ids):
+        '''
+        Returns the positions assigned to ``ids``. Ids must be unique and not stored.
+        '''
+        ids = np.asarray(ids, dtype = np.int64)
+        if len(self._free) < len(ids):
+            capacity = len(self.ids)
+            while capacity - len(self._positions) < len(ids):
+                capacity *= 2
+            self._grow(capacity)
+        positions = np.array([self._free.pop() for _ in range(len(ids))], dtype = int)
+        self._positions.update(zip(ids.tolist(), positions.tolist()))
+        self.ids[positions] = ids
+        self.alive[positions] = True
+        return positions
+
+def _unique_last(ids, vectors):
+    '''
+    Keeps the last occurrence of every id
+    '''
+    ids = np.asarray(ids, dtype = np.int64).reshape(-1)
+    _, last = np.unique(ids[::-1], return_index = True)
+    keep = np.sort(len(ids) - 1 - last)
+    return ids[keep], vectors[keep]
+
+class ExactIndex(object):
+    '''
+    Brute force index: every search scans all the stored vectors with a single \
+        matrix product.  It is the reference the approximate indexes are \
+        measured against.
+
+    - Arguments:
+        - metric: ``cosine`` or ``euclidean``
+    '''
+    def __init__(self, metric = 'cosine'):
+        _check_metric(metric)
+        self.metric = metric
+        self._store = None
+
+    def __len__(self):
+        return 0 if self._store is None else len(self._store)
+
+    def add(self, ids, vectors):
+        vectors = _prepare(vectors, self.metric)
+        if len(vectors) == 0:
+            return
+        ids, vectors = _unique_last(ids, vectors)
+        if self._store is None:
+            dim = vectors.shape[1]
+            self._store = _VectorStore({'vectors': ((dim,), np.float32), 'sq_norms': ((), np.float32)})
+        self._store.remove(ids)
+        positions = self._store.add(ids)
+        self._store.vectors[positions] = vectors
+        self._store.sq_norms[positions] = np.square(vectors).sum(axis = 1)
+
+    def remove(self, ids):
+        if self._store is not None:
+            self._store.remove(ids)
+
+    def items(self):
+        '''
+        Returns the (ids, vectors) stored in the index
+        '''
+        if self._store is None:
+            return np.zeros((0,), dtype = np.int64), np.zeros((0, 0), dtype = np.float32)
+        alive = self._store.alive
+        return self._store.ids[alive], self._store.vectors[alive]
+
+    def search(self, queries, k = 1):
+        queries = _prepare(queries, self.metric)
+        if self._store is None or len(self._store) == 0:
+            return np.full((len(queries), k), np.inf, dtype = np.float32), np.full((len(queries), k), -1, dtype = np.int64)
+        store = self._store
+        distances = _sq_l2(queries, store.vectors, store.sq_norms)
+        distances[:, ~store.alive] = np.inf
+        ids = np.broadcast_to(store.ids, distances.shape)
+        distances, ids = _top_k(distances, ids, k)
+        return _from_sq_l2(distances, self.metric), ids
+
+class IVFIndex(object):
+    '''
+    Inverted file index.  Vectors are partitioned in ``nb_lists`` cells by a \
+        k-means coarse quantizer, and a search only scans the vectors of the \
+        ``nb_probes`` cells closest to the query.  With ``nb_subquantizers`` the \
+        vectors in the cells are stored as product quantization codes of \
+        ``nb_subquantizers`` bytes, and distances are computed from lookup tables \
+        instead of from the vectors.
+
+    Until ``nb_training_vectors`` vectors have been added, the index stores them \
+        as they are and searches them exhaustively.  The quantizers are then trained \
+        on the stored vectors, which are moved to their cells.
+
+    - Arguments:
+        - metric: ``cosine`` or ``euclidean``
+        - nb_lists: number of cells of the coarse quantizer
+        - nb_probes: number of cells scanned by a search
+        - nb_subquantizers: If None, vectors are stored as they are (IVF-Flat). \
+            Otherwise the number of bytes of each product quantization code. \
+            It must divide the dimension of the vectors.
+        - nb_training_vectors: number of vectors needed to train the quantizers. \
+            Defaults to ``max(32 * nb_lists, 256)``
+        - seed: seed of the k-means initialisation
+    '''
+    def __init__(self, metric = 'cosine', nb_lists = 64, nb_probes = 8, nb_subquantizers = None,
+                nb_training_vectors = None, seed = 0):
+        _check_metric(metric)
+        self.metric = metric
+        self.nb_lists = nb_lists
+        self.nb_probes = nb_probes
+        self.nb_subquantizers = nb_subquantizers
+        self.nb_training_vectors = nb_training_vectors if nb_training_vectors is not None else max(32 * nb_lists, 256)
+        self.seed = seed
+        self.centroids = None
+        self.codebooks = None
+        self._untrained = ExactIndex(metric)
+        self._cells = None
+        # id -> (cell, slot in the cell)
+        self._locations = {}
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    def __len__(self):
+        return len(self._locations) if self.is_trained else len(self._untrained)
+
+    def _train(self, vectors):
+        dim = vectors.shape[1]
+        self.centroids = kmeans(vectors, self.nb_lists, seed = self.seed)
+        if self.nb_subquantizers is None:
+            fields = {'vectors': ((dim,), np.float32), 'sq_norms': ((), np.float32)}
+        else:
+            if dim % self.nb_subquantizers != 0:
+                raise ValueError('nb_subquantizers must divide the dimension {}'.format(dim))
+            residuals = vectors - self.centroids[_sq_l2(vectors, self.centroids).argmin(axis = 1)]
+            sub_dim = dim // self.nb_subquantizers
+            nb_codes = min(256, len(vectors))
+            self.codebooks = np.stack([
+                kmeans(residuals[:, j * sub_dim:(j + 1) * sub_dim], nb_codes, seed = self.seed)
+                for j in range(self.nb_subquantizers)
+            ])
+            self._codebook_sq_norms = np.square(self.codebooks).sum(axis = 2)
+            fields = {'codes': ((self.nb_subquantizers,), np.uint8)}
+        self._cells = [_Cell(fields) for _ in range(self.nb_lists)]
+
+    def _encode(self, residuals):
+        sub_dim = self.codebooks.shape[2]
+        return np.stack([
+            _sq_l2(residuals[:, j * sub_dim:(j + 1) * sub_dim], self.codebooks[j]).argmin(axis = 1)
+            for j in range(self.nb_subquantizers)
+        ], axis = 1).astype(np.uint8)
+
+    def add(self, ids, vectors):
+        vectors = _prepare(vectors, self.metric)
+        if len(vectors) == 0:
+            return
+        ids, vectors = _unique_last(ids, vectors)
+        if not self.is_trained:
+            self._untrained.add(ids, vectors)
+            if len(self._untrained) < self.nb_training_vectors:
+                return
+            ids, vectors = self._untrained.items()
+            self._untrained = None
+            self._train(vectors)
+
+        self.remove(ids)
+        lists = _sq_l2(vectors, self.centroids).argmin(axis = 1)
+        if self.nb_subquantizers is None:
+            items = {'vectors': vectors, 'sq_norms': np.square(vectors).sum(axis = 1)}
+        else:
+            items = {'codes': self._encode(vectors - self.centroids[lists])}
+        order = np.argsort(lists, kind = 'stable')
+        bounds = np.searchsorted(lists[order], np.arange(self.nb_lists + 1))
+        for l in np.flatnonzero(bounds[1:] > bounds[:-1]).tolist():
+            in_cell = order[bounds[l]:bounds[l + 1]]
+            slots = self._cells[l].add(ids[in_cell], {k: v[in_cell] for k, v in items.items()})
+            self._locations.update(zip(ids[in_cell].tolist(), zip([l] * len(in_cell), slots.tolist())))
+
+    def remove(self, ids):
+        if not self.is_trained:
+            self._untrained.remove(ids)
+            return
+        for i in np.asarray(ids).reshape(-1).tolist():
+            location = self._locations.pop(i, None)
+            if location is None:
+                continue
+            l, slot = location
+            moved = self._cells[l].remove(slot)
+            if moved is not None:
+                self._locations[moved] = (l, slot)
+
+    def search(self, queries, k = 1):
+        if not self.is_trained:
+            return self._untrained.search(queries, k)
+        queries = _prepare(queries, self.metric)
+        nb_queries = len(queries)
+        nb_probes = min(self.nb_probes, self.nb_lists)
+        coarse = _sq_l2(queries, self.centroids)
+        probes = np.argpartition(coarse, nb_probes - 1, axis = 1)[:, :nb_probes]
+
+        # Each cell is scanned once for all the queries that probe it, and the
+        # best k of every (query, probed cell) pair are merged at the end.
+        best_distances = np.full((nb_queries, nb_probes, k), np.inf, dtype = np.float32)
+        best_ids = np.full((nb_queries, nb_probes, k), -1, dtype = np.int64)
+        flat_probes = probes.reshape(-1)
+        order = np.argsort(flat_probes, kind = 'stable')
+        bounds = np.searchsorted(flat_probes[order], np.arange(self.nb_lists + 1))
+        for l in np.flatnonzero(bounds[1:] > bounds[:-1]).tolist():
+            cell = self._cells[l]
+            if cell.size == 0:
+                continue
+            rows, cols = np.divmod(order[bounds[l]:bounds[l + 1]], nb_probes)
+            if self.nb_subquantizers is None:
+                distances = _sq_l2(queries[rows], cell.vectors[:cell.size], cell.sq_norms[:cell.size])
+            else:
+                # Lookup tables of the distances between the residual of each query
+                # to the cell and every code of every subquantizer.
+                sub_dim = self.codebooks.shape[2]
+                residuals = (queries[rows] - self.centroids[l]).reshape(len(rows), self.nb_subquantizers, 1, sub_dim)
+                tables = np.square(residuals).sum(axis = 3) + self._codebook_sq_norms[None] \
+                    - 2. * (residuals @ self.codebooks.transpose(0, 2, 1))[:, :, 0]
+                codes = cell.codes[:cell.size].astype(int)
+                distances = tables[:, np.arange(self.nb_subquantizers)[None], codes].sum(axis = 2)
+            ids = np.broadcast_to(cell.ids[:cell.size], distances.shape)
+            best_distances[rows, cols], best_ids[rows, cols] = _top_k(distances, ids, k)
+
+        distances, ids = _top_k(best_distances.reshape(nb_queries, -1), best_ids.reshape(nb_queries, -1), k)
+        return _from_sq_l2(distances, self.metric), ids
+
+class _Cell(object):
+    '''
+    Items of one inverted list, stored contiguously in buffers that double when full.
+    '''
+    def __init__(self, fields, capacity = 16):
+        '''
+        - Arguments:
+            - fields: dict of field name -> (shape of one item, dtype)
+        '''
+        self._fields = fields
+        self.size = 0
+        self.ids = np.zeros(capacity, dtype = np.int64)
+        for name, (shape, dtype) in fields.items():
+            setattr(self, name, np.zeros((capacity,) + shape, dtype = dtype))
+
+    def add(self, ids, items):
+        '''
+        Appends items and returns their slots
+        '''
+        size, nb_new = self.size, len(ids)
+        capacity = len(self.ids)
+        if size + nb_new > capacity:
+            while capacity < size + nb_new:
+                capacity *= 2
+            for name in ('ids',) + tuple(self._fields):
+                old = getattr(self, name)
+                grown = np.zeros((capacity,) + old.shape[1:], dtype = old.dtype)
+                grown[:size] = old[:size]
+                setattr(self, name, grown)
+        self.ids[size:size + nb_new] = ids
+        for name, values in items.items():
+            getattr(self, name)[size:size + nb_new] = values
+        self.size += nb_new
+        return np.arange(size, size + nb_new)
+
+    def remove(self, slot):
+        '''
+        Removes the item at ``slot`` by moving the last item into it. Returns \
+            the id of the item that was moved, or None.
+        '''
+        self.size -= 1
+        last = self.size
+        if slot == last:
+            return None
+        for name in ('ids',) + tuple(self._fields):
+            values = getattr(self, name)
+            values[slot] = values[last]
+        return int(self.ids[slot])
+
+class FaissIndex(object):
+    '''
+    Index backed by faiss.  It requires the ``faiss`` package.
+
+    - Arguments:
+        - metric: ``cosine`` or ``euclidean``
+        - description: faiss ``index_factory`` description of the index, for \
+            example ``Flat``, ``IVF256,Flat`` or ``IVF256,PQ16``
+        - nb_probes: number of cells scanned by a search of an IVF index
+        - nb_training_vectors: number of vectors to collect before training \
+            indexes that need it. Until then searches are exhaustive.
+    '''
+    def __init__(self, metric = 'cosine', description = 'Flat', nb_probes = 8, nb_training_vectors = 8192):
+        if faiss is None:
+            raise ImportError('FaissIndex requires the faiss package')
+        _check_metric(metric)
+        self.metric = metric
+        self.description = description
+        self.nb_probes = nb_probes
+        self.nb_training_vectors = nb_training_vectors
+        self._index = None
+        self._untrained = ExactIndex(metric)
+
+    def __len__(self):
+        return len(self._untrained) if self._index is None else self._index.ntotal
+
+    def _build(self, dim):
+        index = faiss.index_factory(dim, self.description)
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is None:
+            # Inverted file indexes store ids themselves, the others need a map.
+            return faiss.IndexIDMap2(index)
+        ivf.nprobe = self.nb_probes
+        return index
+
+    def add(self, ids, vectors):
+        vectors = _prepare(vectors, self.metric)
+        if len(vectors) == 0:
+            return
+        ids, vectors = _unique_last(ids, vectors)
+        if self._index is None:
+            index = self._build(vectors.shape[1])
+            if index.is_trained:
+                self._index = index
+            else:
+                self._untrained.add(ids, vectors)
+                if len(self._untrained) < self.nb_training_vectors:
+                    return
+                ids, vectors = self._untrained.items()
+                index.train(vectors)
+                self._index, self._untrained = index, None
+        self._index.remove_ids(ids)
+        self._index.add_with_ids(vectors, ids)
+
+    def remove(self, ids):
+        ids = np.asarray(ids, dtype = np.int64).reshape(-1)
+        if self._index is None:
+            self._untrained.remove(ids)
+        else:
+            self._index.remove_ids(ids)
+
+    def search(self, queries, k = 1):
+        if self._index is None:
+            return self._untrained.search(queries, k)
+        distances, ids = self._index.search(_prepare(queries, self.metric), k)
+        distances = np.where(ids >= 0, np.maximum(distances, 0.), np.inf).astype(np.float32)
+        return _from_sq_l2(distances, self.metric), ids
+
+def index_factory(index_type, metric = 'cosine', **kwargs):
+    '''
+    - Arguments:
+        - index_type: ``exact``, ``ivf`` or ``faiss``
+        - metric: ``cosine`` or ``euclidean``
+        - kwargs: passed on to the index class
+    '''
+    if index_type == 'exact':
+        return ExactIndex(metric, **kwargs)
+    elif index_type == 'ivf':
+        return IVFIndex(metric, **kwargs)
+    elif index_type == 'faiss':
+        return FaissIndex(metric, **kwargs)
+    else:
+        raise ValueError("Cannot identify index_type {}".format(index_type))
@@ -0,0 +1,61 @@
+'''
+Compression of feature vectors to float16 or int8 codes.
+
+int8 codes are the vectors scaled by their own ``127 / max(abs(vector))`` and
+rounded, so each vector uses the whole int8 range. The per-vector scale is
+returned separately when it is needed to dequantize; without it, codes still
+keep the direction of the vectors, which is all that cosine distances use.
+Quantizing codes again gives the same codes.
+'''
+import numpy as np
+
+FEATURE_DTYPES = ('float32', 'float16', 'int8')
+
+def check_dtype(dtype):
+    '''
+    Returns ``dtype`` as a ``np.dtype``, or raises ``ValueError`` if it is not one \
+        of ``FEATURE_DTYPES``.
+    '''
+    dtype = np.dtype(dtype)
+    if dtype.name not in FEATURE_DTYPES:
+        raise ValueError('Invalid feature dtype {}; must be one of {}'.format(dtype, FEATURE_DTYPES))
+    return dtype
+
+def quantize(features, dtype, return_scales = False):
+    '''
+    - Arguments:
+        - features: np.array of shape (n, d), one vector per row
+        - dtype: one of ``FEATURE_DTYPES``
+        - return_scales: if True, also return the per-vector scales
+
+    - Returns:
+        - codes: np.array of shape (n, d) and dtype ``dtype``
+        - scales: (only if ``return_scales``) np.array of shape (n,) float32 such \
+            that ``features ~= codes * scales[:, None]``. Ones for float dtypes.
+    '''
+    dtype = check_dtype(dtype)
+    features = np.asarray(features)
+    scales = np.ones(len(features), dtype = np.float32)
+    if dtype == np.int8:
+        absmax = np.abs(features).max(axis = 1) if features.size else scales
+        scales = (np.maximum(absmax, np.finfo(np.float32).tiny) / 127.).astype(np.float32)
+        codes = np.rint(features / scales[:, None]).astype(np.int8)
+    else:
+        codes = features.astype(dtype)
+    if return_scales:
+        return codes, scales
+    return codes
+
+def dequantize(codes, scales = None):
+    '''
+    - Arguments:
+        - codes: np.array of shape (n, d) returned by ``quantize``
+        - scales: np.array of shape (n,). If None, codes are only cast.
+
+    - Returns:
+        - features: np.array of shape (n, d) float32
+    '''
+    features = np.asarray(codes, dtype = np.float32)
+    if scales is not None:
+        features = features * scales[:, None]
+    return features
@@ -6,7 +6,8 @@ name = 'videoflow_contrib_humanencoder'
 install_requires = [
     'videoflow',
     'scipy==1.3.3',
-    'scikit-learn==0.20.0'
+    'scikit-learn==0.20.0',
+    'videoflow_contrib_features'
 ]
 
 setup(name=name,
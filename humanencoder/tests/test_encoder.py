@@ -0,0 +1,59 @@
+import pytest
+
+import numpy as np
+
+pytest.importorskip('tensorflow')
+
+from videoflow.core.constants import CPU
+from videoflow_contrib.humanencoder import HumanEncoder
+from videoflow_contrib.features.quantization import dequantize
+
+FEATURE_DIM = 128
+
+class FakeSession:
+    '''
+    Returns unit-length features that only depend on the mean of each image.
+    '''
+    def run(self, output_var, feed_dict):
+        images = np.asarray(next(iter(feed_dict.values())), dtype = np.float32)
+        means = images.reshape(len(images), -1).mean(axis = 1)
+        features = np.cos(np.outer(means + 1, np.arange(1, FEATURE_DIM + 1)))
+        return features / np.linalg.norm(features, axis = 1, keepdims = True)
+
+def encoder(**kwargs):
+    encoder = HumanEncoder(batch_size = 4, device_type = CPU, **kwargs)
+    encoder._session = FakeSession()
+    encoder._input_var = 'images:0'
+    encoder._output_var = 'features:0'
+    encoder._feature_dim = FEATURE_DIM
+    encoder._image_shape = [128, 64, 3]
+    return encoder
+
+def im_batch(n):
+    rng = np.random.RandomState(0)
+    return [rng.randint(0, 255, size = (rng.randint(50, 200), rng.randint(20, 100), 3), dtype = np.uint8)
+        for _ in range(n)]
+
+@pytest.mark.parametrize('feature_dtype, tolerance', [('float16', 1e-3), ('int8', 1e-2)])
+def test_quantized_features_are_one_array(feature_dtype, tolerance):
+    ims = im_batch(10)
+    expected = encoder().process(ims)
+    features = encoder(feature_dtype = feature_dtype).process(ims)
+    assert isinstance(features, np.ndarray)
+    assert features.shape == (10, FEATURE_DIM) and features.dtype == np.dtype(feature_dtype)
+    # Codes keep the direction of the features
+    features = dequantize(features)
+    features /= np.linalg.norm(features, axis = 1, keepdims = True)
+    assert np.abs(features - expected).max() < tolerance
+
+@pytest.mark.parametrize('feature_dtype, tolerance', [('float32', 0), ('float16', 1e-3), ('int8', 1e-2)])
+def test_features_round_trip_with_scales(feature_dtype, tolerance):
+    ims = im_batch(10)
+    expected = encoder().process(ims)
+    codes, scales = encoder(feature_dtype = feature_dtype, return_scales = True).process(ims)
+    assert codes.shape == (10, FEATURE_DIM) and codes.dtype == np.dtype(feature_dtype)
+    assert scales.shape == (10, ) and scales.dtype == np.float32
+    assert np.abs(dequantize(codes, scales) - expected).max() <= tolerance
+
+if __name__ == "__main__":
+    pytest.main([__file__])
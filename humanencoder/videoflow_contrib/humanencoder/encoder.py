@@ -8,6 +8,7 @@ import tensorflow as tf
 
 from videoflow.core.node import ProcessorNode
 from .tensorflow_utils import TensorflowModel
+from videoflow_contrib.features.quantization import check_dtype, quantize
 from videoflow.utils.downloader import get_file
 from videoflow.core.constants import CPU, GPU
 
@@ -33,11 +34,22 @@ class HumanEncoder(ProcessorNode):
     on the ``MARS`` dataset.
     
     https://github.com/nwojke/cosine_metric_learning
+
+    - Arguments:
+        - feature_dtype: ``float32``, ``float16`` or ``int8``. Features are \
+            quantized to this type, see ``quantization``. ``int8`` codes keep \
+            the direction of the features, which is all that cosine distances use.
+        - return_scales: if True, ``process`` returns the codes together with \
+            their per-vector scales, so that ``int8`` features can be dequantized. \
+            Nodes that take the features as one array do not accept this output.
     '''
-    def __init__(self, path_to_pb_file = None, batch_size = 32, nb_tasks = 1, device_type = GPU):
+    def __init__(self, path_to_pb_file = None, batch_size = 32, nb_tasks = 1, device_type = GPU,
+                feature_dtype = 'float32', return_scales = False):
         self._tensorflow_model = None
         self._path_to_pb_file = path_to_pb_file
         self._batch_size = batch_size
+        self._feature_dtype = check_dtype(feature_dtype)
+        self._return_scales = return_scales
         super(HumanEncoder, self).__init__(nb_tasks = nb_tasks, device_type = device_type)
     
     def open(self):
@@ -83,7 +95,9 @@ class HumanEncoder(ProcessorNode):
             - im_batch: list of np.arrays: (h, w, 3)
         
         - Returns:
-            - feature_vector: (batch, f)
+            - feature_vector: (batch, f) of type ``feature_dtype``. With \
+                ``return_scales``, the tuple ``(codes, scales)`` instead, where scales \
+                is (batch, ) such that ``feature_vector ~= codes * scales[:, None]``.
         '''
         im_batch = [cv2.resize(im, (self._image_shape[1], self._image_shape[0])) for im in im_batch]
         out = np.zeros((len(im_batch), self._feature_dim), np.float32)
@@ -93,4 +107,4 @@ class HumanEncoder(ProcessorNode):
             out,
             self._batch_size
         )
-        return out
\ No newline at end of file
+        return quantize(out, self._feature_dtype, return_scales = self._return_scales)
\ No newline at end of file
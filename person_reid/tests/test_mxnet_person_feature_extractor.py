@@ -0,0 +1,62 @@
+import pytest
+
+import numpy as np
+
+mx = pytest.importorskip('mxnet')
+
+from videoflow.core.constants import CPU
+from videoflow_contrib.person_reid import MxnetPersonFeatureExtractor, MxnetPersonReid
+from videoflow_contrib.person_reid.gluoncv_person_reid import get_transform
+from videoflow_contrib.features.quantization import dequantize
+
+FEATURE_DIM = MxnetPersonFeatureExtractor.FEATURE_VECTOR_LEN
+
+class FakeModel:
+    '''
+    Returns features that only depend on the mean of each image, so that \
+        flipped images give the same features.
+    '''
+    def __call__(self, im_batch):
+        means = im_batch.reshape((im_batch.shape[0], -1)).mean(axis = 1).asnumpy()
+        return mx.nd.array(np.cos(np.outer(means + 3, np.arange(1, FEATURE_DIM + 1))))
+
+def extractor(**kwargs):
+    extractor = MxnetPersonFeatureExtractor('model.params', device_type = CPU, **kwargs)
+    extractor._transform = get_transform()
+    extractor._mxnet_model = FakeModel()
+    return extractor
+
+def im_batch(n):
+    rng = np.random.RandomState(0)
+    return [rng.randint(0, 255, size = (rng.randint(50, 200), rng.randint(20, 100), 3), dtype = np.uint8)
+        for _ in range(n)]
+
+@pytest.mark.parametrize('feature_dtype, tolerance', [('float16', 1e-3), ('int8', 1e-2)])
+def test_quantized_features_are_one_array(feature_dtype, tolerance):
+    ims = im_batch(6)
+    expected = extractor().process(ims)
+    features = extractor(feature_dtype = feature_dtype).process(ims)
+    assert isinstance(features, np.ndarray)
+    assert features.shape == (6, FEATURE_DIM) and features.dtype == np.dtype(feature_dtype)
+    # Codes keep the direction of the features
+    features = dequantize(features)
+    features /= np.linalg.norm(features, axis = 1, keepdims = True)
+    assert np.abs(features - expected).max() < tolerance
+    ids = MxnetPersonReid(device_type = CPU, feature_dtype = feature_dtype).process(features)
+    assert ids.shape == (6, )
+
+@pytest.mark.parametrize('feature_dtype, tolerance', [('float32', 1e-6), ('float16', 1e-3), ('int8', 1e-2)])
+def test_features_round_trip_with_scales(feature_dtype, tolerance):
+    ims = im_batch(6)
+    expected = extractor().process(ims)
+    codes, scales = extractor(feature_dtype = feature_dtype, return_scales = True).process(ims)
+    assert codes.shape == (6, FEATURE_DIM) and codes.dtype == np.dtype(feature_dtype)
+    assert scales.shape == (6, ) and scales.dtype == np.float32
+    assert np.abs(dequantize(codes, scales) - expected).max() <= tolerance
+
+def test_empty_batch():
+    features = extractor(feature_dtype = 'int8').process([])
+    assert features.shape == (0, FEATURE_DIM) and features.dtype == np.int8
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -7,6 +7,7 @@ import numpy as np
 from videoflow.core import ProcessorNode
 from videoflow.core.constants import GPU
 from .gluoncv_person_reid import resnet50, get_transform
+from videoflow_contrib.features.quantization import check_dtype, quantize
 
 
 class MxnetPersonFeatureExtractor(ProcessorNode):
@@ -16,15 +17,28 @@ class MxnetPersonFeatureExtractor(ProcessorNode):
 
     See https://github.com/dmlc/gluon-cv/tree/master/scripts/re-id/baseline on
     how to build params file.
+
+    - Arguments:
+        - feature_dtype (str): If None, features are float64. Otherwise \
+            ``float32``, ``float16`` or ``int8``: features are quantized to \
+            this type, see ``quantization``. ``int8`` codes keep the direction \
+            of the features, which is all that similarities use.
+        - return_scales (bool): If True, ``process`` returns the features \
+            together with their per-vector scales, so that ``int8`` features \
+            can be dequantized. Nodes that take the features as one array do \
+            not accept this output.
     """
 
     FEATURE_VECTOR_LEN = 2048
 
-    def __init__(self, path_to_params_file: str, nb_tasks=1, device_type=GPU):
+    def __init__(self, path_to_params_file: str, nb_tasks=1, device_type=GPU,
+                 feature_dtype: str = None, return_scales: bool = False):
         self._mxnet_model = None
         self._transform = None
         self._context = mx.gpu() if device_type == GPU else mx.cpu()
         self._path_to_params_file = path_to_params_file
+        self._feature_dtype = None if feature_dtype is None else check_dtype(feature_dtype)
+        self._return_scales = return_scales
         super().__init__(nb_tasks=nb_tasks, device_type=device_type)
 
     def open(self):
@@ -56,12 +70,15 @@ class MxnetPersonFeatureExtractor(ProcessorNode):
                 (h, w, 3)
 
         - Returns:
-            - features: np.array of shape (batch, feature_vector_length)
+            - features: np.array of shape (batch, feature_vector_length), of type \
+                ``feature_dtype``. With ``return_scales``, the tuple \
+                ``(codes, scales)`` instead, where scales is an np.array of shape \
+                (batch, ) such that ``features ~= codes * scales[:, None]``.
         """
         batch_size = len(im_batch)
         result = np.zeros((batch_size, self.FEATURE_VECTOR_LEN))
         if batch_size == 0:
-            return result
+            return self._quantize(result)
 
         im_nd_list = []
         for im in im_batch:
@@ -75,4 +92,12 @@ class MxnetPersonFeatureExtractor(ProcessorNode):
                 im_batch = self._flip_horizontally(im_batch)
             f = self._mxnet_model(im_batch.as_in_context(self._context)).as_in_context(mx.cpu()).asnumpy()
             result += f
-        return result / np.linalg.norm(result, axis=1, keepdims=True)
+        result /= np.linalg.norm(result, axis=1, keepdims=True)
+        return self._quantize(result)
+
+    def _quantize(self, features: np.array):
+        if self._feature_dtype is not None:
+            return quantize(features, self._feature_dtype, return_scales=self._return_scales)
+        if self._return_scales:
+            return features, np.ones(len(features), dtype=np.float32)
+        return features
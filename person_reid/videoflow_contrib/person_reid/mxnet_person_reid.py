@@ -3,7 +3,12 @@ import mxnet as mx
 
 from videoflow.core import ProcessorNode
 from videoflow.core.constants import GPU
+from videoflow_contrib.features.ann_index import index_factory
+from videoflow_contrib.features.quantization import check_dtype, quantize, dequantize
 
+# Number of known persons whose compressed features are converted to float32
+# at once to compute similarities
+SIMILARITY_BLOCK_SIZE = 1024
 
 class MxnetPersonReid(ProcessorNode):
     """
@@ -14,39 +19,119 @@ class MxnetPersonReid(ProcessorNode):
     - Arguments:
         - min_similarity_threshold (float): person re-id  will give a new id \
             for entries with similarity below threshold similarity.
+        - index_type (str): If None, every query is compared with the feature \
+            of every known person with MXNet. Otherwise ``exact``, ``ivf`` or \
+            ``faiss``: the known persons are kept in a nearest neighbor index \
+            (see ``ann_index``), which keeps re-id fast with tens of thousands \
+            of persons.
+        - index_params (dict): keyword arguments of the index.
+        - feature_dtype (str): If None, features of known persons are kept as \
+            float32. Otherwise ``float32``, ``float16`` or ``int8``: they are \
+            quantized to this type (see ``quantization``) and similarities are \
+            computed from the quantized features. Use the same type as \
+            ``MxnetPersonFeatureExtractor``. With an index, the index keeps \
+            its own float32 copy of the quantized features.
     """
 
-    def __init__(self, min_similarity_threshold: float = 0.5, nb_tasks=1, device_type=GPU):
+    def __init__(self, min_similarity_threshold: float = 0.5, nb_tasks=1, device_type=GPU,
+                 index_type: str = None, index_params: dict = None,
+                 feature_dtype: str = None):
         self._context = mx.gpu() if device_type == GPU else mx.cpu()
         self._similarity_threshold = min_similarity_threshold
         self._features = None
+        self._inv_norms = None
+        self._feature_dtype = None if feature_dtype is None else check_dtype(feature_dtype)
+        self._index = None
+        self._nb_ids = 0
+        if index_type is not None:
+            self._index = index_factory(index_type, 'cosine', **(index_params or {}))
         super().__init__(nb_tasks=nb_tasks, device_type=device_type)
 
+    def _quantize(self, features: np.array):
+        """Quantizes features to ``feature_dtype``.
+
+        - Returns:
+            - codes: np.array of shape (batch, feature_vector_length)
+            - inv_norms: np.array of shape (batch, ), the scales that bring \
+                codes to unit length
+        """
+        codes = quantize(features, self._feature_dtype)
+        norms = np.linalg.norm(codes.astype(np.float32), axis=1)
+        return codes, 1. / np.maximum(norms, np.finfo(np.float32).tiny)
+
+    def _similarities(self, queries: mx.nd.NDArray) -> mx.nd.NDArray:
+        if self._inv_norms is None:
+            return mx.nd.linalg.gemm2(queries, self._features, transpose_b=True)
+        # The compressed features are converted block by block, so that no
+        # float32 copy of all of them is ever made.
+        dots = [
+            mx.nd.linalg.gemm2(
+                queries, self._features[start:start + SIMILARITY_BLOCK_SIZE].astype('float32'),
+                transpose_b=True)
+            for start in range(0, self._features.shape[0], SIMILARITY_BLOCK_SIZE)
+        ]
+        dots = mx.nd.concat(*dots, dim=1) if len(dots) > 1 else dots[0]
+        return mx.nd.broadcast_mul(dots, self._inv_norms.reshape((1, -1)))
+
+    def _process_with_index(self, features: np.array) -> np.array:
+        if self._nb_ids == 0:
+            result = np.arange(0, features.shape[0])
+        else:
+            distances, ids = self._index.search(features, 1)
+            result = ids[:, 0]
+            is_new = 1. - distances[:, 0] < self._similarity_threshold
+            result[is_new] = np.arange(self._nb_ids, self._nb_ids + is_new.sum())
+        self._nb_ids = max(self._nb_ids, int(result.max()) + 1)
+        # Matched persons get their feature replaced by the new one
+        self._index.add(result, features)
+        return result
+
     def process(self, features: np.array) -> np.array:
         """Returns persons ids based on features matrix for several persons.
 
         Ids are given sequentially, starting from 0.
 
         - Arguments:
-            - features: np.array of shape (batch, feature_vector_length)
+            - features: np.array of shape (batch, feature_vector_length), or the \
+                ``(codes, scales)`` returned by ``MxnetPersonFeatureExtractor`` \
+                with ``return_scales``. Scales are not needed, because only the \
+                direction of the features is compared.
 
         - Returns:
             - ids: np.array of shape (batch, )
         """
+        if isinstance(features, tuple):
+            features = features[0]
         if features.shape[0] == 0:
             return np.empty((0, ), int)
-        features = mx.nd.array(features).as_in_context(self._context)
+        inv_norms = None
+        if self._feature_dtype is not None:
+            codes, inv_norms = self._quantize(features)
+            if self._index is not None:
+                return self._process_with_index(dequantize(codes, inv_norms))
+            queries = mx.nd.array(dequantize(codes, inv_norms)).as_in_context(self._context)
+            features = mx.nd.array(codes, dtype=codes.dtype).as_in_context(self._context)
+            inv_norms = mx.nd.array(inv_norms).as_in_context(self._context)
+        elif self._index is not None:
+            return self._process_with_index(features)
+        else:
+            queries = features = mx.nd.array(features).as_in_context(self._context)
         if self._features is None:
             self._features = features.copy()
+            self._inv_norms = None if inv_norms is None else inv_norms.copy()
             return np.arange(0, features.shape[0])
-        dist_all = mx.nd.linalg.gemm2(features, self._features, transpose_b=True)
+        dist_all = self._similarities(queries)
         result = np.empty((features.shape[0], ), int)
         for i in range(features.shape[0]):
             person_id: int = dist_all[i].argsort(is_ascend=False).as_in_context(mx.cpu()).asnumpy().astype("int32")[0]
             if dist_all[i][person_id] < self._similarity_threshold:
-                self._features = mx.nd.concat(self._features, features, dim=0)
+                self._features = mx.nd.concat(self._features, features[i:i + 1], dim=0)
+                if inv_norms is not None:
+                    self._inv_norms = mx.nd.concat(self._inv_norms, inv_norms[i:i + 1], dim=0)
                 result[i] = self._features.shape[0] - 1
             else:
                 self._features[person_id, :] = features[i, :].copy()
+                if inv_norms is not None:
+                    self._inv_norms[person_id] = inv_norms[i]
                 result[i] = person_id
         return result
@@ -0,0 +1,71 @@
+'''
+Recall versus latency of the nearest neighbor indexes of ``ann_index`` on
+galleries of 1k, 10k and 50k identities with 128-d appearance features.
+Identities are spread around a few hundred appearance modes (clothing colors,
+poses, ...) and queries are new noisy observations of known identities,
+searched in batches of 100. Recall is the fraction of queries whose nearest
+neighbor is the one returned by the exact index.
+
+Usage: python ann_benchmark.py [--identities 1000 10000 50000]
+'''
+import argparse
+import timeit
+
+import numpy as np
+
+from videoflow_contrib.features import ann_index
+from videoflow_contrib.features.ann_index import index_factory
+
+DIM = 128
+NB_QUERIES = 100
+NB_MODES = 256
+
+def configurations(nb_identities):
+    nb_lists = int(4 * np.sqrt(nb_identities))
+    ivf = {'nb_lists': nb_lists, 'nb_training_vectors': min(nb_identities, 32 * nb_lists)}
+    configs = [('exact', {})]
+    for nb_probes in [1, 8, 32]:
+        configs.append(('ivf', dict(ivf, nb_probes = nb_probes)))
+    configs.append(('ivf', dict(ivf, nb_probes = 8, nb_subquantizers = 16)))
+    if ann_index.faiss is not None:
+        for nb_probes in [1, 8, 32]:
+            configs.append(('faiss', {'description': 'IVF{},Flat'.format(nb_lists), 'nb_probes': nb_probes,
+                'nb_training_vectors': ivf['nb_training_vectors']}))
+    return configs
+
+def make_gallery(nb_identities, seed = 0):
+    rng = np.random.RandomState(seed)
+    modes = rng.normal(size = (NB_MODES, DIM)).astype(np.float32)
+    identities = modes[rng.randint(NB_MODES, size = nb_identities)] \
+        + 0.5 * rng.normal(size = (nb_identities, DIM)).astype(np.float32)
+    gallery = identities + 0.2 * rng.normal(size = identities.shape).astype(np.float32)
+    queried = rng.choice(nb_identities, NB_QUERIES, replace = False)
+    queries = identities[queried] + 0.2 * rng.normal(size = (NB_QUERIES, DIM)).astype(np.float32)
+    return gallery, queries
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--identities', type = int, nargs = '+', default = [1000, 10000, 50000])
+    args = parser.parse_args()
+
+    print(f'{"identities":>10} {"index":>6} {"params":<44} {"build s":>8} {"ms/query":>9} {"recall@1":>9}')
+    for nb_identities in args.identities:
+        gallery, queries = make_gallery(nb_identities)
+        ids = np.arange(nb_identities)
+        exact = index_factory('exact')
+        exact.add(ids, gallery)
+        _, expected = exact.search(queries, 1)
+        for index_type, params in configurations(nb_identities):
+            index = index_factory(index_type, **params)
+            start = timeit.default_timer()
+            for chunk in range(0, nb_identities, 1000):
+                index.add(ids[chunk:chunk + 1000], gallery[chunk:chunk + 1000])
+            build = timeit.default_timer() - start
+            ms = min(timeit.repeat(lambda: index.search(queries, 1), number = 1, repeat = 5)) * 1000 / NB_QUERIES
+            _, found = index.search(queries, 1)
+            recall = np.mean(found[:, 0] == expected[:, 0])
+            params = ', '.join(f'{k}={v}' for k, v in params.items() if k != 'nb_training_vectors')
+            print(f'{nb_identities:>10} {index_type:>6} {params:<44} {build:>8.2f} {ms:>9.3f} {recall:>9.3f}')
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+'''
+Accuracy and memory of DeepSort with float32, float16 and int8 appearance
+galleries. A sequence is recorded once: persons with 128-d appearance features
+walk across the frame, cross each other and are missed by the detector for a
+few frames at a time. Features are quantized as the encoder would (see
+``quantization``) and the same frames are tracked with each gallery type.
+
+Reported per type:
+- gallery memory, in MB
+- ms per frame
+- agreement: fraction of output rows with the same track id as with float32
+- purity: fraction of output rows whose track id belongs to the person most
+  often seen under that id
+- distance error: max difference of the cosine distances to the gallery with
+  the float32 ones, at the end of the sequence
+
+Usage: python feature_quantization_benchmark.py [--persons 300] [--frames 200]
+'''
+import argparse
+import timeit
+
+import numpy as np
+
+from videoflow_contrib.tracker_deepsort import DeepSort
+from videoflow_contrib.features.quantization import FEATURE_DTYPES, quantize
+
+DIM = 128
+
+def record_sequence(nb_persons, nb_frames, seed = 0):
+    '''
+    - Returns:
+        - frames: list of np.array of shape (nb_boxes, [top, left, width, height, confidence, features...])
+        - persons: list of np.array of shape (nb_boxes,) with the person of each box
+    '''
+    rng = np.random.RandomState(seed)
+    side = 60 * np.sqrt(nb_persons)
+    tl = rng.uniform(0, side, size = (nb_persons, 2))
+    wh = rng.uniform(30, 80, size = (nb_persons, 2))
+    v = rng.uniform(-4, 4, size = (nb_persons, 2))
+    appearance = rng.normal(size = (nb_persons, DIM))
+    appearance /= np.linalg.norm(appearance, axis = 1, keepdims = True)
+    frames, persons = [], []
+    for f in range(nb_frames):
+        features = appearance + 0.03 * rng.normal(size = appearance.shape)
+        features /= np.linalg.norm(features, axis = 1, keepdims = True)
+        boxes = np.concatenate([tl + f * v + rng.normal(0, 1, size = tl.shape), wh, np.ones((nb_persons, 1))], axis = 1)
+        seen = rng.rand(nb_persons) > 0.15
+        frames.append((boxes[seen], features[seen]))
+        persons.append(np.flatnonzero(seen))
+    return frames, persons
+
+def purity(ids, persons):
+    ids, persons = np.concatenate(ids), np.concatenate(persons)
+    tracked = ids >= 0
+    ids, persons = ids[tracked], persons[tracked]
+    _, ids = np.unique(ids, return_inverse = True)
+    counts = np.zeros((ids.max() + 1, persons.max() + 1), dtype = int)
+    np.add.at(counts, (ids, persons), 1)
+    return counts.max(axis = 1).sum() / len(ids)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--persons', type = int, default = 300)
+    parser.add_argument('--frames', type = int, default = 200)
+    parser.add_argument('--budget', type = int, default = 100)
+    args = parser.parse_args()
+
+    frames, persons = record_sequence(args.persons, args.frames)
+    queries = frames[-1][1].astype(np.float32)
+    results = {}
+    print(f'{"dtype":>8} {"gallery MB":>11} {"ms/frame":>9} {"agreement":>10} {"purity":>7} {"distance error":>15}')
+    for dtype in FEATURE_DTYPES:
+        inputs = [np.concatenate([boxes, quantize(features, dtype)], axis = 1) for boxes, features in frames]
+        deepsort = DeepSort(nn_budget = args.budget, feature_dtype = dtype)
+        start = timeit.default_timer()
+        ids = [deepsort.process(bboxes)[:, 4] for bboxes in inputs]
+        ms = (timeit.default_timer() - start) * 1000 / len(inputs)
+        metric = deepsort._tracker.metric
+        gallery = metric.gallery
+        targets = gallery.targets()
+        distances = metric.distance(queries, targets)
+        results[dtype] = ids, distances
+        ref_ids, ref_distances = results['float32']
+        agreement = np.mean(np.concatenate(ids) == np.concatenate(ref_ids))
+        error = np.abs(distances - ref_distances).max()
+        memory = gallery.nbytes() / 2 ** 20
+        print(f'{dtype:>8} {memory:>11.2f} {ms:>9.2f} {agreement:>10.4f} {purity(ids, persons):>7.4f} {error:>15.5f}')
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+'''
+Memory and latency of ``NearestNeighborDistanceMetric.distance`` without
+budget on galleries with uneven history lengths: most targets have a few
+dozen samples and one target has been in the scene for thousands of frames.
+The reference keeps one array of samples per target and computes the
+distances target by target, as the metric did before the gallery.
+
+Usage: python gallery_benchmark.py [--targets 30] [--long-history 6000]
+'''
+import argparse
+import timeit
+
+import numpy as np
+
+from videoflow_contrib.tracker_deepsort.nn_matching import NearestNeighborDistanceMetric
+
+DIM = 128
+NB_QUERIES = 30
+NB_REPEATS = 20
+
+def reference_distance(samples, features, targets):
+    features = features / np.linalg.norm(features, axis = 1, keepdims = True)
+    cost_matrix = np.zeros((len(targets), len(features)))
+    for i, target in enumerate(targets):
+        cost_matrix[i] = (1. - samples[target] @ features.T).min(axis = 0)
+    return cost_matrix
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--targets', type = int, default = 30)
+    parser.add_argument('--long-history', type = int, default = 6000)
+    parser.add_argument('--short-history', type = int, default = 50)
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(0)
+    lengths = rng.randint(1, args.short_history + 1, size = args.targets)
+    lengths[0] = args.long_history
+    samples = {}
+    for target, length in enumerate(lengths):
+        x = rng.normal(size = (length, DIM)).astype(np.float32)
+        samples[target] = x / np.linalg.norm(x, axis = 1, keepdims = True)
+    targets = list(samples)
+    features = rng.normal(size = (NB_QUERIES, DIM)).astype(np.float32)
+
+    metric = NearestNeighborDistanceMetric('cosine', 0.2)
+    metric.partial_fit(np.concatenate([samples[t] for t in targets]),
+        np.repeat(targets, lengths), targets)
+
+    reference_ms = timeit.timeit(lambda: reference_distance(samples, features, targets),
+        number = NB_REPEATS) * 1000 / NB_REPEATS
+    gallery_ms = timeit.timeit(lambda: metric.distance(features, targets),
+        number = NB_REPEATS) * 1000 / NB_REPEATS
+    error = np.abs(metric.distance(features, targets) - reference_distance(samples, features, targets)).max()
+    reference_mb = sum(x.nbytes for x in samples.values()) / 2 ** 20
+    gallery_mb = metric.gallery.nbytes() / 2 ** 20
+
+    print(f'{lengths.sum()} samples, longest history {lengths.max()}, median {int(np.median(lengths))}')
+    print(f'{"":>10} {"MB":>8} {"ms":>8}')
+    print(f'{"reference":>10} {reference_mb:>8.2f} {reference_ms:>8.2f}')
+    print(f'{"gallery":>10} {gallery_mb:>8.2f} {gallery_ms:>8.2f}')
+    print(f'max distance error {error:.2e}')
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+'''
+Compares the broadcasted ``iou_matching.iou_cost`` against the previous
+implementation (copied below), which rebuilt the candidate boxes and computed
+one row of the cost matrix per track.
+
+Usage: python iou_cost_benchmark.py
+'''
+import timeit
+
+import numpy as np
+
+from videoflow_contrib.tracker_deepsort import iou_matching, linear_assignment
+from videoflow_contrib.tracker_deepsort.detection import Detection, DetectionBatch
+from videoflow_contrib.tracker_deepsort.kalman_filter import KalmanFilter
+from videoflow_contrib.tracker_deepsort.track import Track
+
+OBJECT_COUNTS = [10, 50, 100, 200, 500]
+
+def make_scene(nb_objects, seed = 0):
+    rng = np.random.RandomState(seed)
+    kf = KalmanFilter()
+    side = 60 * np.sqrt(nb_objects)
+    tlwh = np.concatenate([rng.uniform(0, side, size = (nb_objects, 2)), rng.uniform(20, 60, size = (nb_objects, 2))], axis = 1)
+    tracks = []
+    for i, box in enumerate(tlwh):
+        xyah = np.r_[box[:2] + box[2:] / 2, box[2] / box[3], box[3]]
+        track = Track(*kf.initiate(xyah), i, 3, 30)
+        track.time_since_update = 1 if rng.rand() < 0.8 else 2
+        tracks.append(track)
+    detections = [Detection(box, 1., np.zeros(128)) for box in tlwh + rng.normal(0, 3, size = tlwh.shape)]
+    return tracks, detections
+
+def single_iou(bbox, candidates):
+    bbox_tl, bbox_br = bbox[:2], bbox[:2] + bbox[2:]
+    candidates_tl = candidates[:, :2]
+    candidates_br = candidates[:, :2] + candidates[:, 2:]
+
+    tl = np.c_[np.maximum(bbox_tl[0], candidates_tl[:, 0])[:, np.newaxis],
+               np.maximum(bbox_tl[1], candidates_tl[:, 1])[:, np.newaxis]]
+    br = np.c_[np.minimum(bbox_br[0], candidates_br[:, 0])[:, np.newaxis],
+               np.minimum(bbox_br[1], candidates_br[:, 1])[:, np.newaxis]]
+    wh = np.maximum(0., br - tl)
+
+    area_intersection = wh.prod(axis=1)
+    area_bbox = bbox[2:].prod()
+    area_candidates = candidates[:, 2:].prod(axis=1)
+    return area_intersection / (area_bbox + area_candidates - area_intersection)
+
+def loop_iou_cost(tracks, detections, track_indices, detection_indices):
+    cost_matrix = np.zeros((len(track_indices), len(detection_indices)))
+    for row, track_idx in enumerate(track_indices):
+        if tracks[track_idx].time_since_update > 1:
+            cost_matrix[row, :] = linear_assignment.INFTY_COST
+            continue
+
+        bbox = tracks[track_idx].to_tlwh()
+        candidates = np.asarray([detections[i].tlwh for i in detection_indices])
+        cost_matrix[row, :] = 1. - single_iou(bbox, candidates)
+    return cost_matrix
+
+def main():
+    print(f'{"objects":>8} {"loop ms":>10} {"broadcast ms":>13} {"speedup":>8}')
+    for nb_objects in OBJECT_COUNTS:
+        tracks, detections = make_scene(nb_objects)
+        indices = (list(range(len(tracks))), list(range(len(detections))))
+        args = (tracks, detections) + indices
+        batch_args = (tracks, DetectionBatch.from_detections(detections)) + indices
+        assert np.allclose(loop_iou_cost(*args), iou_matching.iou_cost(*batch_args))
+        number = max(1, 2000 // nb_objects)
+        loop_ms = min(timeit.repeat(lambda: loop_iou_cost(*args), number = 1, repeat = 3)) * 1000
+        vec_ms = min(timeit.repeat(lambda: iou_matching.iou_cost(*batch_args), number = number, repeat = 3)) * 1000 / number
+        print(f'{nb_objects:>8} {loop_ms:>10.3f} {vec_ms:>13.3f} {loop_ms / vec_ms:>7.1f}x')
+
+if __name__ == "__main__":
+    main()
@@ -6,8 +6,8 @@ name = 'videoflow_contrib_tracker_deepsort'
 
 install_requires = [
     'videoflow',
-    'scipy==1.3.3',
-    'scikit-learn==0.20.0'
+    'scipy>=1.4',
+    'videoflow_contrib_features'
 ]
 
 setup(name=name,
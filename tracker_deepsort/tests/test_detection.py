@@ -0,0 +1,49 @@
+import pytest
+
+import numpy as np
+from videoflow_contrib.tracker_deepsort import DeepSort
+from videoflow_contrib.tracker_deepsort.detection import Detection, DetectionBatch
+from videoflow_contrib.tracker_deepsort.nn_matching import NearestNeighborDistanceMetric
+from videoflow_contrib.tracker_deepsort.tracker import Tracker
+
+from test_tracker import scene
+
+def test_batch_matches_detections():
+    bboxes = scene(20, 1, 0)[0]
+    batch = DetectionBatch.from_array(bboxes)
+    assert len(batch) == len(bboxes)
+    detections = [Detection(b[0:4], b[4], b[5:]) for b in bboxes]
+    # Features are float32 like those of Detection, converted once
+    assert batch.feature.dtype == np.float32 and batch.feature.flags.c_contiguous
+    assert np.array_equal(batch.feature, [d.feature for d in detections])
+    float32_batch = DetectionBatch.from_array(bboxes.astype(np.float32))
+    assert float32_batch.feature.dtype == np.float32
+    assert np.allclose(float32_batch.tlwh, batch.tlwh, atol = 1e-3)
+    assert np.allclose(batch.to_xyah(), [d.to_xyah() for d in detections])
+    assert np.allclose(batch.to_tlbr(), [d.to_tlbr() for d in detections])
+
+def test_tracker_update_same_with_batch_and_list():
+    def make_tracker():
+        return Tracker(NearestNeighborDistanceMetric('cosine', 0.2, 5))
+    from_batch, from_list = make_tracker(), make_tracker()
+    for bboxes in scene(30, 10, 1):
+        from_batch.predict()
+        from_list.predict()
+        a = from_batch.update(DetectionBatch.from_array(bboxes))
+        b = from_list.update([Detection(r[0:4], r[4], r[5:]) for r in bboxes])
+        assert a == b
+    assert np.allclose([t.mean for t in from_batch.tracks], [t.mean for t in from_list.tracks])
+
+def test_deepsort_assigns_ids_to_matched_rows():
+    frames = scene(40, 20, 2)
+    deepsort = DeepSort(min_height = 30)
+    for bboxes in frames:
+        tracks = deepsort.process(bboxes)
+        tracked = tracks[:, 4] >= 0
+        assert np.all(bboxes[tracked, 3] >= 30)
+        # Kalman filtered boxes stay close to the detection they were matched to
+        assert np.all(np.abs(tracks[tracked, 0:4] - bboxes[tracked, 0:4]) < 15)
+    assert np.any(tracked)
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,43 @@
+import pytest
+
+import numpy as np
+from videoflow_contrib.tracker_deepsort import iou_matching, linear_assignment
+from videoflow_contrib.tracker_deepsort.detection import DetectionBatch
+from videoflow_contrib.tracker_deepsort.kalman_filter import KalmanFilter
+from videoflow_contrib.tracker_deepsort.track import Track
+
+def make_tracks_and_detections(nb_tracks, nb_dets, seed):
+    rng = np.random.RandomState(seed)
+    kf = KalmanFilter()
+    tlwh = np.concatenate([rng.uniform(0, 300, size = (nb_tracks, 2)), rng.uniform(20, 60, size = (nb_tracks, 2))], axis = 1)
+    tracks = []
+    for i, box in enumerate(tlwh):
+        xyah = np.r_[box[:2] + box[2:] / 2, box[2] / box[3], box[3]]
+        track = Track(*kf.initiate(xyah), i, 3, 30)
+        track.time_since_update = rng.randint(0, 3)
+        tracks.append(track)
+    det_tlwh = tlwh[rng.randint(nb_tracks, size = nb_dets)] + rng.normal(0, 5, size = (nb_dets, 4))
+    detections = DetectionBatch(det_tlwh, np.ones(nb_dets), np.zeros((nb_dets, 4)))
+    return tracks, detections
+
+def loop_iou_cost(tracks, detections, track_indices, detection_indices):
+    cost_matrix = np.zeros((len(track_indices), len(detection_indices)))
+    for row, track_idx in enumerate(track_indices):
+        if tracks[track_idx].time_since_update > 1:
+            cost_matrix[row, :] = linear_assignment.INFTY_COST
+            continue
+        candidates = detections.tlwh[detection_indices]
+        cost_matrix[row, :] = 1. - iou_matching.iou(tracks[track_idx].to_tlwh(), candidates)
+    return cost_matrix
+
+def test_iou_cost_matches_per_track_loop():
+    tracks, detections = make_tracks_and_detections(40, 30, 0)
+    track_indices, detection_indices = list(range(0, 40, 2)), list(range(1, 30))
+    expected = loop_iou_cost(tracks, detections, track_indices, detection_indices)
+    cost_matrix = iou_matching.iou_cost(tracks, detections, track_indices, detection_indices)
+    assert np.any(cost_matrix == linear_assignment.INFTY_COST) and np.any(cost_matrix < 1.)
+    assert np.allclose(cost_matrix, expected)
+    assert iou_matching.iou_cost(tracks, detections, [], detection_indices).shape == (0, 29)
+
+if __name__ == "__main__":
+    pytest.main([__file__])
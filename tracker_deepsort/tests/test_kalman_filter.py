@@ -0,0 +1,74 @@
+import pytest
+
+import numpy as np
+from videoflow_contrib.tracker_deepsort.kalman_filter import KalmanFilter
+
+def random_states(kf, nb_tracks, seed):
+    rng = np.random.RandomState(seed)
+    measurements = np.stack([
+        rng.uniform(0, 1000, nb_tracks),
+        rng.uniform(0, 1000, nb_tracks),
+        rng.uniform(0.3, 1.0, nb_tracks),
+        rng.uniform(20, 200, nb_tracks)
+    ], axis = 1)
+    means, covariances = zip(*[kf.initiate(m) for m in measurements])
+    return np.array(means), np.array(covariances), measurements
+
+def test_multi_predict_matches_predict():
+    kf = KalmanFilter()
+    mean, covariance, _ = random_states(kf, 50, 0)
+    multi_mean, multi_covariance = kf.multi_predict(mean, covariance)
+    for i in range(len(mean)):
+        m, c = kf.predict(mean[i], covariance[i])
+        assert np.allclose(multi_mean[i], m)
+        assert np.allclose(multi_covariance[i], c)
+
+def test_multi_update_matches_update():
+    kf = KalmanFilter()
+    mean, covariance, measurements = random_states(kf, 50, 1)
+    mean, covariance = kf.multi_predict(mean, covariance)
+    measurements = measurements + np.random.RandomState(2).normal(0, 2, size = measurements.shape)
+    multi_mean, multi_covariance = kf.multi_update(mean, covariance, measurements)
+    for i in range(len(mean)):
+        m, c = kf.update(mean[i], covariance[i], measurements[i])
+        assert np.allclose(multi_mean[i], m)
+        assert np.allclose(multi_covariance[i], c)
+
+def test_multi_predict_update_cycles_match_with_velocities():
+    kf = KalmanFilter()
+    mean, covariance, measurements = random_states(kf, 50, 4)
+    rng = np.random.RandomState(5)
+    velocities = np.stack([
+        rng.normal(0, 10, len(mean)),
+        rng.normal(0, 10, len(mean)),
+        np.zeros(len(mean)),
+        rng.normal(0, 5, len(mean))
+    ], axis = 1)
+    mean[:, 4:] = velocities
+    single = [(mean[i], covariance[i]) for i in range(len(mean))]
+    for step in range(1, 6):
+        mean, covariance = kf.multi_predict(mean, covariance)
+        single = [kf.predict(m, c) for m, c in single]
+        for i, (m, c) in enumerate(single):
+            assert np.allclose(mean[i], m)
+            assert np.allclose(covariance[i], c)
+        observed = measurements + step * velocities + rng.normal(0, 2, size = measurements.shape)
+        mean, covariance = kf.multi_update(mean, covariance, observed)
+        single = [kf.update(m, c, o) for (m, c), o in zip(single, observed)]
+        for i, (m, c) in enumerate(single):
+            assert np.allclose(mean[i], m)
+            assert np.allclose(covariance[i], c)
+
+def test_multi_gating_distance_matches_gating_distance():
+    kf = KalmanFilter()
+    mean, covariance, measurements = random_states(kf, 30, 3)
+    mean, covariance = kf.multi_predict(mean, covariance)
+    for only_position in [False, True]:
+        distances = kf.multi_gating_distance(mean, covariance, measurements[:20], only_position)
+        assert distances.shape == (30, 20)
+        for i in range(len(mean)):
+            expected = kf.gating_distance(mean[i], covariance[i], measurements[:20], only_position)
+            assert np.allclose(distances[i], expected)
+
+if __name__ == "__main__":
+    pytest.main([__file__])
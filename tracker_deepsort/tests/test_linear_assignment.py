@@ -0,0 +1,37 @@
+import pytest
+
+import numpy as np
+from videoflow_contrib.tracker_deepsort import linear_assignment
+from videoflow_contrib.tracker_deepsort.track import Track
+
+def make_tracks(nb_tracks, seed):
+    rng = np.random.RandomState(seed)
+    tracks = []
+    for i in range(nb_tracks):
+        track = Track(np.zeros(8), np.eye(8), i, 3, 30)
+        track.time_since_update = rng.randint(1, 6)
+        tracks.append(track)
+    return tracks
+
+def test_single_pass_cascade_matches_per_level_cascade():
+    rng = np.random.RandomState(0)
+    tracks = make_tracks(30, 0)
+    costs = rng.uniform(0, 1, size = (30, 25))
+    calls = []
+
+    def distance_metric(tracks, detections, track_indices, detection_indices):
+        calls.append(len(track_indices))
+        return costs[np.ix_(track_indices, detection_indices)]
+
+    detections = np.zeros((25, 4))
+    expected = linear_assignment.matching_cascade(distance_metric, 0.3, 30, tracks, detections)
+    assert len(calls) > 1
+    calls.clear()
+    result = linear_assignment.matching_cascade(distance_metric, 0.3, 30, tracks, detections, single_pass = True)
+    assert calls == [30]
+    assert result[0] == expected[0]
+    assert sorted(result[1]) == sorted(expected[1])
+    assert list(result[2]) == list(expected[2])
+
+if __name__ == "__main__":
+    pytest.main([__file__])
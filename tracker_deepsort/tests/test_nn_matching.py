@@ -0,0 +1,97 @@
+import pytest
+
+import numpy as np
+from videoflow_contrib.tracker_deepsort.nn_matching import FeatureGallery, NearestNeighborDistanceMetric
+
+def brute_force_distance(metric, samples, features, targets):
+    cost_matrix = np.zeros((len(targets), len(features)))
+    for i, target in enumerate(targets):
+        x = np.asarray(samples[target], dtype = float)
+        y = np.asarray(features, dtype = float)
+        if metric == 'cosine':
+            x = x / np.linalg.norm(x, axis = 1, keepdims = True)
+            y = y / np.linalg.norm(y, axis = 1, keepdims = True)
+            cost_matrix[i] = (1. - x @ y.T).min(axis = 0)
+        else:
+            cost_matrix[i] = np.square(x[:, None] - y[None]).sum(axis = 2).min(axis = 0)
+    return cost_matrix
+
+@pytest.mark.parametrize('metric', ['cosine', 'euclidean'])
+@pytest.mark.parametrize('budget', [None, 3])
+@pytest.mark.parametrize('index_type', [None, 'exact'])
+def test_distance_matches_brute_force(metric, budget, index_type):
+    rng = np.random.RandomState(0)
+    nn = NearestNeighborDistanceMetric(metric, 0.2, budget, index_type = index_type, nb_neighbors = 1000)
+    samples = {}
+    for frame in range(20):
+        targets = rng.randint(0, 100, size = 30)
+        features = rng.normal(size = (30, 16))
+        for feature, target in zip(features, targets):
+            samples.setdefault(target, []).append(feature)
+            if budget is not None:
+                samples[target] = samples[target][-budget:]
+        active_targets = np.unique(rng.choice(targets, size = 20))
+        samples = {k: samples[k] for k in active_targets}
+        nn.partial_fit(features, targets, active_targets)
+
+        queries = rng.normal(size = (10, 16))
+        expected = brute_force_distance(metric, samples, queries, active_targets)
+        assert np.allclose(nn.distance(queries, active_targets), expected, atol = 1e-4)
+
+@pytest.mark.parametrize('metric', ['cosine', 'euclidean'])
+def test_index_distance_when_one_target_dominates_the_gallery(metric):
+    rng = np.random.RandomState(0)
+    queries = rng.normal(size = (5, 16))
+    # Target 0 has hundreds of samples around the queries, target 1 a single
+    # sample a bit farther: none of it is among the nearest samples.
+    samples = {0: np.repeat(queries, 100, axis = 0) + 0.01 * rng.normal(size = (500, 16)),
+        1: queries[:1] + 0.1 * rng.normal(size = (1, 16)), 2: rng.normal(size = (3, 16))}
+    nn = NearestNeighborDistanceMetric(metric, 0.2, index_type = 'exact', nb_neighbors = 32)
+    nn.partial_fit(np.concatenate(list(samples.values())),
+        np.concatenate([np.full(len(x), target) for target, x in samples.items()]), [0, 1, 2])
+    expected = brute_force_distance(metric, samples, queries, [1, 0, 2])
+    distances = nn.distance(queries, [1, 0, 2])
+    assert np.all(np.isfinite(distances))
+    assert np.allclose(distances, expected, atol = 1e-4)
+    assert distances[0, 0] < nn.matching_threshold
+
+def test_gallery_keeps_last_samples_in_order():
+    gallery = FeatureGallery(budget = 3, capacity = 1)
+    gallery.add(np.arange(5)[:, None] * np.ones((5, 2)), [7] * 5)
+    assert gallery.samples(7)[:, 0].tolist() == [2, 3, 4]
+    gallery.add([[5, 5], [6, 6]], [7, 8])
+    assert gallery.samples(7)[:, 0].tolist() == [3, 4, 5]
+    assert gallery.samples(8)[:, 0].tolist() == [6]
+    assert len(gallery.counts) == 2
+
+def test_gallery_grows_without_budget_and_reuses_rows():
+    gallery = FeatureGallery(capacity = 2)
+    for i in range(20):
+        gallery.add([[i, i]], [1])
+    assert gallery.samples(1)[:, 0].tolist() == list(range(20))
+    gallery.add([[0, 1], [0, 2]], [2, 3])
+    gallery.retain([1, 3])
+    gallery.add([[0, 4]], [4])
+    assert 2 not in gallery and 4 in gallery
+    assert len(gallery.counts) == 4 and gallery.active.sum() == 3
+
+def test_gallery_without_budget_stores_uneven_histories_per_target():
+    rng = np.random.RandomState(0)
+    metric = NearestNeighborDistanceMetric('euclidean', 1.)
+    samples = {1: rng.rand(3000, 4), 2: rng.rand(2, 4), 3: rng.rand(5, 4)}
+    metric.partial_fit(np.concatenate(list(samples.values())),
+        np.concatenate([np.full(len(x), target) for target, x in samples.items()]), [1, 2, 3])
+    gallery = metric.gallery
+    assert gallery.features is None
+    assert [len(gallery.blocks[row][0]) for row in gallery.rows([1, 2, 3])] == [4096, 8, 8]
+    features = rng.rand(6, 4)
+    targets = [3, 1, 2]
+    expected = brute_force_distance('euclidean', samples, features, targets)
+    assert np.allclose(metric.distance(features, targets), expected, atol = 1e-5)
+    nbytes = gallery.nbytes()
+    gallery.retain([2, 3])
+    assert gallery.blocks[0] is None and gallery.nbytes() < nbytes / 100
+    assert np.allclose(metric.distance(features, [2]), expected[2:], atol = 1e-5)
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,24 @@
+import pytest
+
+import numpy as np
+from videoflow_contrib.tracker_deepsort.nn_matching import NearestNeighborDistanceMetric
+
+@pytest.mark.parametrize('feature_dtype', ['float16', 'int8'])
+@pytest.mark.parametrize('metric', ['cosine', 'euclidean'])
+def test_compressed_gallery_distances(feature_dtype, metric):
+    rng = np.random.RandomState(1)
+    features = rng.normal(size = (60, 32))
+    targets = np.repeat(np.arange(20), 3)
+    queries = rng.normal(size = (7, 32))
+    reference = NearestNeighborDistanceMetric(metric, 0.2, budget = 2)
+    compressed = NearestNeighborDistanceMetric(metric, 0.2, budget = 2, feature_dtype = feature_dtype)
+    for m in [reference, compressed]:
+        m.partial_fit(features, targets, list(range(20)))
+    assert compressed.gallery.features.dtype == np.dtype(feature_dtype)
+    expected = reference.distance(queries, list(range(20)))
+    tolerance = 1e-2 * np.abs(expected).max()
+    assert np.allclose(compressed.distance(queries, list(range(20))), expected, atol = tolerance)
+    assert np.allclose(compressed.samples[3], reference.samples[3], atol = 0.05)
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,56 @@
+import pytest
+
+import numpy as np
+from videoflow_contrib.features import ann_index
+from videoflow_contrib.tracker_deepsort import DeepSort, checkpoint
+
+def scene(nb_boxes, nb_frames, seed):
+    '''
+    Returns a list of np.array of shape (nb_boxes, [top, left, width, height, confidence, features...])
+    '''
+    rng = np.random.RandomState(seed)
+    tl = rng.uniform(0, 1000, size = (nb_boxes, 2))
+    wh = rng.uniform(20, 80, size = (nb_boxes, 2))
+    v = rng.uniform(-3, 3, size = (nb_boxes, 2))
+    features = rng.normal(size = (nb_boxes, 128))
+    frames = []
+    for f in range(nb_frames):
+        bboxes = np.concatenate([
+            tl + f * v,
+            wh,
+            np.ones((nb_boxes, 1)),
+            features + rng.normal(0, 0.1, size = features.shape)
+        ], axis = 1)
+        frames.append(bboxes[rng.rand(nb_boxes) > 0.1])
+    return frames
+
+NN_INDEXES = [(None, None), ('exact', None), ('ivf', {'nb_lists': 4, 'nb_probes': 2, 'nb_training_vectors': 64})]
+if ann_index.faiss is not None:
+    NN_INDEXES.append(('faiss', {'description': 'Flat'}))
+
+@pytest.mark.parametrize('nn_index_type, nn_index_params', NN_INDEXES)
+@pytest.mark.parametrize('nn_budget', [None, 5])
+def test_single_pass_cascade_matches_per_level_cascade(nn_index_type, nn_index_params, nn_budget):
+    trackers = [DeepSort(nn_budget = nn_budget, nn_index_type = nn_index_type, nn_index_params = nn_index_params,
+        single_pass_cascade = single_pass_cascade) for single_pass_cascade in [False, True]]
+    rng = np.random.RandomState(1)
+    for bboxes in scene(40, 40, 1):
+        # Detections missing for a few frames give tracks of several ages
+        bboxes = bboxes[rng.rand(len(bboxes)) > 0.3]
+        per_level, single_pass = [tracker.process(bboxes) for tracker in trackers]
+        assert np.array_equal(per_level, single_pass)
+    ages = {t.time_since_update for t in trackers[0]._tracker.tracks}
+    assert len(ages) > 2
+
+def test_restored_tracker_continues_tracking():
+    frames = scene(40, 30, 0)
+    deepsort = DeepSort(nn_budget = 5)
+    for bboxes in frames[:15]:
+        deepsort.process(bboxes)
+    restored = DeepSort(nn_budget = 5)
+    restored.set_state(checkpoint.loads(checkpoint.dumps(deepsort.get_state())))
+    for bboxes in frames[15:]:
+        assert np.array_equal(deepsort.process(bboxes), restored.process(bboxes))
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,37 @@
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import io
+
+import numpy as np
+
+'''
+Serialization of tracker states. A tracker state is a flat dict that maps names
+to np.array (scalars are stored as 0-d arrays).  It is written with the
+uncompressed npz format, so that snapshots are cheap to take and to restore,
+and it never pickles Python objects.
+'''
+
+def dumps(state):
+    '''
+    - Arguments:
+        - state: dict of str -> np.array, as returned by a tracker ``get_state``
+
+    - Returns:
+        - data: bytes
+    '''
+    buffer = io.BytesIO()
+    np.savez(buffer, **state)
+    return buffer.getvalue()
+
+def loads(data):
+    '''
+    - Arguments:
+        - data: bytes, as returned by ``dumps``
+
+    - Returns:
+        - state: dict of str -> np.array, to be passed to a tracker ``set_state``
+    '''
+    with np.load(io.BytesIO(data), allow_pickle = False) as npz:
+        return {k: npz[k] for k in npz.files}
@@ -5,7 +5,7 @@ from __future__ import absolute_import
 import numpy as np
 from videoflow.core.node import OneTaskProcessorNode
 
-from .detection import Detection
+from .detection import DetectionBatch
 from .nn_matching import NearestNeighborDistanceMetric
 from .tracker import Tracker
 
@@ -21,19 +21,52 @@ class DeepSort(OneTaskProcessorNode):
             features
         - nn_budget: Maximum size of the appeareance descriptors gallery. \
             If None, no budget is enforced.
+        - assignment_solver_type: One of ``scipy`` (optimal), ``greedy`` (greedy \
+            gated matcher, for very large scenes) or ``sparse`` (optimal over the \
+            gated pairs only).
+        - nn_index_type: If None, appearance distances are computed exhaustively \
+            over the gallery. Otherwise ``exact``, ``ivf`` or ``faiss``: the \
+            gallery is mirrored in a nearest neighbor index, which keeps \
+            matching fast with large galleries (e.g. no ``nn_budget`` on long videos).
+        - nn_index_params: dict of keyword arguments of the index, see ``ann_index``
+        - single_pass_cascade: If True, the appearance cost matrix is computed \
+            once per frame and sliced by the levels of the matching cascade, \
+            instead of being recomputed for each track age. Same matches.
+        - feature_dtype: ``float32``, ``float16`` or ``int8``. Storage type of the \
+            appearance descriptors gallery, see ``quantization``. The features \
+            of the input can already be quantized, e.g. the codes of ``HumanEncoder``.
     '''
     def __init__(self, min_height = 0, max_cosine_distance = 0.2,
-                nn_budget = None):
+                nn_budget = None, assignment_solver_type = 'scipy',
+                nn_index_type = None, nn_index_params = None,
+                single_pass_cascade = False, feature_dtype = 'float32'):
         self._min_height = min_height
         self._max_cosine_distance = max_cosine_distance
         self._nn_budget = nn_budget
         
         metric = NearestNeighborDistanceMetric(
-            "cosine", self._max_cosine_distance, self._nn_budget
+            "cosine", self._max_cosine_distance, self._nn_budget,
+            index_type = nn_index_type, index_params = nn_index_params,
+            feature_dtype = feature_dtype
+        )
+        self._tracker = Tracker(
+            metric, assignment_solver_type = assignment_solver_type,
+            single_pass_cascade = single_pass_cascade
         )
-        self._tracker = Tracker(metric)
         super(DeepSort, self).__init__()
     
+    def get_state(self):
+        '''
+        Returns a snapshot of the tracker, see ``Tracker.get_state``.
+        '''
+        return self._tracker.get_state()
+
+    def set_state(self, state):
+        '''
+        Restores a snapshot returned by ``get_state``.
+        '''
+        self._tracker.set_state(state)
+
     def process(self, bboxes):
         '''
         - Arguments:
@@ -44,29 +77,22 @@ class DeepSort(OneTaskProcessorNode):
             - tracks: (np.array) (nb_boxes, 5) \
                 Specifically (nb_boxes, [top, left, width, height, track_id])
         '''
-        detection_list = []
-        dets_to_bboxes_d = {}
-        dets_idx = -1
-        for idx, bbox_data in enumerate(bboxes):
-            bbox, confidence, feature = bbox_data[0:4], bbox_data[4], bbox_data[5:]
-            if bbox[3] < self._min_height:
-                continue            
-            detection_list.append(Detection(bbox, confidence, feature))
-            dets_idx += 1
-            dets_to_bboxes_d[dets_idx] = idx
-    
+        keep = np.flatnonzero(bboxes[:, 3] >= self._min_height)
+        if len(keep) == len(bboxes):
+            detections = DetectionBatch.from_array(bboxes)
+        else:
+            detections = DetectionBatch.from_array(bboxes[keep])
+
         to_return = np.concatenate([bboxes[:,0:4], np.full((bboxes.shape[0], 1), -1)], axis = 1)
         self._tracker.predict()
-        matches, _, unmatched_dets = self._tracker.update(detection_list)
-        tracks_to_dets_d = dict(matches)
-        
-        for idx, track in enumerate(self._tracker.tracks):
-            if not track.is_confirmed() or track.time_since_update > 1:
-                continue
-            bbox = track.to_tlwh()
-            new_box = np.array([bbox[0], bbox[1], bbox[2], bbox[3], track.track_id], np.int32)
-            box_idx = dets_to_bboxes_d.get(tracks_to_dets_d.get(idx, None), None)
-            if box_idx is not None:
-                to_return[box_idx] = new_box
-        
+        # Track indexes in matches refer to the tracks before the update, which
+        # drops deleted tracks
+        tracks = self._tracker.tracks
+        matches, _, _ = self._tracker.update(detections)
+        matches = [(tracks[i], j) for i, j in matches if tracks[i].is_confirmed()]
+        if len(matches) > 0:
+            rows = keep[[j for _, j in matches]]
+            to_return[rows, 0:4] = [t.to_tlwh() for t, _ in matches]
+            to_return[rows, 4] = [t.track_id for t, _ in matches]
+
         return np.array(to_return, np.int32)
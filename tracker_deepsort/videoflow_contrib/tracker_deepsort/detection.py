@@ -23,7 +23,7 @@ class Detection(object):
     """
 
     def __init__(self, tlwh, confidence, feature):
-        self.tlwh = np.asarray(tlwh, dtype=np.float)
+        self.tlwh = np.asarray(tlwh, dtype=np.float64)
         self.confidence = float(confidence)
         self.feature = np.asarray(feature, dtype=np.float32)
 
@@ -42,4 +42,70 @@ class Detection(object):
         ret = self.tlwh.copy()
         ret[:2] += ret[2:] / 2
         ret[2] /= ret[3]
-        return ret
\ No newline at end of file
+        return ret
+
+
+class DetectionBatch(object):
+    """
+    The bounding box detections of a single image, stored column-wise so that
+    they can be matched without creating a `Detection` per box.
+    Parameters
+    ----------
+    tlwh : array_like
+        An Nx4 matrix of bounding boxes in format `(x, y, w, h)`.
+    confidence : array_like
+        The N detector confidence scores.
+    feature : array_like
+        An NxM matrix of feature vectors, one per detection.
+    Attributes
+    ----------
+    tlwh : ndarray
+        Bounding boxes in format `(top left x, top left y, width, height)`.
+    confidence : ndarray
+        Detector confidence scores.
+    feature : ndarray
+        Feature vectors, as float32 like the feature of `Detection`. They are
+        converted once for the whole batch, and only if `feature` is not
+        already a float32 ndarray.
+    """
+
+    def __init__(self, tlwh, confidence, feature):
+        self.tlwh = np.asarray(tlwh, dtype=np.float64).reshape(-1, 4)
+        self.confidence = np.asarray(confidence, dtype=np.float64)
+        self.feature = np.asarray(feature, dtype=np.float32)
+
+    @classmethod
+    def from_array(cls, bboxes):
+        """Create a batch from an Nx(5+M) matrix of rows
+        `(x, y, w, h, confidence, feature...)`.
+        """
+        return cls(bboxes[:, 0:4], bboxes[:, 4], bboxes[:, 5:])
+
+    @classmethod
+    def from_detections(cls, detections):
+        """Create a batch from a list of `Detection`."""
+        if len(detections) == 0:
+            return cls(np.zeros((0, 4)), np.zeros((0,)), np.zeros((0, 0)))
+        return cls(
+            np.array([d.tlwh for d in detections]),
+            np.array([d.confidence for d in detections]),
+            np.array([d.feature for d in detections]))
+
+    def __len__(self):
+        return len(self.tlwh)
+
+    def to_tlbr(self):
+        """Convert bounding boxes to format `(min x, min y, max x, max y)`.
+        """
+        ret = self.tlwh.copy()
+        ret[:, 2:] += ret[:, :2]
+        return ret
+
+    def to_xyah(self):
+        """Convert bounding boxes to format `(center x, center y, aspect
+        ratio, height)`, where the aspect ratio is `width / height`.
+        """
+        ret = self.tlwh.copy()
+        ret[:, :2] += ret[:, 2:] / 2
+        ret[:, 2] /= ret[:, 3]
+        return ret
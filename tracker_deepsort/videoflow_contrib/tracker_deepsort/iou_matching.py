@@ -5,6 +5,9 @@ from . import linear_assignment
 
 def iou(bbox, candidates):
     """Computer intersection over union.
+    The last axis of `bbox` and `candidates` holds the box coordinates and
+    the other axes are broadcast against each other, so that an Nx1x4 `bbox`
+    and a 1xMx4 `candidates` give the NxM pairwise intersection over union.
     Parameters
     ----------
     bbox : ndarray
@@ -19,19 +22,18 @@ def iou(bbox, candidates):
         candidate. A higher score means a larger fraction of the `bbox` is
         occluded by the candidate.
     """
-    bbox_tl, bbox_br = bbox[:2], bbox[:2] + bbox[2:]
-    candidates_tl = candidates[:, :2]
-    candidates_br = candidates[:, :2] + candidates[:, 2:]
+    bbox_x, bbox_y, bbox_w, bbox_h = (bbox[..., k] for k in range(4))
+    candidates_x, candidates_y, candidates_w, candidates_h = \
+        (candidates[..., k] for k in range(4))
 
-    tl = np.c_[np.maximum(bbox_tl[0], candidates_tl[:, 0])[:, np.newaxis],
-               np.maximum(bbox_tl[1], candidates_tl[:, 1])[:, np.newaxis]]
-    br = np.c_[np.minimum(bbox_br[0], candidates_br[:, 0])[:, np.newaxis],
-               np.minimum(bbox_br[1], candidates_br[:, 1])[:, np.newaxis]]
-    wh = np.maximum(0., br - tl)
+    w = np.minimum(bbox_x + bbox_w, candidates_x + candidates_w) - \
+        np.maximum(bbox_x, candidates_x)
+    h = np.minimum(bbox_y + bbox_h, candidates_y + candidates_h) - \
+        np.maximum(bbox_y, candidates_y)
 
-    area_intersection = wh.prod(axis=1)
-    area_bbox = bbox[2:].prod()
-    area_candidates = candidates[:, 2:].prod(axis=1)
+    area_intersection = np.maximum(0., w) * np.maximum(0., h)
+    area_bbox = bbox_w * bbox_h
+    area_candidates = candidates_w * candidates_h
     return area_intersection / (area_bbox + area_candidates - area_intersection)
 
 
@@ -42,8 +44,8 @@ def iou_cost(tracks, detections, track_indices=None,
     ----------
     tracks : List[deep_sort.track.Track]
         A list of tracks.
-    detections : List[deep_sort.detection.Detection]
-        A list of detections.
+    detections : detection.DetectionBatch
+        The detections at the current time step.
     track_indices : Optional[List[int]]
         A list of indices to tracks that should be matched. Defaults to
         all `tracks`.
@@ -56,19 +58,20 @@ def iou_cost(tracks, detections, track_indices=None,
         Returns a cost matrix of shape
         len(track_indices), len(detection_indices) where entry (i, j) is
         `1 - iou(tracks[track_indices[i]], detections[detection_indices[j]])`.
+        Rows of tracks that were not updated in the previous frame are set to
+        `linear_assignment.INFTY_COST`.
     """
     if track_indices is None:
         track_indices = np.arange(len(tracks))
     if detection_indices is None:
         detection_indices = np.arange(len(detections))
+    if len(track_indices) == 0 or len(detection_indices) == 0:
+        return np.zeros((len(track_indices), len(detection_indices)))
 
-    cost_matrix = np.zeros((len(track_indices), len(detection_indices)))
-    for row, track_idx in enumerate(track_indices):
-        if tracks[track_idx].time_since_update > 1:
-            cost_matrix[row, :] = linear_assignment.INFTY_COST
-            continue
-
-        bbox = tracks[track_idx].to_tlwh()
-        candidates = np.asarray([detections[i].tlwh for i in detection_indices])
-        cost_matrix[row, :] = 1. - iou(bbox, candidates)
-    return cost_matrix
\ No newline at end of file
+    bboxes = np.array([tracks[i].to_tlwh() for i in track_indices])
+    candidates = detections.tlwh[np.asarray(detection_indices, dtype=int)]
+    cost_matrix = 1. - iou(bboxes[:, np.newaxis], candidates[np.newaxis])
+    is_stale = np.array(
+        [tracks[i].time_since_update > 1 for i in track_indices])
+    cost_matrix[is_stale] = linear_assignment.INFTY_COST
+    return cost_matrix
@@ -203,4 +203,134 @@ class KalmanFilter(object):
             cholesky_factor, d.T, lower=True, check_finite=False,
             overwrite_b=True)
         squared_maha = np.sum(z * z, axis=0)
-        return squared_maha
\ No newline at end of file
+        return squared_maha
+
+    def _motion_std(self, height):
+        """Standard deviation of the process noise of each state component,
+        as an Nx8 array for an array of N heights.
+        """
+        height = np.asarray(height, dtype=float)
+        pos = self._std_weight_position * height
+        vel = self._std_weight_velocity * height
+        return np.stack([
+            pos, pos, np.full_like(height, 1e-2), pos,
+            vel, vel, np.full_like(height, 1e-5), vel], axis=-1)
+
+    def _innovation_std(self, height):
+        """Standard deviation of the measurement noise of each measurement
+        component, as an Nx4 array for an array of N heights.
+        """
+        height = np.asarray(height, dtype=float)
+        pos = self._std_weight_position * height
+        return np.stack(
+            [pos, pos, np.full_like(height, 1e-1), pos], axis=-1)
+
+    def multi_predict(self, mean, covariance):
+        """Run Kalman filter prediction step for N tracks at once.
+        Parameters
+        ----------
+        mean : ndarray
+            The Nx8 dimensional mean vectors of the object states at the
+            previous time step.
+        covariance : ndarray
+            The Nx8x8 dimensional covariance matrices of the object states at
+            the previous time step.
+        Returns
+        -------
+        (ndarray, ndarray)
+            Returns the mean vectors and covariance matrices of the predicted
+            states.
+        """
+        diag = np.arange(8)
+        # As in `predict`, the noise is relative to the height before the
+        # prediction.
+        motion_var = np.square(self._motion_std(mean[:, 3]))
+        mean = np.dot(mean, self._motion_mat.T)
+        covariance = np.matmul(
+            np.matmul(self._motion_mat, covariance), self._motion_mat.T)
+        covariance[:, diag, diag] += motion_var
+        return mean, covariance
+
+    def multi_project(self, mean, covariance):
+        """Project N state distributions to measurement space.
+        Parameters
+        ----------
+        mean : ndarray
+            The Nx8 dimensional mean vectors.
+        covariance : ndarray
+            The Nx8x8 dimensional covariance matrices.
+        Returns
+        -------
+        (ndarray, ndarray)
+            Returns the Nx4 projected means and Nx4x4 projected covariance
+            matrices.
+        """
+        diag = np.arange(4)
+        projected_cov = covariance[:, :4, :4].copy()
+        projected_cov[:, diag, diag] += np.square(
+            self._innovation_std(mean[:, 3]))
+        return mean[:, :4], projected_cov
+
+    def multi_update(self, mean, covariance, measurements):
+        """Run Kalman filter correction step for N tracks at once.
+        Parameters
+        ----------
+        mean : ndarray
+            The Nx8 dimensional predicted mean vectors.
+        covariance : ndarray
+            The Nx8x8 dimensional covariance matrices.
+        measurements : ndarray
+            The Nx4 dimensional measurements (x, y, a, h) of each track.
+        Returns
+        -------
+        (ndarray, ndarray)
+            Returns the measurement-corrected state distributions.
+        """
+        projected_mean, projected_cov = self.multi_project(mean, covariance)
+
+        # The update matrix selects the first 4 state components, so
+        # covariance * H' reduces to a slice. projected_cov is symmetric,
+        # so K' = S^-1 (P H')' can be solved for directly.
+        kalman_gain = np.linalg.solve(
+            projected_cov, covariance[:, :, :4].transpose(0, 2, 1)
+        ).transpose(0, 2, 1)
+        innovation = measurements - projected_mean
+
+        new_mean = mean + np.matmul(
+            kalman_gain, innovation[:, :, None])[:, :, 0]
+        new_covariance = covariance - np.matmul(
+            np.matmul(kalman_gain, projected_cov),
+            kalman_gain.transpose(0, 2, 1))
+        return new_mean, new_covariance
+
+    def multi_gating_distance(self, mean, covariance, measurements,
+                              only_position=False):
+        """Compute gating distance between N state distributions and M
+        measurements at once. See `gating_distance`.
+        Parameters
+        ----------
+        mean : ndarray
+            The Nx8 dimensional mean vectors of the state distributions.
+        covariance : ndarray
+            The Nx8x8 dimensional covariance matrices of the state
+            distributions.
+        measurements : ndarray
+            An Mx4 dimensional matrix of M measurements in format (x, y, a, h).
+        only_position : Optional[bool]
+            If True, distance computation is done with respect to the bounding
+            box center position only.
+        Returns
+        -------
+        ndarray
+            Returns an NxM array, where element (i, j) contains the squared
+            Mahalanobis distance between the i-th state distribution and
+            `measurements[j]`.
+        """
+        mean, covariance = self.multi_project(mean, covariance)
+        if only_position:
+            mean, covariance = mean[:, :2], covariance[:, :2, :2]
+            measurements = measurements[:, :2]
+
+        d = measurements[None, :, :] - mean[:, None, :]
+        z = np.linalg.solve(covariance, d.transpose(0, 2, 1))
+        return np.einsum('nmi,nim->nm', d, z)
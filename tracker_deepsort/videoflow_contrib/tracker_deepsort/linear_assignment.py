@@ -1,7 +1,7 @@
 from __future__ import absolute_import
 import numpy as np
-from sklearn.utils.linear_assignment_ import linear_assignment
 from . import kalman_filter
+from .assignment import scipy_solver
 
 
 INFTY_COST = 1e+5
@@ -9,11 +9,11 @@ INFTY_COST = 1e+5
 
 def min_cost_matching(
         distance_metric, max_distance, tracks, detections, track_indices=None,
-        detection_indices=None):
+        detection_indices=None, solver=scipy_solver):
     """Solve linear assignment problem.
     Parameters
     ----------
-    distance_metric : Callable[List[Track], List[Detection], List[int], List[int]) -> ndarray
+    distance_metric : Callable[List[Track], DetectionBatch, List[int], List[int]) -> ndarray
         The distance metric is given a list of tracks and detections as well as
         a list of N track indices and M detection indices. The metric should
         return the NxM dimensional cost matrix, where element (i, j) is the
@@ -24,14 +24,17 @@ def min_cost_matching(
         disregarded.
     tracks : List[track.Track]
         A list of predicted tracks at the current time step.
-    detections : List[detection.Detection]
-        A list of detections at the current time step.
+    detections : detection.DetectionBatch
+        The detections at the current time step.
     track_indices : List[int]
         List of track indices that maps rows in `cost_matrix` to tracks in
         `tracks` (see description above).
     detection_indices : List[int]
         List of detection indices that maps columns in `cost_matrix` to
         detections in `detections` (see description above).
+    solver : Optional[Callable[ndarray, float] -> ndarray]
+        One of the solvers in `assignment`. Defaults to scipy's optimal
+        `linear_sum_assignment`.
     Returns
     -------
     (List[(int, int)], List[int], List[int])
@@ -51,7 +54,7 @@ def min_cost_matching(
     cost_matrix = distance_metric(
         tracks, detections, track_indices, detection_indices)
     cost_matrix[cost_matrix > max_distance] = max_distance + 1e-5
-    indices = linear_assignment(cost_matrix)
+    indices = solver(cost_matrix, max_distance)
 
     matches, unmatched_tracks, unmatched_detections = [], [], []
     for col, detection_idx in enumerate(detection_indices):
@@ -73,11 +76,12 @@ def min_cost_matching(
 
 def matching_cascade(
         distance_metric, max_distance, cascade_depth, tracks, detections,
-        track_indices=None, detection_indices=None):
+        track_indices=None, detection_indices=None, solver=scipy_solver,
+        single_pass=False):
     """Run matching cascade.
     Parameters
     ----------
-    distance_metric : Callable[List[Track], List[Detection], List[int], List[int]) -> ndarray
+    distance_metric : Callable[List[Track], DetectionBatch, List[int], List[int]) -> ndarray
         The distance metric is given a list of tracks and detections as well as
         a list of N track indices and M detection indices. The metric should
         return the NxM dimensional cost matrix, where element (i, j) is the
@@ -90,8 +94,8 @@ def matching_cascade(
         The cascade depth, should be se to the maximum track age.
     tracks : List[track.Track]
         A list of predicted tracks at the current time step.
-    detections : List[detection.Detection]
-        A list of detections at the current time step.
+    detections : detection.DetectionBatch
+        The detections at the current time step.
     track_indices : Optional[List[int]]
         List of track indices that maps rows in `cost_matrix` to tracks in
         `tracks` (see description above). Defaults to all tracks.
@@ -99,6 +103,14 @@ def matching_cascade(
         List of detection indices that maps columns in `cost_matrix` to
         detections in `detections` (see description above). Defaults to all
         detections.
+    solver : Optional[Callable[ndarray, float] -> ndarray]
+        One of the solvers in `assignment`, passed on to `min_cost_matching`.
+    single_pass : Optional[bool]
+        If True, the cost matrix of all tracks and detections is computed with
+        a single call to `distance_metric`, and every level of the cascade is
+        solved on a slice of it. The result is the same as with one call per
+        level, as long as each entry of the cost matrix only depends on its
+        track and detection. Defaults to False.
     Returns
     -------
     (List[(int, int)], List[int], List[int])
@@ -112,6 +124,12 @@ def matching_cascade(
     if detection_indices is None:
         detection_indices = list(range(len(detections)))
 
+    if single_pass and len(track_indices) > 0 and len(detection_indices) > 0:
+        distance_metric = _sliced_metric(
+            distance_metric(tracks, detections, track_indices,
+                            detection_indices),
+            track_indices, detection_indices)
+
     unmatched_detections = detection_indices
     matches = []
     for level in range(cascade_depth):
@@ -128,12 +146,28 @@ def matching_cascade(
         matches_l, _, unmatched_detections = \
             min_cost_matching(
                 distance_metric, max_distance, tracks, detections,
-                track_indices_l, unmatched_detections)
+                track_indices_l, unmatched_detections, solver)
         matches += matches_l
     unmatched_tracks = list(set(track_indices) - set(k for k, _ in matches))
     return matches, unmatched_tracks, unmatched_detections
 
 
+def _sliced_metric(cost_matrix, track_indices, detection_indices):
+    """Return a distance metric that looks up the entries of a precomputed
+    cost matrix, whose rows and columns are `track_indices` and
+    `detection_indices`.
+    """
+    track_rows = {k: i for i, k in enumerate(track_indices)}
+    detection_cols = {k: j for j, k in enumerate(detection_indices)}
+
+    def distance_metric(tracks, detections, track_indices_l,
+                        detection_indices_l):
+        rows = [track_rows[k] for k in track_indices_l]
+        cols = [detection_cols[k] for k in detection_indices_l]
+        return cost_matrix[np.ix_(rows, cols)]
+    return distance_metric
+
+
 def gate_cost_matrix(
         kf, cost_matrix, tracks, detections, track_indices, detection_indices,
         gated_cost=INFTY_COST, only_position=False):
@@ -149,8 +183,8 @@ def gate_cost_matrix(
         `detections[detection_indices[j]]`.
     tracks : List[track.Track]
         A list of predicted tracks at the current time step.
-    detections : List[detection.Detection]
-        A list of detections at the current time step.
+    detections : detection.DetectionBatch
+        The detections at the current time step.
     track_indices : List[int]
         List of track indices that maps rows in `cost_matrix` to tracks in
         `tracks` (see description above).
@@ -170,11 +204,12 @@ def gate_cost_matrix(
     """
     gating_dim = 2 if only_position else 4
     gating_threshold = kalman_filter.chi2inv95[gating_dim]
-    measurements = np.asarray(
-        [detections[i].to_xyah() for i in detection_indices])
-    for row, track_idx in enumerate(track_indices):
-        track = tracks[track_idx]
-        gating_distance = kf.gating_distance(
-            track.mean, track.covariance, measurements, only_position)
-        cost_matrix[row, gating_distance > gating_threshold] = gated_cost
+    if len(track_indices) == 0 or len(detection_indices) == 0:
+        return cost_matrix
+    measurements = detections.to_xyah()[np.asarray(detection_indices)]
+    gating_distance = kf.multi_gating_distance(
+        np.array([tracks[i].mean for i in track_indices]),
+        np.array([tracks[i].covariance for i in track_indices]),
+        measurements, only_position)
+    cost_matrix[gating_distance > gating_threshold] = gated_cost
     return cost_matrix
\ No newline at end of file
@@ -1,86 +1,345 @@
 import numpy as np
+from videoflow_contrib.features.ann_index import index_factory
+from videoflow_contrib.features.quantization import check_dtype, quantize, dequantize
 
 
-def _pdist(a, b):
-    """Compute pair-wise squared distance between points in `a` and `b`.
-    Parameters
-    ----------
-    a : array_like
-        An NxM matrix of N samples of dimensionality M.
-    b : array_like
-        An LxM matrix of L samples of dimensionality M.
-    Returns
-    -------
-    ndarray
-        Returns a matrix of size len(a), len(b) such that eleement (i, j)
-        contains the squared distance between `a[i]` and `b[j]`.
+def stack_features(features):
+    """Stack a list of feature vectors into a matrix, also when it is empty.
     """
-    a, b = np.asarray(a), np.asarray(b)
-    if len(a) == 0 or len(b) == 0:
-        return np.zeros((len(a), len(b)))
-    a2, b2 = np.square(a).sum(axis=1), np.square(b).sum(axis=1)
-    r2 = -2. * np.dot(a, b.T) + a2[:, None] + b2[None, :]
-    r2 = np.clip(r2, 0., float(np.inf))
-    return r2
+    if len(features) == 0:
+        return np.zeros((0, 0), dtype=np.float32)
+    return np.asarray(features, dtype=np.float32)
 
 
-def _cosine_distance(a, b, data_is_normalized=False):
-    """Compute pair-wise cosine distance between points in `a` and `b`.
-    Parameters
-    ----------
-    a : array_like
-        An NxM matrix of N samples of dimensionality M.
-    b : array_like
-        An LxM matrix of L samples of dimensionality M.
-    data_is_normalized : Optional[bool]
-        If True, assumes rows in a and b are unit length vectors.
-        Otherwise, a and b are explicitly normalized to lenght 1.
-    Returns
-    -------
-    ndarray
-        Returns a matrix of size len(a), len(b) such that eleement (i, j)
-        contains the squared distance between `a[i]` and `b[j]`.
-    """
-    if not data_is_normalized:
-        a = np.asarray(a) / np.linalg.norm(a, axis=1, keepdims=True)
-        b = np.asarray(b) / np.linalg.norm(b, axis=1, keepdims=True)
-    return 1. - np.dot(a, b.T)
+def _normalize(features):
+    """Scale the rows of `features` to unit length."""
+    norms = np.linalg.norm(features, axis=1, keepdims=True)
+    return features / np.maximum(norms, np.finfo(np.float32).tiny)
 
 
-def _nn_euclidean_distance(x, y):
-    """ Helper function for nearest neighbor distance metric (Euclidean).
-    Parameters
-    ----------
-    x : ndarray
-        A matrix of N row-vectors (sample points).
-    y : ndarray
-        A matrix of M row-vectors (query points).
-    Returns
-    -------
-    ndarray
-        A vector of length M that contains for each entry in `y` the
-        smallest Euclidean distance to a sample in `x`.
-    """
-    distances = _pdist(x, y)
-    return np.maximum(0.0, distances.min(axis=0))
+# Initial number of samples of the block of a target in a gallery without
+# budget. Blocks double when they are full.
+_MIN_BLOCK_SIZE = 8
 
 
-def _nn_cosine_distance(x, y):
-    """ Helper function for nearest neighbor distance metric (cosine).
+class FeatureGallery(object):
+    """
+    Store of the most recent samples of each target, with a row per target.
+
+    With a budget, all samples live in one preallocated
+    `(capacity, budget, dim)` ring buffer, so that storing samples does not
+    allocate and that distances to many targets are a single batched product.
+    Without a budget, histories can have very different lengths, so each row
+    has its own block of samples, which doubles when it is full. Distances
+    are then a single product with the samples of the queried rows put end to
+    end, and memory and time follow the number of samples instead of the
+    longest history.
     Parameters
     ----------
-    x : ndarray
-        A matrix of N row-vectors (sample points).
-    y : ndarray
-        A matrix of M row-vectors (query points).
-    Returns
-    -------
-    ndarray
-        A vector of length M that contains for each entry in `y` the
-        smallest cosine distance to a sample in `x`.
+    budget : Optional[int]
+        If not None, keep at most this number of samples per target and
+        overwrite the oldest ones when it is reached. If None, all the
+        samples of a target are kept until it is dropped.
+    normalize : Optional[bool]
+        If True, samples are scaled to unit length when they are stored.
+    capacity : Optional[int]
+        Initial number of target rows. It doubles when all rows are in use.
+    index : Optional[object]
+        If not None, one of the indexes of `ann_index`. Every stored sample is
+        mirrored in it under the id `sample_id(row, slot)`.
+    dtype : Optional[str]
+        One of `quantization.FEATURE_DTYPES`. With `float16` or `int8`, samples
+        are stored compressed, which divides the memory of the gallery by 2 or
+        4. Distances are computed on the compressed samples.
+    Attributes
+    ----------
+    features : ndarray
+        With a budget, the `(capacity, budget, dim)` buffer of samples. It is
+        None until the first sample is stored, and always None without a
+        budget. Slots `[0, counts[row])` of a row are valid.
+    sq_norms : ndarray
+        With a budget, the `(capacity, budget)` squared norm of each sample.
+    scales : ndarray
+        With a budget, the `(capacity, budget)` scale of each sample, see
+        `quantization`. It is only used with `int8` samples. With `normalize`,
+        it is the inverse norm of the codes, so that samples stay at unit
+        length.
+    blocks : List[Optional[Tuple[ndarray, ndarray, ndarray]]]
+        Without a budget, the `(features, sq_norms, scales)` of the samples of
+        each row, as above but without the row axis, or None for free rows.
+        Slots `[0, counts[row])` of a block are valid.
+    counts : ndarray
+        The number of valid samples of each row.
+    active : ndarray
+        A boolean mask of the rows that are assigned to a target.
     """
-    distances = _cosine_distance(x, y)
-    return distances.min(axis=0)
+
+    def __init__(self, budget=None, normalize=False, capacity=64,
+                 index=None, dtype='float32'):
+        self.budget = budget
+        self.normalize = normalize
+        self.index = index
+        self.dtype = check_dtype(dtype)
+        self.features = None
+        self.sq_norms = None
+        self.scales = None
+        self.blocks = [None] * capacity
+        self.counts = np.zeros(capacity, dtype=int)
+        self.active = np.zeros(capacity, dtype=bool)
+        self._heads = np.zeros(capacity, dtype=int)
+        self._rows = {}
+
+    def __len__(self):
+        return len(self._rows)
+
+    @staticmethod
+    def sample_id(rows, slots):
+        """Return the id under which the samples at `slots` of `rows` are
+        stored in the index. Rows and slots of a sample never change while it
+        is stored, also when the gallery grows.
+        """
+        return (np.asarray(rows, dtype=np.int64) << 32) | slots
+
+    @staticmethod
+    def sample_row(sample_ids):
+        """Return the row of each sample id, or -1 for negative ids."""
+        return np.where(sample_ids >= 0, sample_ids >> 32, -1)
+
+    def __contains__(self, target):
+        return target in self._rows
+
+    def targets(self):
+        """Return the list of targets that have samples."""
+        return list(self._rows.keys())
+
+    def rows(self, targets):
+        """Return the buffer row of each target in `targets`."""
+        return np.array([self._rows[t] for t in targets], dtype=int)
+
+    def nbytes(self):
+        """Return the memory used by the stored samples, in bytes."""
+        if self.budget is not None:
+            if self.features is None:
+                return 0
+            return (self.features.nbytes + self.sq_norms.nbytes +
+                    self.scales.nbytes)
+        return sum(sum(a.nbytes for a in block)
+                   for block in self.blocks if block is not None)
+
+    def _new_block(self, size, dim):
+        return (np.zeros((size, dim), dtype=self.dtype),
+                np.zeros(size, dtype=np.float32),
+                np.ones(size, dtype=np.float32))
+
+    def _grow(self, capacity):
+        old_capacity = len(self.counts)
+        if capacity == old_capacity:
+            return
+        pad = capacity - old_capacity
+        if self.features is not None:
+            features = np.zeros(
+                (capacity,) + self.features.shape[1:], dtype=self.dtype)
+            sq_norms = np.zeros((capacity, self.budget), dtype=np.float32)
+            scales = np.ones((capacity, self.budget), dtype=np.float32)
+            features[:old_capacity] = self.features
+            sq_norms[:old_capacity] = self.sq_norms
+            scales[:old_capacity] = self.scales
+            self.features, self.sq_norms, self.scales = \
+                features, sq_norms, scales
+        self.blocks.extend([None] * pad)
+        self.counts = np.r_[self.counts, np.zeros(pad, dtype=int)]
+        self.active = np.r_[self.active, np.zeros(pad, dtype=bool)]
+        self._heads = np.r_[self._heads, np.zeros(pad, dtype=int)]
+
+    def _allocate_rows(self, targets):
+        new_targets = [t for t in targets if t not in self._rows]
+        free = np.flatnonzero(~self.active)
+        if len(free) < len(new_targets):
+            capacity = len(self.counts)
+            while capacity - len(self._rows) < len(new_targets):
+                capacity *= 2
+            self._grow(capacity)
+            free = np.flatnonzero(~self.active)
+        for target, row in zip(new_targets, free):
+            self._rows[target] = row
+            self.active[row] = True
+        return self.rows(targets)
+
+    def _reserve_blocks(self, rows, nb_new, dim):
+        """Make the blocks of `rows` large enough for `nb_new` more samples
+        each.
+        """
+        for row, needed in zip(rows, self.counts[rows] + nb_new):
+            block = self.blocks[row]
+            size = _MIN_BLOCK_SIZE if block is None else len(block[1])
+            if block is not None and needed <= size:
+                continue
+            while size < needed:
+                size *= 2
+            new_block = self._new_block(size, dim)
+            if block is not None:
+                count = self.counts[row]
+                for new, old in zip(new_block, block):
+                    new[:count] = old[:count]
+            self.blocks[row] = new_block
+
+    def add(self, features, targets):
+        """Store new samples.
+        Parameters
+        ----------
+        features : ndarray
+            An NxM matrix of N features of dimensionality M.
+        targets : ndarray
+            An integer array of associated target identities.
+        """
+        features = np.asarray(features, dtype=np.float32)
+        if len(features) == 0:
+            return
+        if self.normalize:
+            features = _normalize(features)
+        if self.budget is not None and self.features is None:
+            capacity = len(self.counts)
+            self.features = np.zeros(
+                (capacity, self.budget, features.shape[1]), dtype=self.dtype)
+            self.sq_norms = np.zeros((capacity, self.budget),
+                                     dtype=np.float32)
+            self.scales = np.ones((capacity, self.budget), dtype=np.float32)
+
+        # Rank of each sample among the new samples of its target, in order
+        # of arrival.
+        unique_targets, inverse = np.unique(
+            np.asarray(targets), return_inverse=True)
+        unique_rows = self._allocate_rows(unique_targets.tolist())
+        nb_new = np.bincount(inverse)
+        order = np.argsort(inverse, kind='stable')
+        rank = np.empty(len(inverse), dtype=int)
+        rank[order] = np.arange(len(inverse)) - np.repeat(
+            np.cumsum(nb_new) - nb_new, nb_new)
+
+        if self.budget is not None:
+            # Only the last `budget` new samples of a target survive.
+            skipped = np.maximum(nb_new - self.budget, 0)
+            keep = rank >= skipped[inverse]
+            features, inverse = features[keep], inverse[keep]
+            rank = rank[keep] - skipped[inverse]
+            nb_new = nb_new - skipped
+
+        codes, scales = features, np.ones(len(features), dtype=np.float32)
+        if self.dtype != np.float32:
+            codes, scales = quantize(features, self.dtype, return_scales=True)
+            if self.normalize and self.dtype == np.int8:
+                # Keep samples at unit length once dequantized.
+                scales = 1. / np.maximum(np.linalg.norm(
+                    codes.astype(np.float32), axis=1), 1.)
+            # Norms and the index see the samples as they are stored.
+            features = dequantize(codes, scales)
+        sq_norms = np.square(features).sum(axis=1)
+
+        rows = unique_rows[inverse]
+        if self.budget is not None:
+            positions = (self._heads[rows] + rank) % self.budget
+            self.features[rows, positions] = codes
+            self.scales[rows, positions] = scales
+            self.sq_norms[rows, positions] = sq_norms
+            self.counts[unique_rows] = np.minimum(
+                self.counts[unique_rows] + nb_new, self.budget)
+            self._heads[unique_rows] = \
+                (self._heads[unique_rows] + nb_new) % self.budget
+        else:
+            positions = self.counts[rows] + rank
+            self._reserve_blocks(unique_rows, nb_new, features.shape[1])
+            for i in np.flatnonzero(nb_new):
+                samples = inverse == i
+                block_features, block_sq_norms, block_scales = \
+                    self.blocks[unique_rows[i]]
+                slots = positions[samples]
+                block_features[slots] = codes[samples]
+                block_sq_norms[slots] = sq_norms[samples]
+                block_scales[slots] = scales[samples]
+            self.counts[unique_rows] += nb_new
+        if self.index is not None:
+            # Overwritten slots keep their id, so the index replaces them.
+            self.index.add(self.sample_id(rows, positions), features)
+
+    def retain(self, targets):
+        """Drop all the targets that are not in `targets` and free their
+        rows.
+        """
+        targets = set(targets)
+        dropped = [t for t in self._rows if t not in targets]
+        rows = [self._rows.pop(t) for t in dropped]
+        if self.index is not None and len(rows) > 0:
+            self.index.remove(np.concatenate([
+                self.sample_id(row, np.arange(self.counts[row]))
+                for row in rows]))
+        for row in rows:
+            self.blocks[row] = None
+        self.active[rows] = False
+        self.counts[rows] = 0
+        self._heads[rows] = 0
+
+    def samples(self, target):
+        """Return the samples of `target`, oldest first, as a matrix."""
+        row = self._rows[target]
+        count = self.counts[row]
+        if self.budget is not None:
+            slots = (self._heads[row] - count + np.arange(count)) % self.budget
+            codes, scales = self.features[row, slots], self.scales[row, slots]
+        else:
+            block_features, _, block_scales = self.blocks[row]
+            codes, scales = block_features[:count], block_scales[:count]
+        if self.dtype != np.float32:
+            return dequantize(codes, scales)
+        return codes
+
+    def _dot(self, codes, scales, features):
+        """Return the dot products of the compressed samples `codes`, of shape
+        `(..., dim)`, with the N float32 `features`, of shape `(..., N)`. Only
+        these samples are converted to float32.
+        """
+        # A single product over all the samples, numpy runs a stacked matmul
+        # as one small product per row.
+        dots = np.matmul(
+            codes.reshape(-1, codes.shape[-1]).astype(np.float32, copy=False),
+            features.T).reshape(codes.shape[:-1] + (len(features),))
+        if self.dtype == np.int8:
+            dots *= scales[..., None]
+        return dots
+
+    def min_distances(self, rows, features, metric):
+        """Return the `(len(rows), N)` smallest distance between the samples
+        of each row and each of the N float32 `features`.
+        Parameters
+        ----------
+        rows : ndarray
+            Rows of the gallery.
+        features : ndarray
+            An NxM matrix of features, normalized for the cosine metric.
+        metric : str
+            Either "euclidean" or "cosine".
+        """
+        if self.budget is not None:
+            codes, sq_norms = self.features[rows], self.sq_norms[rows]
+            scales = self.scales[rows]
+            valid = np.arange(self.budget) < self.counts[rows, None]
+        else:
+            blocks = [self.blocks[row] for row in rows]
+            counts = self.counts[rows]
+            codes, sq_norms, scales = [np.concatenate(
+                [block[i][:count] for block, count in zip(blocks, counts)])
+                for i in range(3)]
+        dots = self._dot(codes, scales, features)
+        if metric == "cosine":
+            distances = 1. - dots
+        else:
+            distances = sq_norms[..., None] - 2. * dots
+            distances += np.square(features).sum(axis=1)
+            np.maximum(distances, 0., out=distances)
+        if self.budget is not None:
+            distances[~valid] = np.inf
+            return distances.min(axis=1)
+        starts = np.cumsum(counts) - counts
+        return np.minimum.reduceat(distances, starts, axis=0)
 
 
 class NearestNeighborDistanceMetric(object):
@@ -97,26 +356,59 @@ class NearestNeighborDistanceMetric(object):
     budget : Optional[int]
         If not None, fix samples per class to at most this number. Removes
         the oldest samples when the budget is reached.
+    index_type : Optional[str]
+        If None, distances are computed exhaustively against every sample of
+        the queried targets. Otherwise one of the index types of
+        `ann_index.index_factory` (`exact`, `ivf` or `faiss`): distances
+        are then computed from the `nb_neighbors` nearest samples of each
+        feature in the whole gallery. Queried targets that have none of them
+        are compared with the feature sample by sample, so a target with
+        many samples close to the feature does not hide the others. Use it
+        for large galleries, for example without a budget on long videos.
+    index_params : Optional[Dict[str -> object]]
+        Keyword arguments of the index.
+    nb_neighbors : Optional[int]
+        Number of nearest samples retrieved per feature from the index.
+    feature_dtype : Optional[str]
+        Storage type of the samples in the gallery, one of
+        `quantization.FEATURE_DTYPES`.
     Attributes
     ----------
-    samples : Dict[int -> List[ndarray]]
-        A dictionary that maps from target identities to the list of samples
-        that have been observed so far.
+    gallery : FeatureGallery
+        The samples that have been observed so far for each target. For the
+        cosine metric they are stored normalized to unit length.
     """
 
-    def __init__(self, metric, matching_threshold, budget=None):
-
-
-        if metric == "euclidean":
-            self._metric = _nn_euclidean_distance
-        elif metric == "cosine":
-            self._metric = _nn_cosine_distance
-        else:
+    def __init__(self, metric, matching_threshold, budget=None,
+                 index_type=None, index_params=None, nb_neighbors=32,
+                 feature_dtype='float32'):
+        if metric not in ("euclidean", "cosine"):
             raise ValueError(
                 "Invalid metric; must be either 'euclidean' or 'cosine'")
+        self.metric = metric
         self.matching_threshold = matching_threshold
         self.budget = budget
-        self.samples = {}
+        self.index_type = index_type
+        self.index_params = index_params or {}
+        self.nb_neighbors = nb_neighbors
+        self.feature_dtype = check_dtype(feature_dtype)
+        self.gallery = self._new_gallery()
+
+    def _new_gallery(self):
+        index = None
+        if self.index_type is not None:
+            index = index_factory(
+                self.index_type, self.metric, **self.index_params)
+        return FeatureGallery(
+            self.budget, normalize=self.metric == "cosine", index=index,
+            dtype=self.feature_dtype)
+
+    @property
+    def samples(self):
+        """Dict[int -> ndarray] that maps from target identities to the
+        matrix of samples that have been observed so far.
+        """
+        return {t: self.gallery.samples(t) for t in self.gallery.targets()}
 
     def partial_fit(self, features, targets, active_targets):
         """Update the distance metric with new data.
@@ -129,11 +421,33 @@ class NearestNeighborDistanceMetric(object):
         active_targets : List[int]
             A list of targets that are currently present in the scene.
         """
-        for feature, target in zip(features, targets):
-            self.samples.setdefault(target, []).append(feature)
-            if self.budget is not None:
-                self.samples[target] = self.samples[target][-self.budget:]
-        self.samples = {k: self.samples[k] for k in active_targets}
+        self.gallery.add(features, targets)
+        self.gallery.retain(active_targets)
+
+    def get_state(self):
+        """Return a snapshot of the stored samples.
+        Returns
+        -------
+        Dict[str -> ndarray]
+            `targets` and `counts` hold the identity of each target and its
+            number of samples, and `features` all the samples stacked in the
+            same order.
+        """
+        targets = self.gallery.targets()
+        samples = [self.gallery.samples(target) for target in targets]
+        return {
+            'targets': np.array(targets, dtype=int),
+            'counts': np.array([len(f) for f in samples], dtype=int),
+            'features': stack_features(
+                [f for target_samples in samples for f in target_samples])
+        }
+
+    def set_state(self, state):
+        """Restore a snapshot returned by `get_state`.
+        """
+        self.gallery = self._new_gallery()
+        self.gallery.add(
+            state['features'], np.repeat(state['targets'], state['counts']))
 
     def distance(self, features, targets):
         """Compute distance between features and targets.
@@ -150,7 +464,41 @@ class NearestNeighborDistanceMetric(object):
             element (i, j) contains the closest squared distance between
             `targets[i]` and `features[j]`.
         """
-        cost_matrix = np.zeros((len(targets), len(features)))
-        for i, target in enumerate(targets):
-            cost_matrix[i, :] = self._metric(self.samples[target], features)
-        return cost_matrix
\ No newline at end of file
+        if len(targets) == 0 or len(features) == 0:
+            return np.zeros((len(targets), len(features)))
+        features = np.asarray(features, dtype=np.float32)
+        if self.metric == "cosine":
+            features = _normalize(features)
+        rows = self.gallery.rows(targets)
+        if self.gallery.index is not None:
+            return self._index_distance(features, rows)
+        return self.gallery.min_distances(
+            rows, features, self.metric).astype(float)
+
+    def _index_distance(self, features, rows):
+        """Compute the cost matrix of `distance` from the nearest samples of
+        each feature in the index of the gallery.
+        """
+        distances, sample_ids = self.gallery.index.search(
+            features, self.nb_neighbors)
+        target_of_row = np.full(len(self.gallery.counts), -1, dtype=int)
+        target_of_row[rows] = np.arange(len(rows))
+        sample_rows = self.gallery.sample_row(sample_ids)
+        targets = np.where(sample_rows >= 0, target_of_row[sample_rows], -1)
+        hit = targets >= 0
+        cost_matrix = np.full((len(rows), len(features)), np.inf)
+        np.minimum.at(
+            cost_matrix, (targets[hit], np.nonzero(hit)[0]), distances[hit])
+        # Targets without any of the nearest samples of a feature are still
+        # compared with it, from their own samples only.
+        missed = np.isinf(cost_matrix)
+        missed_rows = np.flatnonzero(missed.any(axis=1))
+        if len(missed_rows) > 0:
+            missed_features = np.flatnonzero(missed[missed_rows].any(axis=0))
+            block = np.ix_(missed_rows, missed_features)
+            cost_matrix[block] = np.where(
+                missed[block],
+                self.gallery.min_distances(
+                    rows[missed_rows], features[missed_features], self.metric),
+                cost_matrix[block])
+        return cost_matrix
@@ -106,7 +106,20 @@ class Track:
         kf : kalman_filter.KalmanFilter
             The Kalman filter.
         """
-        self.mean, self.covariance = kf.predict(self.mean, self.covariance)
+        self.apply_prediction(*kf.predict(self.mean, self.covariance))
+
+    def apply_prediction(self, mean, covariance):
+        """Set the state distribution predicted for the current time step,
+        as computed by `predict` or by `KalmanFilter.multi_predict` for all
+        tracks at once.
+        Parameters
+        ----------
+        mean : ndarray
+            The predicted mean vector.
+        covariance : ndarray
+            The predicted covariance matrix.
+        """
+        self.mean, self.covariance = mean, covariance
         self.age += 1
         self.time_since_update += 1
 
@@ -120,9 +133,25 @@ class Track:
         detection : Detection
             The associated detection.
         """
-        self.mean, self.covariance = kf.update(
-            self.mean, self.covariance, detection.to_xyah())
-        self.features.append(detection.feature)
+        self.apply_update(
+            *kf.update(self.mean, self.covariance, detection.to_xyah()),
+            feature=detection.feature)
+
+    def apply_update(self, mean, covariance, feature):
+        """Set the measurement-corrected state distribution, as computed by
+        `update` or by `KalmanFilter.multi_update` for all matched tracks at
+        once, and update the feature cache.
+        Parameters
+        ----------
+        mean : ndarray
+            The corrected mean vector.
+        covariance : ndarray
+            The corrected covariance matrix.
+        feature : ndarray
+            Feature vector of the associated detection.
+        """
+        self.mean, self.covariance = mean, covariance
+        self.features.append(feature)
 
         self.hits += 1
         self.time_since_update = 0
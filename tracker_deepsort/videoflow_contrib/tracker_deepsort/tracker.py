@@ -3,6 +3,9 @@ import numpy as np
 from . import kalman_filter
 from . import linear_assignment
 from . import iou_matching
+from .assignment import solver_factory
+from .detection import DetectionBatch
+from .nn_matching import stack_features
 from .track import Track
 
 
@@ -19,6 +22,14 @@ class Tracker:
         Number of consecutive detections before the track is confirmed. The
         track state is set to `Deleted` if a miss occurs within the first
         `n_init` frames.
+    assignment_solver_type : str
+        One of `scipy` (optimal), `greedy` (greedy gated matcher, for very
+        large scenes) or `sparse` (optimal over the gated pairs only).
+    single_pass_cascade : bool
+        If True, the appearance cost matrix of the confirmed tracks is
+        computed and gated once per frame and the matching cascade solves each
+        track age on a slice of it, instead of recomputing it per age. The
+        matches are the same. Defaults to False.
     Attributes
     ----------
     metric : nn_matching.NearestNeighborDistanceMetric
@@ -33,11 +44,14 @@ class Tracker:
         The list of active tracks at the current time step.
     """
 
-    def __init__(self, metric, max_iou_distance=0.7, max_age=30, n_init=3):
+    def __init__(self, metric, max_iou_distance=0.7, max_age=30, n_init=3,
+                 assignment_solver_type='scipy', single_pass_cascade=False):
         self.metric = metric
         self.max_iou_distance = max_iou_distance
         self.max_age = max_age
         self.n_init = n_init
+        self.assignment_solver = solver_factory(assignment_solver_type)
+        self.single_pass_cascade = single_pass_cascade
 
         self.kf = kalman_filter.KalmanFilter()
         self.tracks = []
@@ -47,34 +61,51 @@ class Tracker:
         """Propagate track state distributions one time step forward.
         This function should be called once every time step, before `update`.
         """
-        for track in self.tracks:
-            track.predict(self.kf)
+        if len(self.tracks) == 0:
+            return
+        mean, covariance = self.kf.multi_predict(
+            np.array([t.mean for t in self.tracks]),
+            np.array([t.covariance for t in self.tracks]))
+        for track, m, c in zip(self.tracks, mean, covariance):
+            track.apply_prediction(m, c)
 
     def update(self, detections):
         """Perform measurement update and track management.
         Parameters
         ----------
-        - detections : List[deep_sort.detection.Detection]
-            A list of detections at the current time step.
-        
+        - detections : detection.DetectionBatch
+            The detections at the current time step. Its feature rows are
+            kept by the matched tracks until the end of the call, without
+            copies. A list of `detection.Detection` is also accepted.
+
         Returns
         -------
         - matches: List[(int, int)] matche from track_id to det_id
         - unmatched_tracks: List[int]
         - unmatched_detections: List[int]
         """
+        if not isinstance(detections, DetectionBatch):
+            detections = DetectionBatch.from_detections(detections)
+
         # Run matching cascade.
         matches, unmatched_tracks, unmatched_detections = \
             self._match(detections)
 
         # Update track set.
-        for track_idx, detection_idx in matches:
-            self.tracks[track_idx].update(
-                self.kf, detections[detection_idx])
+        measurements = detections.to_xyah()
+        if len(matches) > 0:
+            tracks = [self.tracks[i] for i, _ in matches]
+            mean, covariance = self.kf.multi_update(
+                np.array([t.mean for t in tracks]),
+                np.array([t.covariance for t in tracks]),
+                measurements[[j for _, j in matches]])
+            for track, m, c, (_, j) in zip(tracks, mean, covariance, matches):
+                track.apply_update(m, c, detections.feature[j])
         for track_idx in unmatched_tracks:
             self.tracks[track_idx].mark_missed()
         for detection_idx in unmatched_detections:
-            self._initiate_track(detections[detection_idx])
+            self._initiate_track(
+                measurements[detection_idx], detections.feature[detection_idx])
         self.tracks = [t for t in self.tracks if not t.is_deleted()]
 
         # Update distance metric.
@@ -91,6 +122,60 @@ class Tracker:
         return matches, unmatched_tracks, unmatched_detections
         
 
+    def get_state(self):
+        """Return a snapshot of the tracker that can be restored with
+        `set_state`, possibly in another process. Use `checkpoint.dumps` to
+        serialize it.
+        Returns
+        -------
+        Dict[str -> ndarray]
+            The tracks, stacked by attribute, and the state of the distance
+            metric with a `metric_` prefix.
+        """
+        tracks = self.tracks
+        features = [f for t in tracks for f in t.features]
+        state = {
+            'next_id': np.array(self._next_id),
+            'mean': np.array(
+                [t.mean for t in tracks], dtype=float).reshape(-1, 8),
+            'covariance': np.array(
+                [t.covariance for t in tracks], dtype=float).reshape(-1, 8, 8),
+            'track_id': np.array([t.track_id for t in tracks], dtype=int),
+            'hits': np.array([t.hits for t in tracks], dtype=int),
+            'age': np.array([t.age for t in tracks], dtype=int),
+            'time_since_update': np.array(
+                [t.time_since_update for t in tracks], dtype=int),
+            'track_state': np.array([t.state for t in tracks], dtype=int),
+            'feature_counts': np.array(
+                [len(t.features) for t in tracks], dtype=int),
+            'features': stack_features(features)
+        }
+        for k, v in self.metric.get_state().items():
+            state['metric_' + k] = v
+        return state
+
+    def set_state(self, state):
+        """Restore a snapshot returned by `get_state`. The tracker must have
+        been created with the same parameters as the one that produced it.
+        """
+        self._next_id = int(state['next_id'])
+        offsets = np.cumsum(np.r_[0, state['feature_counts']])
+        self.tracks = []
+        for i in range(len(state['track_id'])):
+            track = Track(
+                state['mean'][i].copy(), state['covariance'][i].copy(),
+                int(state['track_id'][i]), self.n_init, self.max_age)
+            track.hits = int(state['hits'][i])
+            track.age = int(state['age'][i])
+            track.time_since_update = int(state['time_since_update'][i])
+            track.state = int(state['track_state'][i])
+            track.features = list(
+                state['features'][offsets[i]:offsets[i + 1]])
+            self.tracks.append(track)
+        self.metric.set_state({
+            k[len('metric_'):]: v for k, v in state.items()
+            if k.startswith('metric_')})
+
     def _match(self, detections):
 
         def gated_metric(tracks, dets, track_indices, detection_indices):
@@ -98,7 +183,7 @@ class Tracker:
             - Returns:
                 - cost_matrix: np.array of shape (nb_confirmed_tracks, nb_detections)
             '''
-            features = np.array([dets[i].feature for i in detection_indices])
+            features = dets.feature[np.asarray(detection_indices, dtype=int)]
             targets = np.array([tracks[i].track_id for i in track_indices])
             cost_matrix = self.metric.distance(features, targets)
             cost_matrix = linear_assignment.gate_cost_matrix(
@@ -117,7 +202,9 @@ class Tracker:
         matches_a, unmatched_tracks_a, unmatched_detections = \
             linear_assignment.matching_cascade(
                 gated_metric, self.metric.matching_threshold, self.max_age,
-                self.tracks, detections, confirmed_tracks)
+                self.tracks, detections, confirmed_tracks,
+                solver=self.assignment_solver,
+                single_pass=self.single_pass_cascade)
 
         # Associate remaining tracks together with unconfirmed tracks using IOU.
         iou_track_candidates = unconfirmed_tracks + [
@@ -129,15 +216,16 @@ class Tracker:
         matches_b, unmatched_tracks_b, unmatched_detections = \
             linear_assignment.min_cost_matching(
                 iou_matching.iou_cost, self.max_iou_distance, self.tracks,
-                detections, iou_track_candidates, unmatched_detections)
+                detections, iou_track_candidates, unmatched_detections,
+                solver=self.assignment_solver)
 
         matches = matches_a + matches_b
         unmatched_tracks = list(set(unmatched_tracks_a + unmatched_tracks_b))
         return matches, unmatched_tracks, unmatched_detections
 
-    def _initiate_track(self, detection):
-        mean, covariance = self.kf.initiate(detection.to_xyah())
+    def _initiate_track(self, measurement, feature):
+        mean, covariance = self.kf.initiate(measurement)
         self.tracks.append(Track(
             mean, covariance, self._next_id, self.n_init, self.max_age,
-            detection.feature))
+            feature))
         self._next_id += 1
\ No newline at end of file
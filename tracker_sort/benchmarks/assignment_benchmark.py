@@ -0,0 +1,50 @@
+'''
+Compares the assignment solvers on IOU cost matrices of crowded scenes with
+10, 100 and 1000 objects. For each solver it reports the latency and the
+fraction of the optimal (scipy) matches that it recovers.
+
+Usage: python assignment_benchmark.py
+'''
+import timeit
+
+import numpy as np
+
+from videoflow_contrib.tracker_sort.assignment import solver_factory
+from videoflow_contrib.tracker_sort.sort import iou
+
+OBJECT_COUNTS = [10, 100, 1000]
+SOLVERS = ['scipy', 'greedy', 'sparse']
+IOU_THRESHOLD = 0.3
+
+def make_cost_matrix(nb_objects, seed = 0):
+    '''
+    Detections are the predicted tracks plus jitter, with the objects packed in a \
+        square whose side grows with the number of objects, so the density stays constant.
+    '''
+    rng = np.random.RandomState(seed)
+    side = 60 * np.sqrt(nb_objects)
+    tl = rng.uniform(0, side, size = (nb_objects, 2))
+    hw = rng.uniform(30, 60, size = (nb_objects, 2))
+    trks = np.concatenate([tl, tl + hw], axis = 1)
+    dets = trks + rng.normal(0, 4, size = trks.shape)
+    return -iou(dets[:, None], trks[None, :])
+
+def gated_matches(cost_matrix, matches):
+    keep = cost_matrix[matches[:, 0], matches[:, 1]] <= -IOU_THRESHOLD
+    return set(map(tuple, matches[keep].tolist()))
+
+def main():
+    print(f'{"objects":>8} {"solver":>8} {"ms":>10} {"matches":>8} {"agreement":>10}')
+    for nb_objects in OBJECT_COUNTS:
+        cost_matrix = make_cost_matrix(nb_objects)
+        optimal = gated_matches(cost_matrix, solver_factory('scipy')(cost_matrix, -IOU_THRESHOLD))
+        for solver_type in SOLVERS:
+            solver = solver_factory(solver_type)
+            number = max(1, 1000 // nb_objects)
+            ms = min(timeit.repeat(lambda: solver(cost_matrix, -IOU_THRESHOLD), number = number, repeat = 3)) * 1000 / number
+            matches = gated_matches(cost_matrix, solver(cost_matrix, -IOU_THRESHOLD))
+            agreement = len(matches & optimal) / max(1, len(optimal))
+            print(f'{nb_objects:>8} {solver_type:>8} {ms:>10.3f} {len(matches):>8} {agreement:>10.3f}')
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+'''
+Measures the per-frame latency of ``KalmanFilterBoundingBoxTracker`` and
+``BatchKalmanFilterBoundingBoxTracker`` against the number of detections in
+the scene, and compares the broadcasted cost matrix against the previous
+per-pair Python double loop.
+
+Usage: python cost_matrix_benchmark.py
+'''
+import timeit
+
+import numpy as np
+
+from videoflow_contrib.tracker_sort import KalmanFilterBoundingBoxTracker, BatchKalmanFilterBoundingBoxTracker
+from videoflow_contrib.tracker_sort.sort import iou, eucl
+
+DETECTION_COUNTS = [10, 50, 100, 200, 500]
+NB_FRAMES = 30
+
+def make_scene(nb_dets, nb_frames, seed = 0):
+    '''
+    - Returns:
+        - frames: list of np.array of shape (nb_dets, [ymin, xmin, ymax, xmax, score]) \
+            with boxes moving at constant velocity plus jitter.
+    '''
+    rng = np.random.RandomState(seed)
+    tl = rng.uniform(0, 2000, size = (nb_dets, 2))
+    hw = rng.uniform(20, 60, size = (nb_dets, 2))
+    v = rng.uniform(-3, 3, size = (nb_dets, 2))
+    frames = []
+    for f in range(nb_frames):
+        pos = tl + f * v + rng.normal(0, 0.5, size = (nb_dets, 2))
+        dets = np.concatenate([pos, pos + hw, np.ones((nb_dets, 1))], axis = 1)
+        frames.append(dets)
+    return frames
+
+def loop_cost_matrix(metric_function, detections, trackers):
+    cost_matrix = np.zeros((len(detections), len(trackers)), dtype = np.float32)
+    for d, det in enumerate(detections):
+        for t, trk in enumerate(trackers):
+            cost_matrix[d, t] = metric_function(det, trk)
+    return cost_matrix
+
+def broadcast_cost_matrix(metric_function, detections, trackers):
+    return metric_function(detections[:, None, :4], trackers[None, :, :4])
+
+def main():
+    print('Cost matrix construction (ms per frame)')
+    print(f'{"dets":>6} {"metric":>10} {"loop":>10} {"broadcast":>10} {"speedup":>8}')
+    for nb_dets in DETECTION_COUNTS:
+        dets = make_scene(nb_dets, 2)
+        for name, fn in [('iou', iou), ('euclidean', eucl)]:
+            number = max(1, 2000 // nb_dets)
+            loop_ms = min(timeit.repeat(lambda: loop_cost_matrix(fn, dets[0], dets[1]), number = 1, repeat = 1)) * 1000
+            vec_ms = min(timeit.repeat(lambda: broadcast_cost_matrix(fn, dets[0], dets[1]), number = number, repeat = 3)) * 1000 / number
+            print(f'{nb_dets:>6} {name:>10} {loop_ms:>10.3f} {vec_ms:>10.3f} {loop_ms / vec_ms:>7.1f}x')
+
+    print()
+    print('_track (ms per frame)')
+    print(f'{"dets":>6} {"iou":>10} {"euclidean":>10} {"batch iou":>10} {"batch eucl":>10}')
+    for nb_dets in DETECTION_COUNTS:
+        frames = make_scene(nb_dets, NB_FRAMES)
+        row = []
+        for tracker_class in [KalmanFilterBoundingBoxTracker, BatchKalmanFilterBoundingBoxTracker]:
+            for metric in ['iou', 'euclidean']:
+                tracker = tracker_class(metric_function_type = metric)
+                start = timeit.default_timer()
+                for dets in frames:
+                    tracker._track(dets)
+                row.append((timeit.default_timer() - start) * 1000 / NB_FRAMES)
+        print(f'{nb_dets:>6} ' + ' '.join(f'{t:>10.3f}' for t in row))
+
+if __name__ == "__main__":
+    main()
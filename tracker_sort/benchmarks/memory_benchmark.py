@@ -0,0 +1,71 @@
+'''
+Runs a tracker over a synthetic 24h stream with many short-lived objects and
+reports, for every simulated hour, the memory held by Python allocations, the
+number of live tracklets and the number of track ids handed out so far.
+Memory should stay flat over the whole run.
+
+Usage: python memory_benchmark.py [--hours 24] [--fps 1] [--tracker sort|batch]
+'''
+import argparse
+import timeit
+import tracemalloc
+
+import numpy as np
+
+from videoflow_contrib.tracker_sort import KalmanFilterBoundingBoxTracker, BatchKalmanFilterBoundingBoxTracker
+
+class SyntheticStream(object):
+    '''
+    Objects appear at a constant rate, move at constant velocity for a random \
+        number of frames and then disappear.
+    '''
+    def __init__(self, spawn_rate = 0.5, min_lifetime = 5, max_lifetime = 120, seed = 0):
+        self._rng = np.random.RandomState(seed)
+        self._spawn_rate = spawn_rate
+        self._min_lifetime = min_lifetime
+        self._max_lifetime = max_lifetime
+        self._tl = np.zeros((0, 2))
+        self._hw = np.zeros((0, 2))
+        self._v = np.zeros((0, 2))
+        self._lifetime = np.zeros((0,), dtype = int)
+
+    def next(self):
+        rng = self._rng
+        nb_new = rng.poisson(self._spawn_rate)
+        self._tl = np.concatenate([self._tl, rng.uniform(0, 1000, size = (nb_new, 2))])
+        self._hw = np.concatenate([self._hw, rng.uniform(30, 80, size = (nb_new, 2))])
+        self._v = np.concatenate([self._v, rng.uniform(-3, 3, size = (nb_new, 2))])
+        self._lifetime = np.concatenate([self._lifetime, rng.randint(self._min_lifetime, self._max_lifetime, size = nb_new)])
+
+        self._tl = self._tl + self._v
+        self._lifetime = self._lifetime - 1
+        alive = self._lifetime > 0
+        self._tl, self._hw, self._v, self._lifetime = self._tl[alive], self._hw[alive], self._v[alive], self._lifetime[alive]
+        return np.concatenate([self._tl, self._tl + self._hw, np.ones((len(self._tl), 1))], axis = 1)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--hours', type = float, default = 24)
+    parser.add_argument('--fps', type = float, default = 1)
+    parser.add_argument('--tracker', choices = ['sort', 'batch'], default = 'batch')
+    args = parser.parse_args()
+
+    tracker_class = BatchKalmanFilterBoundingBoxTracker if args.tracker == 'batch' else KalmanFilterBoundingBoxTracker
+    tracker = tracker_class()
+    stream = SyntheticStream()
+    frames_per_hour = int(3600 * args.fps)
+
+    tracemalloc.start()
+    start = timeit.default_timer()
+    print(f'{"hour":>5} {"traced KiB":>11} {"peak KiB":>10} {"tracklets":>10} {"ids":>8} {"ms/frame":>9}')
+    for hour in range(1, int(np.ceil(args.hours)) + 1):
+        for _ in range(frames_per_hour):
+            tracker._track(stream.next())
+        current, peak = tracemalloc.get_traced_memory()
+        elapsed = timeit.default_timer() - start
+        print(f'{hour:>5} {current / 1024:>11.1f} {peak / 1024:>10.1f} {len(tracker.trackers):>10} '
+              f'{tracker._next_id:>8} {elapsed * 1000 / (hour * frames_per_hour):>9.3f}')
+        tracemalloc.reset_peak()
+
+if __name__ == "__main__":
+    main()
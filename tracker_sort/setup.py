@@ -6,7 +6,7 @@ name = 'videoflow_contrib_tracker_sort'
 install_requires = [
     'videoflow',
     'filterpy==1.4.5',
-    'scikit-learn==0.20.0'
+    'scipy>=1.4'
 ]
 
 setup(name=name,
@@ -0,0 +1,53 @@
+import pytest
+
+import numpy as np
+from videoflow_contrib.tracker_sort.assignment import (
+    scipy_solver,
+    greedy_solver,
+    sparse_solver,
+    solver_factory
+)
+
+def gated_cost_matrix(nb_rows, nb_cols, seed):
+    rng = np.random.RandomState(seed)
+    cost_matrix = rng.uniform(0, 1, size = (nb_rows, nb_cols))
+    cost_matrix[rng.uniform(size = cost_matrix.shape) > 0.1] = 10.
+    return cost_matrix
+
+def gated_cost(cost_matrix, matches, max_cost):
+    costs = cost_matrix[matches[:, 0], matches[:, 1]]
+    costs = costs[costs <= max_cost]
+    return len(costs), costs.sum()
+
+@pytest.mark.parametrize('solver', [scipy_solver, greedy_solver, sparse_solver])
+@pytest.mark.parametrize('shape', [(0, 4), (4, 0), (30, 30), (20, 45), (45, 20)])
+def test_solver_returns_one_to_one_matches(solver, shape):
+    cost_matrix = gated_cost_matrix(*shape, seed = 0)
+    matches = solver(cost_matrix, 1.)
+    assert matches.shape[1] == 2
+    assert len(np.unique(matches[:, 0])) == len(matches)
+    assert len(np.unique(matches[:, 1])) == len(matches)
+    assert np.all(np.diff(matches[:, 0]) > 0)
+    if solver is not scipy_solver:
+        assert np.all(cost_matrix[matches[:, 0], matches[:, 1]] <= 1.)
+
+@pytest.mark.parametrize('seed', range(5))
+def test_sparse_solver_is_optimal_over_gated_pairs(seed):
+    cost_matrix = gated_cost_matrix(60, 50, seed)
+    expected = gated_cost(cost_matrix, scipy_solver(np.minimum(cost_matrix, 2.), 1.), 1.)
+    actual = gated_cost(cost_matrix, sparse_solver(cost_matrix, 1.), 1.)
+    assert actual[0] == expected[0]
+    assert np.isclose(actual[1], expected[1])
+
+def test_greedy_solver_picks_cheapest_pair_first():
+    cost_matrix = np.array([[0.1, 0.2], [0.15, 0.9]])
+    assert greedy_solver(cost_matrix, 1.).tolist() == [[0, 0], [1, 1]]
+    assert scipy_solver(cost_matrix).tolist() == [[0, 1], [1, 0]]
+
+def test_solver_factory():
+    assert solver_factory('sparse') is sparse_solver
+    with pytest.raises(ValueError):
+        solver_factory('hungarian')
+
+if __name__ == "__main__":
+    pytest.main([__file__])
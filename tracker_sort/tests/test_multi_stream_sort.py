@@ -0,0 +1,75 @@
+import pytest
+
+import numpy as np
+from videoflow_contrib.tracker_sort import (
+    BatchKalmanFilterBoundingBoxTracker,
+    MultiStreamKalmanFilterBoundingBoxTracker
+)
+from videoflow_contrib.tracker_sort import checkpoint, multi_stream_sort
+
+def moving_scene(nb_boxes, nb_frames, seed):
+    rng = np.random.RandomState(seed)
+    tl = rng.uniform(0, 1000, size = (nb_boxes, 2))
+    hw = rng.uniform(20, 60, size = (nb_boxes, 2))
+    v = rng.uniform(-4, 4, size = (nb_boxes, 2))
+    frames = []
+    for f in range(nb_frames):
+        dets = np.concatenate([tl + f * v, tl + f * v + hw, np.ones((nb_boxes, 1))], axis = 1)
+        frames.append(dets[rng.rand(nb_boxes) > 0.2])
+    return frames
+
+@pytest.mark.parametrize('kwargs', [{}, {'return_original_dets': True}, {'metric_function_type': 'euclidean'}])
+def test_streams_match_independent_trackers(kwargs):
+    scenes = {'cam0': moving_scene(15, 20, 0), 'cam1': moving_scene(30, 20, 1), 'cam2': moving_scene(5, 20, 2)}
+    scenes['cam1'][5] = np.empty((0, 5))
+    expected = {}
+    for stream_id, frames in scenes.items():
+        tracker = BatchKalmanFilterBoundingBoxTracker(**kwargs)
+        expected[stream_id] = [tracker._track(dets) for dets in frames]
+
+    tracker = MultiStreamKalmanFilterBoundingBoxTracker(**kwargs)
+    for f in range(20):
+        # cam2 is sent on its own, the other two in a single batch
+        results = tracker.process([('cam0', scenes['cam0'][f]), ('cam1', scenes['cam1'][f])])
+        results.append(tracker.process(('cam2', scenes['cam2'][f])))
+        for stream_id, tracks in results:
+            assert np.allclose(tracks, expected[stream_id][f])
+
+def test_duplicate_streams_in_a_batch_are_rejected():
+    frames = moving_scene(10, 2, 0)
+    tracker = MultiStreamKalmanFilterBoundingBoxTracker()
+    with pytest.raises(ValueError):
+        tracker.process([('cam0', frames[0]), ('cam1', frames[0]), ('cam0', frames[1])])
+    assert len(tracker.trackers) == 0 and len(tracker._streams) == 0
+    tracker.process([('cam0', frames[0]), ('cam1', frames[0])])
+    assert len(tracker.trackers) == 2 * len(frames[0])
+
+def test_dead_streams_are_evicted(monkeypatch):
+    now = [0.]
+    monkeypatch.setattr(multi_stream_sort.time, 'monotonic', lambda: now[0])
+    frames = moving_scene(10, 3, 0)
+    tracker = MultiStreamKalmanFilterBoundingBoxTracker(stream_ttl = 10.)
+    tracker.process(('cam0', frames[0]))
+    now[0] = 5.
+    tracker.process(('cam1', frames[0]))
+    assert len(tracker.trackers) == 2 * len(frames[0])
+    now[0] = 12.
+    tracker.process(('cam1', frames[1]))
+    assert list(tracker._streams) == ['cam1']
+    assert np.all(tracker.trackers.streams == tracker._streams['cam1'].index)
+
+def test_restored_tracker_continues_tracking():
+    scenes = {'cam0': moving_scene(15, 20, 0), 'cam1': moving_scene(30, 20, 1)}
+    tracker = MultiStreamKalmanFilterBoundingBoxTracker()
+    for f in range(10):
+        tracker.process([(k, v[f]) for k, v in scenes.items()])
+    restored = MultiStreamKalmanFilterBoundingBoxTracker()
+    restored.set_state(checkpoint.loads(checkpoint.dumps(tracker.get_state())))
+    for f in range(10, 20):
+        for (k, expected), (_, actual) in zip(
+                tracker.process([(k, v[f]) for k, v in scenes.items()]),
+                restored.process([(k, v[f]) for k, v in scenes.items()])):
+            assert np.allclose(expected, actual)
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,103 @@
+import pytest
+
+import numpy as np
+from videoflow_contrib.tracker_sort import (
+    KalmanFilterBoundingBoxTracker,
+    BatchKalmanFilterBoundingBoxTracker
+)
+from videoflow_contrib.tracker_sort import checkpoint
+from videoflow_contrib.tracker_sort.sort import (
+    KalmanBoxTracker,
+    iou,
+    eucl,
+    associate_detections_to_trackers
+)
+
+def random_boxes(nb_boxes, seed):
+    rng = np.random.RandomState(seed)
+    tl = rng.uniform(0, 200, size = (nb_boxes, 2))
+    hw = rng.uniform(10, 50, size = (nb_boxes, 2))
+    return np.concatenate([tl, tl + hw, np.ones((nb_boxes, 1))], axis = 1)
+
+@pytest.mark.parametrize('metric_function', [iou, eucl])
+def test_broadcasted_metric_matches_pairwise(metric_function):
+    dets, trks = random_boxes(13, 0), random_boxes(7, 1)
+    expected = np.array([[metric_function(d, t) for t in trks] for d in dets])
+    cost_matrix = metric_function(dets[:, None, :4], trks[None, :, :4])
+    assert cost_matrix.shape == (13, 7)
+    assert np.allclose(cost_matrix, expected)
+
+def test_associate_detections_to_trackers():
+    trks = random_boxes(5, 2)
+    dets = np.concatenate([trks[[3, 0]] + 1., random_boxes(2, 3) + 1000.])
+    matches, unmatched_dets, unmatched_trks = associate_detections_to_trackers(dets, trks, iou, 0.3)
+    assert sorted(map(tuple, matches)) == [(0, 3), (1, 0)]
+    assert list(unmatched_dets) == [2, 3]
+    assert list(unmatched_trks) == [1, 2, 4]
+
+def moving_scene(nb_boxes, nb_frames, seed):
+    rng = np.random.RandomState(seed)
+    boxes = random_boxes(nb_boxes, seed) * 10
+    v = rng.uniform(-5, 5, size = (nb_boxes, 2))
+    frames = []
+    for f in range(nb_frames):
+        dets = boxes.copy()
+        dets[:, [0, 1]] += f * v
+        dets[:, [2, 3]] += f * v
+        frames.append(dets[rng.rand(nb_boxes) > 0.2])
+    return frames
+
+def run_tracker(tracker_class, frames, **kwargs):
+    tracker = tracker_class(**kwargs)
+    return [tracker._track(dets) for dets in frames]
+
+@pytest.mark.parametrize('kwargs', [
+    {'metric_function_type': 'iou'},
+    {'metric_function_type': 'euclidean'},
+    {'metric_function_type': 'iou', 'show_in_between': False},
+    {'metric_function_type': 'iou', 'return_original_dets': True}
+])
+def test_batch_tracker_matches_tracker(kwargs):
+    frames = moving_scene(40, 25, 4)
+    frames[7] = np.empty((0, 5))
+    expected = run_tracker(KalmanFilterBoundingBoxTracker, frames, **kwargs)
+    actual = run_tracker(BatchKalmanFilterBoundingBoxTracker, frames, **kwargs)
+    for e, a in zip(expected, actual):
+        assert e.shape == a.shape
+        assert np.allclose(e, a)
+
+@pytest.mark.parametrize('history_size, expected_length', [(None, 20), (3, 3), (0, 0)])
+def test_history_is_bounded(history_size, expected_length):
+    trk = KalmanBoxTracker(np.array([10., 10., 50., 30., 1.]), 0, history_size)
+    for _ in range(20):
+        bbox = trk.predict()
+    assert len(trk.history) == expected_length
+    assert bbox.shape == (1, 4)
+    trk.update(np.array([12., 12., 52., 32., 1.]))
+    assert len(trk.history) == 0
+
+@pytest.mark.parametrize('tracker_class', [KalmanFilterBoundingBoxTracker, BatchKalmanFilterBoundingBoxTracker])
+def test_track_ids_are_allocated_per_instance(tracker_class):
+    count = KalmanBoxTracker.count
+    frames = moving_scene(10, 5, 0)
+    first, second = run_tracker(tracker_class, frames), run_tracker(tracker_class, frames)
+    assert all(np.array_equal(a, b) for a, b in zip(first, second))
+    assert KalmanBoxTracker.count == count
+
+@pytest.mark.parametrize('tracker_class, restored_class', [
+    (KalmanFilterBoundingBoxTracker, KalmanFilterBoundingBoxTracker),
+    (BatchKalmanFilterBoundingBoxTracker, BatchKalmanFilterBoundingBoxTracker),
+    (KalmanFilterBoundingBoxTracker, BatchKalmanFilterBoundingBoxTracker)
+])
+def test_restored_tracker_continues_tracking(tracker_class, restored_class):
+    frames = moving_scene(30, 20, 5)
+    tracker = tracker_class()
+    for dets in frames[:10]:
+        tracker._track(dets)
+    restored = restored_class()
+    restored.set_state(checkpoint.loads(checkpoint.dumps(tracker.get_state())))
+    for dets in frames[10:]:
+        assert np.allclose(tracker._track(dets), restored._track(dets))
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -1,3 +1,5 @@
 from contextlib import suppress
 
-from .sort import KalmanFilterBoundingBoxTracker
\ No newline at end of file
+from .sort import KalmanFilterBoundingBoxTracker
+from .batch_sort import BatchKalmanFilterBoundingBoxTracker
+from .multi_stream_sort import MultiStreamKalmanFilterBoundingBoxTracker
\ No newline at end of file
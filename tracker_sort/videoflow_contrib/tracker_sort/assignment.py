@@ -0,0 +1,117 @@
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+
+'''
+Linear assignment solvers. All of them share the same signature:
+``solver(cost_matrix, max_cost = None)``, where ``cost_matrix`` is an np.array
+of shape (nb_rows, nb_cols) to be minimized and ``max_cost`` is the gating
+threshold: pairs with cost larger than ``max_cost`` are infeasible.
+They return an np.array of shape (nb_matches, 2) with [row, col] matched
+indices, sorted by row.  The ``scipy`` solver may return pairs above
+``max_cost``; callers are expected to filter them out.
+
+This file is shared verbatim by tracker_sort and tracker_deepsort; keep both
+copies identical.
+'''
+
+def _empty_matches():
+    return np.empty((0, 2), dtype = int)
+
+def scipy_solver(cost_matrix, max_cost = None):
+    '''
+    Optimal assignment over the full cost matrix using scipy's ``linear_sum_assignment``.
+    '''
+    if cost_matrix.size == 0:
+        return _empty_matches()
+    rows, cols = linear_sum_assignment(cost_matrix)
+    return np.stack([rows, cols], axis = 1)
+
+def greedy_solver(cost_matrix, max_cost = None):
+    '''
+    Greedy assignment: repeatedly matches the cheapest feasible pair whose row and \
+        column are both still free.  It is not optimal, but it only looks at gated \
+        pairs and it is much faster than the optimal solvers on very large scenes.
+    '''
+    if cost_matrix.size == 0:
+        return _empty_matches()
+    if max_cost is None:
+        rows, cols = np.indices(cost_matrix.shape).reshape(2, -1)
+    else:
+        rows, cols = np.nonzero(cost_matrix <= max_cost)
+    order = np.argsort(cost_matrix[rows, cols], kind = 'stable')
+    row_is_free = np.ones(cost_matrix.shape[0], dtype = bool)
+    col_is_free = np.ones(cost_matrix.shape[1], dtype = bool)
+    matches = []
+    for r, c in zip(rows[order].tolist(), cols[order].tolist()):
+        if row_is_free[r] and col_is_free[c]:
+            row_is_free[r] = False
+            col_is_free[c] = False
+            matches.append((r, c))
+    if len(matches) == 0:
+        return _empty_matches()
+    matches = np.array(matches, dtype = int)
+    return matches[np.argsort(matches[:, 0], kind = 'stable')]
+
+def sparse_solver(cost_matrix, max_cost = None):
+    '''
+    Optimal assignment restricted to the gated pairs.  The bipartite graph of \
+        feasible pairs is split in connected components, and each component is \
+        solved independently, so the cost is driven by the size of the largest \
+        group of mutually gated objects instead of the size of the scene.
+    '''
+    if max_cost is None:
+        return scipy_solver(cost_matrix)
+    if cost_matrix.size == 0:
+        return _empty_matches()
+    nb_rows, nb_cols = cost_matrix.shape
+    gated = cost_matrix <= max_cost
+    rows, cols = np.nonzero(gated)
+    if len(rows) == 0:
+        return _empty_matches()
+
+    graph = csr_matrix(
+        (np.ones(len(rows), dtype = bool), (rows, nb_rows + cols)),
+        shape = (nb_rows + nb_cols, nb_rows + nb_cols)
+    )
+    _, labels = connected_components(graph, directed = False)
+    row_labels, col_labels = labels[:nb_rows], labels[nb_rows:]
+
+    # Components made of a single gated pair are matched directly. The rest are
+    # solved one at a time over their dense sub-matrix.
+    row_counts = np.bincount(row_labels, minlength = len(labels))
+    col_counts = np.bincount(col_labels, minlength = len(labels))
+    is_single = (row_counts[row_labels[rows]] == 1) & (col_counts[row_labels[rows]] == 1)
+    matches = [np.stack([rows[is_single], cols[is_single]], axis = 1)]
+
+    components = np.unique(row_labels[rows[~is_single]])
+    row_order = np.argsort(row_labels, kind = 'stable')
+    col_order = np.argsort(col_labels, kind = 'stable')
+    row_bounds = np.searchsorted(row_labels[row_order], [components, components + 1])
+    col_bounds = np.searchsorted(col_labels[col_order], [components, components + 1])
+
+    infeasible_cost = max_cost + 1.
+    for r0, r1, c0, c1 in zip(row_bounds[0], row_bounds[1], col_bounds[0], col_bounds[1]):
+        comp_rows, comp_cols = row_order[r0:r1], col_order[c0:c1]
+        sub_gated = gated[comp_rows[:, None], comp_cols]
+        sub = np.where(sub_gated, cost_matrix[comp_rows[:, None], comp_cols], infeasible_cost)
+        sub_rows, sub_cols = linear_sum_assignment(sub)
+        keep = sub_gated[sub_rows, sub_cols]
+        matches.append(np.stack([comp_rows[sub_rows[keep]], comp_cols[sub_cols[keep]]], axis = 1))
+    matches = np.concatenate(matches, axis = 0).astype(int)
+    return matches[np.argsort(matches[:, 0], kind = 'stable')]
+
+def solver_factory(solver_type):
+    if solver_type == 'scipy':
+        return scipy_solver
+    elif solver_type == 'greedy':
+        return greedy_solver
+    elif solver_type == 'sparse':
+        return sparse_solver
+    else:
+        raise ValueError("Cannot identify solver_type {}".format(solver_type))
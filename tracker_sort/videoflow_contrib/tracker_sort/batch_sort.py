@@ -0,0 +1,252 @@
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import numpy as np
+
+from .sort import KalmanFilterBoundingBoxTracker
+
+def convert_bboxes_to_z(bboxes):
+    '''
+    Batched version of ``convert_bbox_to_z``.
+
+    - Arguments:
+        - bboxes: np.array of shape (n, 4) in the form [y1, x1, y2, x2]
+
+    - Returns:
+        - z: np.array of shape (n, 4) in the form [x, y, s, r]
+    '''
+    h = bboxes[:, 2] - bboxes[:, 0]
+    w = bboxes[:, 3] - bboxes[:, 1]
+    x = bboxes[:, 1] + w/2.
+    y = bboxes[:, 0] + h/2.
+    return np.stack([x, y, w * h, w / h], axis = 1)
+
+def convert_x_to_bboxes(x):
+    '''
+    Batched version of ``convert_x_to_bbox``.
+
+    - Arguments:
+        - x: np.array of shape (n, 7) with the state of each tracklet
+
+    - Returns:
+        - bboxes: np.array of shape (n, 4) in the form [y1, x1, y2, x2]
+    '''
+    w = np.sqrt(x[:, 2] * x[:, 3])
+    h = x[:, 2] / w
+    return np.stack([x[:, 1] - h/2., x[:, 0] - w/2., x[:, 1] + h/2., x[:, 0] + w/2.], axis = 1)
+
+class KalmanBoxBank(object):
+    '''
+    Structure-of-arrays counterpart of a list of ``KalmanBoxTracker``. The state of
+    every tracklet is kept in stacked arrays, so that predict and update run for all
+    tracklets at once instead of one filterpy ``KalmanFilter`` at a time.
+
+    It uses the same constant velocity model, noise matrices and update equations
+    (Joseph form) as ``KalmanBoxTracker``.
+
+    - Attributes:
+        - x: np.array of shape (n, 7). State of each tracklet
+        - P: np.array of shape (n, 7, 7). Covariance of each tracklet
+        - ids, time_since_update, hits, hit_streak, age: np.array of shape (n,)
+    '''
+    _fields = ('x', 'P', 'ids', 'time_since_update', 'hits', 'hit_streak', 'age')
+    F = np.array([[1,0,0,0,1,0,0],[0,1,0,0,0,1,0],[0,0,1,0,0,0,1],[0,0,0,1,0,0,0],[0,0,0,0,1,0,0],[0,0,0,0,0,1,0],[0,0,0,0,0,0,1]], dtype = float)
+    H = np.array([[1,0,0,0,0,0,0],[0,1,0,0,0,0,0],[0,0,1,0,0,0,0],[0,0,0,1,0,0,0]], dtype = float)
+
+    def __init__(self):
+        self.R = np.eye(4)
+        self.R[2:,2:] *= 10.
+        self.P0 = np.eye(7)
+        self.P0[4:,4:] *= 1000. #give high uncertainty to the unobservable initial velocities
+        self.P0 *= 10.
+        self.Q = np.eye(7)
+        self.Q[-1,-1] *= 0.01
+        self.Q[4:,4:] *= 0.01
+        self._I = np.eye(7)
+
+        self.x = np.zeros((0, 7))
+        self.P = np.zeros((0, 7, 7))
+        self.ids = np.zeros((0,), dtype = int)
+        self.time_since_update = np.zeros((0,), dtype = int)
+        self.hits = np.zeros((0,), dtype = int)
+        self.hit_streak = np.zeros((0,), dtype = int)
+        self.age = np.zeros((0,), dtype = int)
+
+    def __len__(self):
+        return len(self.x)
+
+    def add(self, bboxes, ids):
+        '''
+        Initialises one tracklet per bounding box.
+
+        - Arguments:
+            - bboxes: np.array of shape (n, 4+) in the form [y1, x1, y2, x2, ...]
+            - ids: np.array of shape (n,) with the ids of the new tracklets
+        '''
+        nb_new = len(bboxes)
+        if nb_new == 0:
+            return
+        x = np.zeros((nb_new, 7))
+        x[:, :4] = convert_bboxes_to_z(np.asarray(bboxes, dtype = float)[:, :4])
+
+        self.x = np.concatenate([self.x, x])
+        self.P = np.concatenate([self.P, np.broadcast_to(self.P0, (nb_new, 7, 7))])
+        self.ids = np.concatenate([self.ids, ids])
+        zeros = np.zeros((nb_new,), dtype = int)
+        self.time_since_update = np.concatenate([self.time_since_update, zeros])
+        self.hits = np.concatenate([self.hits, zeros])
+        self.hit_streak = np.concatenate([self.hit_streak, zeros])
+        self.age = np.concatenate([self.age, zeros])
+
+    def keep(self, mask):
+        '''
+        Keeps only the tracklets where ``mask`` is True, preserving their order.
+        '''
+        for field in self._fields:
+            setattr(self, field, getattr(self, field)[mask])
+
+    def predict(self, indexes = None):
+        '''
+        Advances the state of the tracklets at ``indexes`` (all of them if None) \
+            and returns their predicted bounding boxes.
+
+        - Returns:
+            - bboxes: np.array of shape (n, 4) in the form [y1, x1, y2, x2]
+        '''
+        if indexes is None:
+            indexes = slice(None)
+        x, P = self.x[indexes], self.P[indexes]
+        stalled = (x[:, 6] + x[:, 2]) <= 0
+        x[stalled, 6] *= 0.0
+        x = x @ self.F.T
+        self.x[indexes] = x
+        self.P[indexes] = self.F @ P @ self.F.T + self.Q
+        self.age[indexes] += 1
+        time_since_update = self.time_since_update[indexes]
+        hit_streak = self.hit_streak[indexes]
+        hit_streak[time_since_update > 0] = 0
+        self.hit_streak[indexes] = hit_streak
+        self.time_since_update[indexes] = time_since_update + 1
+        return convert_x_to_bboxes(x)
+
+    def update(self, indexes, bboxes):
+        '''
+        Updates the state of the tracklets at ``indexes`` with their observed bounding boxes.
+
+        - Arguments:
+            - indexes: np.array of shape (n,) with the indexes of the tracklets to update
+            - bboxes: np.array of shape (n, 4+) in the form [y1, x1, y2, x2, ...]
+        '''
+        if len(indexes) == 0:
+            return
+        z = convert_bboxes_to_z(np.asarray(bboxes, dtype = float)[:, :4])
+        x, P = self.x[indexes], self.P[indexes]
+
+        # H only selects the first 4 state components, so H x, P H' and H P H'
+        # reduce to slices.
+        y = z - x[:, :4]
+        PHT = P[:, :, :4]
+        S = P[:, :4, :4] + self.R
+        K = PHT @ np.linalg.inv(S)
+        x = x + (K @ y[:, :, None])[:, :, 0]
+        I_KH = self._I - K @ self.H
+        P = I_KH @ P @ I_KH.transpose(0, 2, 1) + K @ self.R @ K.transpose(0, 2, 1)
+
+        self.x[indexes] = x
+        self.P[indexes] = P
+        self.time_since_update[indexes] = 0
+        self.hits[indexes] += 1
+        self.hit_streak[indexes] += 1
+
+    def get_state(self, indexes = None):
+        '''
+        Returns the current bounding box estimate of the tracklets at ``indexes`` \
+            (all of them if None) as an np.array of shape (n, 4)
+        '''
+        if indexes is None:
+            return convert_x_to_bboxes(self.x)
+        return convert_x_to_bboxes(self.x[indexes])
+
+
+class BatchKalmanFilterBoundingBoxTracker(KalmanFilterBoundingBoxTracker):
+    '''
+    Drop-in alternative to ``KalmanFilterBoundingBoxTracker`` that keeps all tracklets \
+        in a ``KalmanBoxBank``, so that the per frame cost does not grow with Python \
+        overhead per tracklet. It takes the same arguments and returns the same tracks.
+    '''
+    def __init__(self, *args, **kwargs):
+        super(BatchKalmanFilterBoundingBoxTracker, self).__init__(*args, **kwargs)
+        self.trackers = KalmanBoxBank()
+
+    def _get_tracklets_state(self):
+        return {field: getattr(self.trackers, field).copy() for field in self.trackers._fields}
+
+    def _set_tracklets_state(self, state):
+        for field in self.trackers._fields:
+            setattr(self.trackers, field, np.array(state[field]))
+
+    def _tracks(self, dets, matched, rows, frame_count):
+        '''
+        Builds the returned tracks of one frame.
+
+        - Arguments:
+            - dets: np.array of shape (nb_dets, 5) with the detections of the frame
+            - matched: np.array of shape (n, 2) of [detection index, index into ``rows``] matches
+            - rows: np.array with the indexes of the tracklets of the frame in ``self.trackers``
+            - frame_count: number of frames seen so far
+        '''
+        trackers = self.trackers
+        states = trackers.get_state(rows)
+        ids = trackers.ids[rows] + 1 # +1 as MOT benchmark requires positive
+        if self.return_original_dets:
+            ret = np.concatenate((dets[:, :4], np.full((len(dets), 1), -1.)), axis = 1)
+            ret[matched[:, 0], :4] = states[matched[:, 1]]
+            ret[matched[:, 0], 4] = ids[matched[:, 1]]
+        else:
+            max_time_since_update = self.max_age if self.show_in_between else 1
+            is_valid = (trackers.time_since_update[rows] < max_time_since_update) & \
+                ((trackers.hit_streak[rows] >= self.min_hits) | (frame_count <= self.min_hits))
+            ret = np.concatenate((states[is_valid], ids[is_valid, None]), axis = 1)
+        return ret
+
+    def _track(self, dets, fid = None):
+        """
+        Requires: this method must be called once for each frame even with empty detections.
+
+        - Arguments:
+            - dets: a numpy array of detections in the format [[ymin,xmin,ymax,xmax,score],[ymin,xmin,ymax,xmax,score],...]
+
+        - Returns:
+            - A similar array, where the last column is the object or track id.  The number of objects returned may differ from the number of detections provided.
+        """
+        if fid is None:
+            fid = self.previous_fid + 1
+        self.previous_fid = fid
+
+        self.frame_count += 1
+        dets = np.asarray(dets, dtype = float)
+        if len(dets) == 0:
+            dets = np.empty((0, 5))
+        #get predicted locations from existing trackers.
+        trks = self.trackers.predict()
+        valid = ~np.any(np.isnan(trks), axis = 1)
+        if not np.all(valid):
+            self.trackers.keep(valid)
+            trks = trks[valid]
+        matched, unmatched_dets, _ = self._associate(dets, trks)
+
+        #update matched trackers with assigned detections
+        self.trackers.update(matched[:, 1], dets[matched[:, 0]])
+
+        #create and initialise new trackers for unmatched detections
+        self.trackers.add(dets[unmatched_dets], self._allocate_ids(len(unmatched_dets)))
+
+        ret = self._tracks(dets, matched, np.arange(len(self.trackers)), self.frame_count)
+
+        # Remove dead tracklets
+        self.trackers.keep(self.trackers.time_since_update <= self.max_age)
+
+        if len(ret) > 0:
+            return ret
+        return np.empty((0, 5))
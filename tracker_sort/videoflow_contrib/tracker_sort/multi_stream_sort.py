@@ -0,0 +1,208 @@
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import time
+
+import numpy as np
+from videoflow.core.node import OneTaskProcessorNode
+
+from .batch_sort import KalmanBoxBank, BatchKalmanFilterBoundingBoxTracker
+
+class StreamKalmanBoxBank(KalmanBoxBank):
+    '''
+    ``KalmanBoxBank`` whose tracklets are tagged with the index of the stream they belong to.
+    '''
+    _fields = KalmanBoxBank._fields + ('streams',)
+
+    def __init__(self):
+        super(StreamKalmanBoxBank, self).__init__()
+        self.streams = np.zeros((0,), dtype = int)
+
+    def add(self, bboxes, ids, streams):
+        '''
+        - Arguments:
+            - bboxes: np.array of shape (n, 4+) in the form [y1, x1, y2, x2, ...]
+            - ids: np.array of shape (n,) with the ids of the new tracklets
+            - streams: np.array of shape (n,) with the stream index of the new tracklets
+        '''
+        if len(bboxes) == 0:
+            return
+        super(StreamKalmanBoxBank, self).add(bboxes, ids)
+        self.streams = np.concatenate([self.streams, streams])
+
+class _StreamState(object):
+    def __init__(self, index, now):
+        self.index = index
+        self.frame_count = 0
+        self.next_id = 0
+        self.last_seen = now
+
+class MultiStreamKalmanFilterBoundingBoxTracker(OneTaskProcessorNode):
+    '''
+    Tracks bounding boxes from several streams (for example cameras) inside a single node. \
+        Each stream has its own isolated table of tracklets and its own track ids, but the \
+        Kalman predict and update steps of all the streams received in one call run as a \
+        single batched operation over a shared ``StreamKalmanBoxBank``.
+
+    Matching and the returned tracks are those of a ``BatchKalmanFilterBoundingBoxTracker`` \
+        that holds the shared bank. It takes the same arguments as \
+        ``KalmanFilterBoundingBoxTracker``, plus:
+
+    - Arguments:
+        - stream_ttl: A stream that has not received detections for ``stream_ttl`` seconds \
+            is considered dead and all its tracklets are evicted.  If None, streams are never evicted.
+    '''
+    def __init__(self, *args, stream_ttl = 60., **kwargs):
+        self.stream_ttl = stream_ttl
+        self._streams = {}
+        self._next_stream_index = 0
+        self._tracker = BatchKalmanFilterBoundingBoxTracker(*args, **kwargs)
+        self._tracker.trackers = StreamKalmanBoxBank()
+        super(MultiStreamKalmanFilterBoundingBoxTracker, self).__init__()
+
+    @property
+    def trackers(self):
+        '''
+        The ``StreamKalmanBoxBank`` with the tracklets of all the streams.
+        '''
+        return self._tracker.trackers
+
+    def _get_stream(self, stream_id, now):
+        stream = self._streams.get(stream_id)
+        if stream is None:
+            stream = _StreamState(self._next_stream_index, now)
+            self._next_stream_index += 1
+            self._streams[stream_id] = stream
+        stream.last_seen = now
+        return stream
+
+    def _evict(self, now):
+        '''
+        Removes the streams that have not been seen for more than ``stream_ttl`` seconds.
+        '''
+        if self.stream_ttl is None:
+            return
+        dead = [k for k, s in self._streams.items() if now - s.last_seen > self.stream_ttl]
+        if len(dead) == 0:
+            return
+        dead_indexes = [self._streams.pop(k).index for k in dead]
+        self.trackers.keep(~np.isin(self.trackers.streams, dead_indexes))
+
+    def get_state(self):
+        '''
+        Same as ``KalmanFilterBoundingBoxTracker.get_state``, and it also includes \
+            the table of streams.  Stream ids must be all ``str`` or all ``int``. The \
+            time since each stream was last seen is stored, so the TTL keeps counting \
+            from the snapshot when it is restored in another process.
+        '''
+        state = self._tracker.get_state()
+        now = time.monotonic()
+        streams = list(self._streams.values())
+        state.update({
+            'stream_keys': np.array(list(self._streams.keys())),
+            'stream_indexes': np.array([s.index for s in streams], dtype = int),
+            'stream_frame_counts': np.array([s.frame_count for s in streams], dtype = int),
+            'stream_next_ids': np.array([s.next_id for s in streams], dtype = int),
+            'stream_idle_times': np.array([now - s.last_seen for s in streams], dtype = float),
+            'next_stream_index': np.array(self._next_stream_index)
+        })
+        return state
+
+    def set_state(self, state):
+        self._tracker.set_state(state)
+        now = time.monotonic()
+        self._streams = {}
+        for i, key in enumerate(state['stream_keys'].tolist()):
+            stream = _StreamState(int(state['stream_indexes'][i]), now - float(state['stream_idle_times'][i]))
+            stream.frame_count = int(state['stream_frame_counts'][i])
+            stream.next_id = int(state['stream_next_ids'][i])
+            self._streams[key] = stream
+        self._next_stream_index = int(state['next_stream_index'])
+
+    def _track_streams(self, batch):
+        '''
+        - Arguments:
+            - batch: list of (stream_id, dets) tuples, with at most one entry per stream. \
+                dets has the same format as in ``KalmanFilterBoundingBoxTracker``.
+
+        - Returns:
+            - list of (stream_id, tracks) tuples in the same order as ``batch``
+
+        - Raises:
+            - ValueError: if a stream has more than one entry in ``batch``
+        '''
+        stream_ids = [stream_id for stream_id, _ in batch]
+        if len(set(stream_ids)) < len(stream_ids):
+            duplicates = sorted({repr(k) for k in stream_ids if stream_ids.count(k) > 1})
+            raise ValueError('Streams {} have more than one entry in the batch; send their frames '
+                            'in separate calls'.format(', '.join(duplicates)))
+        now = time.monotonic()
+        self._evict(now)
+        streams = [self._get_stream(stream_id, now) for stream_id, _ in batch]
+        stream_indexes = np.array([s.index for s in streams], dtype = int)
+        all_dets = []
+        for _, dets in batch:
+            dets = np.asarray(dets, dtype = float)
+            all_dets.append(dets if len(dets) else np.empty((0, 5)))
+
+        #get predicted locations from the existing trackers of all streams at once.
+        trackers = self.trackers
+        rows = np.flatnonzero(np.isin(trackers.streams, stream_indexes))
+        trks = trackers.predict(rows)
+        valid = ~np.any(np.isnan(trks), axis = 1)
+        if not np.all(valid):
+            invalid = np.zeros(len(trackers), dtype = bool)
+            invalid[rows[~valid]] = True
+            trackers.keep(~invalid)
+            rows = np.flatnonzero(np.isin(trackers.streams, stream_indexes))
+            trks = trks[valid]
+        trks_streams = trackers.streams[rows]
+
+        #associate each stream independently
+        stream_rows, stream_matches = [], []
+        update_rows, update_dets = [], []
+        new_dets, new_ids, new_streams = [], [], []
+        for stream, dets in zip(streams, all_dets):
+            stream.frame_count += 1
+            in_stream = trks_streams == stream.index
+            matched, unmatched_dets, _ = self._tracker._associate(dets, trks[in_stream])
+            stream_rows.append(rows[in_stream])
+            stream_matches.append(matched)
+            update_rows.append(rows[in_stream][matched[:, 1]])
+            update_dets.append(dets[matched[:, 0], :4])
+            new_dets.append(dets[unmatched_dets, :4])
+            new_ids.append(np.arange(stream.next_id, stream.next_id + len(unmatched_dets)))
+            new_streams.append(np.full(len(unmatched_dets), stream.index))
+            stream.next_id += len(unmatched_dets)
+
+        #update matched trackers and create new ones for all streams at once
+        trackers.update(np.concatenate(update_rows), np.concatenate(update_dets))
+        first_new_row = len(trackers)
+        trackers.add(np.concatenate(new_dets), np.concatenate(new_ids), np.concatenate(new_streams))
+
+        results = []
+        for (stream_id, _), dets, stream, rows_s, matched, added in zip(batch, all_dets, streams, stream_rows, stream_matches, new_dets):
+            rows_s = np.concatenate([rows_s, np.arange(first_new_row, first_new_row + len(added))])
+            first_new_row += len(added)
+            ret = self._tracker._tracks(dets, matched, rows_s, stream.frame_count)
+            results.append((stream_id, ret if len(ret) > 0 else np.empty((0, 5))))
+
+        # Remove dead tracklets
+        trackers.keep(trackers.time_since_update <= self._tracker.max_age)
+        return results
+
+    def process(self, data):
+        '''
+        - Arguments:
+            - data: a (stream_id, dets) tuple, or a list of them with at most one \
+                entry per stream. dets is an np.array of shape (nb_boxes, 5) \
+                Specifically (nb_boxes, [ymin, xmin, ymax, xmax, score])
+
+        - Returns:
+            - a (stream_id, tracks) tuple, or a list of them if ``data`` was a list. \
+                tracks is an np.array of shape (nb_tracks, [ymin, xmin, ymax, xmax, track_id])
+        '''
+        if isinstance(data, tuple):
+            return self._track_streams([data])[0]
+        return self._track_streams(list(data))
@@ -2,36 +2,45 @@ from __future__ import print_function
 from __future__ import division
 from __future__ import absolute_import
 
+from collections import deque
+
 from videoflow.processors.vision.trackers import BoundingBoxTracker
 import numpy as np
 from filterpy.kalman import KalmanFilter
-from sklearn.utils.linear_assignment_ import linear_assignment
-import math
+
+from .assignment import scipy_solver, solver_factory
 
 def eucl(bb_test, bb_gt):
     '''
-    Computes the euclidean distance between two boxes
+    Computes the euclidean distance between the centers of boxes
     in the form [x1, y1, x2, y2]
+
+    The coordinates are read from the last axis, so the inputs broadcast: \
+        ``eucl(dets[:, None], trks[None, :])`` returns the (nb_dets, nb_trks) \
+        matrix of all pairwise distances in a single pass.
     '''
-    center_1 = [(bb_test[0] + bb_test[2]) / 2.0, (bb_test[1] + bb_test[3]) / 2.0]
-    center_2 = [(bb_gt[0] + bb_gt[2]) / 2.0, (bb_gt[1] + bb_gt[3]) / 2.0]
-    eucl = math.sqrt((center_1[0] - center_2[0])*(center_1[0] - center_2[0]) + (center_1[1] - center_2[1])*(center_1[1] - center_2[1]))
-    return -eucl
+    dx = (bb_test[..., 0] + bb_test[..., 2]) / 2.0 - (bb_gt[..., 0] + bb_gt[..., 2]) / 2.0
+    dy = (bb_test[..., 1] + bb_test[..., 3]) / 2.0 - (bb_gt[..., 1] + bb_gt[..., 3]) / 2.0
+    return -np.sqrt(dx * dx + dy * dy)
 
 def iou(bb_test, bb_gt):
     """
       Computes IUO between two bboxes in the form [y1, x1, y2, x2]
       IOU is the intersection of areas.
+
+      The coordinates are read from the last axis, so the inputs broadcast:
+        ``iou(dets[:, None], trks[None, :])`` returns the (nb_dets, nb_trks)
+        matrix of all pairwise IOUs in a single pass.
     """
-    yy1 = np.maximum(bb_test[0], bb_gt[0])
-    xx1 = np.maximum(bb_test[1], bb_gt[1])
-    yy2 = np.minimum(bb_test[2], bb_gt[2])
-    xx2 = np.minimum(bb_test[3], bb_gt[3])
+    yy1 = np.maximum(bb_test[..., 0], bb_gt[..., 0])
+    xx1 = np.maximum(bb_test[..., 1], bb_gt[..., 1])
+    yy2 = np.minimum(bb_test[..., 2], bb_gt[..., 2])
+    xx2 = np.minimum(bb_test[..., 3], bb_gt[..., 3])
     w = np.maximum(0., xx2 - xx1)
     h = np.maximum(0., yy2 - yy1)
     wh = w * h
-    o = wh / ((bb_test[2] - bb_test[0]) * (bb_test[3] - bb_test[1])
-              + (bb_gt[2] - bb_gt[0]) * (bb_gt[3] - bb_gt[1]) - wh)
+    o = wh / ((bb_test[..., 2] - bb_test[..., 0]) * (bb_test[..., 3] - bb_test[..., 1])
+              + (bb_gt[..., 2] - bb_gt[..., 0]) * (bb_gt[..., 3] - bb_gt[..., 1]) - wh)
     return(o)
 
 def metric_factory(metric_type):
@@ -68,10 +77,15 @@ def convert_x_to_bbox(x, score=None):
     else:
         return np.array([x[1] - h/2., x[0] - w/2., x[1] + h/2., x[0] + w/2., score]).reshape((1, 5))
 
-def associate_detections_to_trackers(detections, trackers, metric_function, iou_threshold = 0.1):
+def associate_detections_to_trackers(detections, trackers, metric_function, iou_threshold = 0.1, assignment_solver = scipy_solver):
     """
       Assigns detections to tracked object (both represented as bounding boxes)
       Returns 3 lists of matches, unmatched_detections and unmatched_trackers
+      - Arguments:
+        - metric_function: one of ``iou`` or ``eucl``. It is evaluated once over \
+            the broadcasted (nb_detections, nb_trackers) pairs to build the cost matrix.
+        - assignment_solver: one of the solvers in ``assignment``. Pairs with a metric \
+            value below ``iou_threshold`` are treated as infeasible.
       - Returns:
         - matches: np.array of shape (n, 2)
         - unmatched_detections: np.array of shape (nb_of_unmatches, ) that contains the 
@@ -79,50 +93,41 @@ def associate_detections_to_trackers(detections, trackers, metric_function, iou_
         - unmatched_trackers: np.array of shape (nb_of_nonmatched_tracks, ) that contains the
             indices of the unmatched tracks
     """
-    distance_threshold = 500
-
     if len(trackers) == 0:
         return np.empty((0, 2), dtype = int), np.arange(len(detections)), np.empty((0, 5), dtype = int)
-    iou_matrix = np.zeros((len(detections), len(trackers)), dtype=np.float32)
-
-    for d, det in enumerate(detections):
-        for t, trk in enumerate(trackers):
-            iou_matrix[d, t] = metric_function(det, trk)
-    matched_indices = linear_assignment(-iou_matrix)
-    
-    unmatched_detections = []
-    for d,det in enumerate(detections):
-        if(d not in matched_indices[:,0]):
-            unmatched_detections.append(d)
-    unmatched_trackers = []
-    for t, trk in enumerate(trackers):
-        if(t not in matched_indices[:,1]):
-            unmatched_trackers.append(t)
+    if len(detections) == 0:
+        return np.empty((0, 2), dtype = int), np.empty((0, ), dtype = int), np.arange(len(trackers))
+    detections = np.asarray(detections, dtype = np.float32)
+    trackers = np.asarray(trackers, dtype = np.float32)
+    iou_matrix = metric_function(detections[:, None, :4], trackers[None, :, :4]).astype(np.float32)
+    matched_indices = assignment_solver(-iou_matrix, -iou_threshold)
 
     #filter out matched with low IOU
-    matches = []
-    for m in matched_indices:
-        if iou_matrix[m[0], m[1]] < iou_threshold:
-        #if(iou_matrix[m[0], m[1]] > distance_threshold):
-            unmatched_detections.append(m[0])
-            unmatched_trackers.append(m[1])
-        else:
-            matches.append(m.reshape(1, 2))
-    if len(matches) == 0:
-        matches = np.empty((0, 2), dtype = int)
-    else:
-        matches = np.concatenate(matches, axis = 0)
+    keep = iou_matrix[matched_indices[:, 0], matched_indices[:, 1]] >= iou_threshold
+    matches = matched_indices[keep].astype(int)
+
+    detection_is_matched = np.zeros(len(detections), dtype = bool)
+    detection_is_matched[matches[:, 0]] = True
+    tracker_is_matched = np.zeros(len(trackers), dtype = bool)
+    tracker_is_matched[matches[:, 1]] = True
 
-    return matches, np.array(unmatched_detections), np.array(unmatched_trackers)
+    return matches, np.flatnonzero(~detection_is_matched), np.flatnonzero(~tracker_is_matched)
 
 class KalmanBoxTracker(object):
     """
       This class represents the internel state of individual tracked objects observed as bbox.
     """
     count = 0
-    def __init__(self,bbox):
+    def __init__(self, bbox, track_id = None, history_size = None):
         """
         Initialises a tracker using initial bounding box.
+
+        - Arguments:
+            - bbox: initial bounding box in the form [y1, x1, y2, x2]
+            - track_id: id of the tracklet. If None, it is allocated from the \
+                class-wide ``KalmanBoxTracker.count``.
+            - history_size: number of predicted boxes kept in ``history`` since the \
+                last update. If None the history is unbounded, and 0 disables it.
         """
         #define constant velocity model
         self.kf = KalmanFilter(dim_x=7, dim_z=4)
@@ -137,9 +142,11 @@ class KalmanBoxTracker(object):
 
         self.kf.x[:4] = convert_bbox_to_z(bbox)
         self.time_since_update = 0
-        self.id = KalmanBoxTracker.count
-        KalmanBoxTracker.count += 1
-        self.history = []
+        if track_id is None:
+            track_id = KalmanBoxTracker.count
+            KalmanBoxTracker.count += 1
+        self.id = track_id
+        self.history = deque(maxlen = history_size)
         self.hits = 0
         self.hit_streak = 0
         self.age = 0
@@ -149,7 +156,7 @@ class KalmanBoxTracker(object):
         Updates the state vector with observed bbox.
         """
         self.time_since_update = 0
-        self.history = []
+        self.history.clear()
         self.hits += 1
         self.hit_streak += 1
         self.kf.update(convert_bbox_to_z(bbox))
@@ -165,9 +172,10 @@ class KalmanBoxTracker(object):
         if(self.time_since_update > 0):
             self.hit_streak = 0
         self.time_since_update += 1
-        self.history.append(convert_x_to_bbox(self.kf.x))
+        bbox = convert_x_to_bbox(self.kf.x)
+        self.history.append(bbox)
         
-        return self.history[-1]
+        return bbox
 
     def get_state(self):
         """
@@ -191,12 +199,20 @@ class KalmanFilterBoundingBoxTracker(BoundingBoxTracker):
             will return the same number of entries and in the same order as they were passed to it.
         - return_original_dets: Returns the same number of tracks as original dets, with indexes matching
             If for some reason an original det does not have a corresponding track, the track index is -1
+        - assignment_solver_type: str, one of ``scipy`` (optimal), ``greedy`` (greedy gated matcher, \
+            for very large scenes) or ``sparse`` (optimal over the gated pairs only).
+        - history_size: number of predicted boxes kept by each tracklet since its last \
+            update. If None it defaults to ``max_age + 1``, which is the most a live tracklet \
+            can accumulate. 0 disables the history.
     '''
     
-    def __init__(self, max_age = 7, min_hits = 3, metric_function_type = 'iou', metric_function_threshold = None, show_in_between = True, return_original_dets = False):
+    def __init__(self, max_age = 7, min_hits = 3, metric_function_type = 'iou', metric_function_threshold = None, show_in_between = True, return_original_dets = False,
+                assignment_solver_type = 'scipy', history_size = None):
         self.max_age = max_age
         self.min_hits = min_hits
+        self.history_size = max_age + 1 if history_size is None else history_size
         self.trackers = []
+        self._next_id = 0
         self.frame_count = 0
         self.metric_function_type = metric_function_type
         
@@ -213,8 +229,80 @@ class KalmanFilterBoundingBoxTracker(BoundingBoxTracker):
         self.return_original_dets = return_original_dets
         self.show_in_between = show_in_between
         self.metric_function = metric_factory(metric_function_type)
+        self.assignment_solver = solver_factory(assignment_solver_type)
         super(KalmanFilterBoundingBoxTracker, self).__init__()
 
+    def _allocate_ids(self, nb_ids):
+        '''
+        Returns an np.array with ``nb_ids`` new track ids, unique within this tracker.
+        '''
+        ids = np.arange(self._next_id, self._next_id + nb_ids)
+        self._next_id += nb_ids
+        return ids
+
+    def get_state(self):
+        '''
+        Returns a snapshot of the tracker that can be restored with ``set_state``, \
+            possibly in another process.  Use ``checkpoint.dumps`` to serialize it. \
+            The predicted boxes in the tracklets history are not part of the snapshot.
+
+        - Returns:
+            - state: dict of str -> np.array
+        '''
+        state = {
+            'frame_count': np.array(self.frame_count),
+            'previous_fid': np.array(self.previous_fid),
+            'next_id': np.array(self._next_id)
+        }
+        state.update(self._get_tracklets_state())
+        return state
+
+    def set_state(self, state):
+        '''
+        Restores a snapshot returned by ``get_state``. The tracker must have been \
+            created with the same arguments as the one that produced the snapshot.
+        '''
+        self.frame_count = int(state['frame_count'])
+        self.previous_fid = int(state['previous_fid'])
+        self._next_id = int(state['next_id'])
+        self._set_tracklets_state(state)
+
+    def _get_tracklets_state(self):
+        trackers = self.trackers
+        return {
+            'x': np.array([trk.kf.x[:, 0] for trk in trackers], dtype = float).reshape(-1, 7),
+            'P': np.array([trk.kf.P for trk in trackers], dtype = float).reshape(-1, 7, 7),
+            'ids': np.array([trk.id for trk in trackers], dtype = int),
+            'time_since_update': np.array([trk.time_since_update for trk in trackers], dtype = int),
+            'hits': np.array([trk.hits for trk in trackers], dtype = int),
+            'hit_streak': np.array([trk.hit_streak for trk in trackers], dtype = int),
+            'age': np.array([trk.age for trk in trackers], dtype = int)
+        }
+
+    def _set_tracklets_state(self, state):
+        self.trackers = []
+        for i in range(len(state['ids'])):
+            trk = KalmanBoxTracker(np.array([0., 0., 1., 1.]), int(state['ids'][i]), self.history_size)
+            trk.kf.x = state['x'][i].reshape((7, 1)).copy()
+            trk.kf.P = state['P'][i].copy()
+            trk.time_since_update = int(state['time_since_update'][i])
+            trk.hits = int(state['hits'][i])
+            trk.hit_streak = int(state['hit_streak'][i])
+            trk.age = int(state['age'][i])
+            self.trackers.append(trk)
+
+    def _associate(self, dets, trks):
+        '''
+        Associates detections to the predicted tracklet boxes using the configured metric.
+        See ``associate_detections_to_trackers`` for the returned values.
+        '''
+        if self.metric_function_type == 'iou':
+            return associate_detections_to_trackers(dets, trks, self.metric_function, self.metric_function_threshold, self.assignment_solver)
+        elif self.metric_function_type == 'euclidean':
+            return associate_detections_to_trackers(dets, trks, self.metric_function, self.metric_function_threshold * -1, self.assignment_solver)
+        else:
+            raise ValueError('Unrecognized metric function type')
+
     def _track(self, dets, fid = None):
         """
         Requires: this method must be called once for each frame even with empty detections.
@@ -240,25 +328,17 @@ class KalmanFilterBoundingBoxTracker(BoundingBoxTracker):
         trks = np.ma.compress_rows(np.ma.masked_invalid(trks))
         for t in reversed(to_del):
             self.trackers.pop(t)
-        if self.metric_function_type == 'iou':
-            matched, unmatched_dets, unmatched_trks = associate_detections_to_trackers(dets, trks, self.metric_function, self.metric_function_threshold)
-        elif self.metric_function_type == 'euclidean':
-            matched, unmatched_dets, unmatched_trks = associate_detections_to_trackers(dets, trks, self.metric_function, self.metric_function_threshold * -1)
-        else:
-            raise ValueError('Unrecognized metric function type')
+        matched, unmatched_dets, unmatched_trks = self._associate(dets, trks)
 
         #update matched trackers with assigned detections
         d_to_t = {}
-        for t, trk in enumerate(self.trackers):
-            if(t not in unmatched_trks):
-                d = matched[np.where(matched[:,1] == t)[0], 0]
-                if len(d) > 0:
-                    d_to_t[d[0]] = t
-                trk.update(dets[d,:][0])
+        for d, t in matched:
+            d_to_t[d] = t
+            self.trackers[t].update(dets[d, :])
 
         #create and initialise new trackers for unmatched detections
-        for i in unmatched_dets:
-            trk = KalmanBoxTracker(dets[i,:])
+        for i, track_id in zip(unmatched_dets, self._allocate_ids(len(unmatched_dets))):
+            trk = KalmanBoxTracker(dets[i,:], track_id, self.history_size)
             self.trackers.append(trk)
         i = len(self.trackers)
 
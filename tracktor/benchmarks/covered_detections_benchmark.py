@@ -0,0 +1,68 @@
+'''
+Time of removing the detections covered by active tracks (step 3 of
+``Tracker.step``) on crowded MOT-style frames: many pedestrians of similar size
+close to each other, most of them detected again in every frame. Compares one
+NMS per track, as the tracker used to do, with ``Tracker.remove_covered_detections``.
+
+Usage: python covered_detections_benchmark.py [--tracks 10 50 100 200] [--repeat 50]
+'''
+import argparse
+import timeit
+
+import numpy as np
+import torch
+from torchvision.ops import nms
+
+from videoflow_contrib.tracktor.tracker import Track, Tracker
+
+def crowded_frame(nb_tracks, seed = 0):
+    '''
+    - Returns:
+        - track_pos: tensor of shape (nb_tracks, 4)
+        - det_pos: tensor of shape (nb_dets, 4), after NMS
+        - det_scores: tensor of shape (nb_dets,)
+    '''
+    rng = np.random.RandomState(seed)
+    nb_new = max(1, nb_tracks // 10)
+    wh = np.stack([rng.uniform(25, 60, size = nb_tracks + nb_new)] * 2, axis = 1) * [1., 2.5]
+    tl = rng.uniform(0, [1920, 1080], size = (nb_tracks + nb_new, 2)) - wh / 2
+    boxes = np.concatenate([tl, tl + wh], axis = 1)
+    track_pos = boxes[:nb_tracks]
+    # Tracks are detected again with some jitter, new persons appear
+    det_pos = boxes + rng.normal(0, 3, size = boxes.shape)
+    det_scores = rng.uniform(0.5, 1., size = len(boxes))
+    det_pos, det_scores = torch.from_numpy(det_pos.astype(np.float32)), torch.from_numpy(det_scores.astype(np.float32))
+    keep = nms(det_pos, det_scores, 0.3)
+    return torch.from_numpy(track_pos.astype(np.float32)), det_pos[keep], det_scores[keep]
+
+def nms_per_track(tracks, det_pos, det_scores, nms_thresh):
+    for t in tracks:
+        keep = nms(torch.cat([t.pos, det_pos]), torch.cat([torch.tensor([2.0]), det_scores]), nms_thresh)
+        keep = keep[torch.ge(keep, 1)] - 1
+        det_pos, det_scores = det_pos[keep], det_scores[keep]
+        if keep.nelement() == 0:
+            break
+    return det_pos, det_scores
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tracks', type = int, nargs = '+', default = [10, 50, 100, 200])
+    parser.add_argument('--repeat', type = int, default = 50)
+    args = parser.parse_args()
+
+    print(f'{"tracks":>7} {"dets":>5} {"left":>5} {"per track ms":>13} {"single ms":>10} {"speedup":>8}')
+    for nb_tracks in args.tracks:
+        track_pos, det_pos, det_scores = crowded_frame(nb_tracks)
+        tracker = Tracker(None, None, 0.5, 0.5, 0.3, 0.6, False, 10, True, 10, 2.0, 0.2,
+            {'enabled': False, 'n_steps': 1, 'center_only': True}, 'cv2.MOTION_EUCLIDEAN', 100, 0.00001)
+        tracker.tracks = [Track(pos.view(1, -1), torch.tensor(1.), i, torch.zeros(1, 128), 10, 10, 1)
+            for i, pos in enumerate(track_pos)]
+        expected = nms_per_track(tracker.tracks, det_pos, det_scores, 0.3)
+        result = tracker.remove_covered_detections(det_pos, det_scores)
+        assert all(torch.equal(e, r) for e, r in zip(expected, result))
+        loop_ms = timeit.timeit(lambda: nms_per_track(tracker.tracks, det_pos, det_scores, 0.3), number = args.repeat) * 1000 / args.repeat
+        single_ms = timeit.timeit(lambda: tracker.remove_covered_detections(det_pos, det_scores), number = args.repeat) * 1000 / args.repeat
+        print(f'{nb_tracks:>7} {len(det_pos):>5} {len(result[0]):>5} {loop_ms:>13.3f} {single_ms:>10.3f} {loop_ms / single_ms:>8.1f}')
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+'''
+Milliseconds per frame of the Tracktor tracker on CPU, with the GPU and the
+CPU detector input sizes and several torch thread counts. The networks have
+random weights unless ``--pretrained`` is given (it downloads the models), so
+only the timings are meaningful.
+
+Usage: python cpu_benchmark.py [--frames 5] [--threads 1 4] [--pretrained]
+'''
+import argparse
+import timeit
+
+import numpy as np
+import torch
+
+from videoflow_contrib.tracktor.frcnn_fpn import FRCNN_FPN
+from videoflow_contrib.tracktor.reid import resnet50
+from videoflow_contrib.tracktor.tracker import Tracker
+from videoflow_contrib.tracktor.tracktor import CPU_INPUT_SIZE, GPU_INPUT_SIZE, _load_networks
+
+FRAME_SHAPE = (1080, 1920)
+
+def make_tracker(input_size, pretrained):
+    if pretrained:
+        obj_detect, reid_network = _load_networks('cpu', *input_size)
+    else:
+        torch.manual_seed(0)
+        obj_detect = FRCNN_FPN(num_classes = 2, min_size = input_size[0], max_size = input_size[1]).eval()
+        reid_network = resnet50(pretrained = False, output_dim = 128).eval()
+    return Tracker(
+        obj_detect,
+        reid_network,
+        detection_person_thresh = 0.5,
+        regression_person_thresh = 0.5,
+        detection_nms_thresh = 0.3,
+        regression_nms_thresh = 0.6,
+        public_detections = False,
+        inactive_patience = 10,
+        do_reid = True,
+        max_features_num = 10,
+        reid_sim_threshold = 2.0,
+        reid_iou_threshold = 0.2,
+        motion_model_cfg = {'enabled': False, 'n_steps': 1, 'center_only': True},
+        warp_mode = 'cv2.MOTION_EUCLIDEAN',
+        number_of_iterations = 100,
+        termination_eps = 0.00001,
+        do_align = False
+    )
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frames', type = int, default = 5)
+    parser.add_argument('--threads', type = int, nargs = '+', default = [1, torch.get_num_threads()])
+    parser.add_argument('--pretrained', action = 'store_true')
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(0)
+    frames = [torch.from_numpy(rng.rand(1, 3, *FRAME_SHAPE).astype(np.float32)) for _ in range(args.frames)]
+    print(f'{"input size":>12} {"threads":>8} {"ms/frame":>9}')
+    for input_size in [GPU_INPUT_SIZE, CPU_INPUT_SIZE]:
+        tracker = make_tracker(input_size, args.pretrained)
+        for nb_threads in args.threads:
+            torch.set_num_threads(nb_threads)
+            tracker.reset()
+            with torch.no_grad():
+                tracker.step({'img': frames[0]})
+                start = timeit.default_timer()
+                for frame in frames[1:]:
+                    tracker.step({'img': frame})
+            ms = (timeit.default_timer() - start) * 1000 / max(1, len(frames) - 1)
+            print(f'{"x".join(map(str, input_size)):>12} {nb_threads:>8} {ms:>9.0f}')
+
+if __name__ == "__main__":
+    main()
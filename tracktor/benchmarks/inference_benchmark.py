@@ -0,0 +1,78 @@
+'''
+Per-frame latency of the Tracktor networks on CPU: eager float32 against
+TorchScript, channels-last and bfloat16/float16 autocast (see ``inference``).
+A frame costs what the tracker asks of the networks at each step: detection,
+regression of the boxes of the tracks and re-identification features of
+the same boxes. The networks have random weights, so only the timings are
+meaningful; the feature error is the largest distance between the features of
+a configuration and the eager float32 ones, relative to their norm.
+
+Usage: python inference_benchmark.py [--frames 5] [--boxes 20] [--threads 1]
+'''
+import argparse
+import copy
+import tempfile
+import timeit
+
+import torch
+
+from videoflow_contrib.tracktor.frcnn_fpn import FRCNN_FPN
+from videoflow_contrib.tracktor.inference import optimize_networks
+from videoflow_contrib.tracktor.reid import resnet50
+from videoflow_contrib.tracktor.tracktor import CPU_INPUT_SIZE
+
+CONFIGS = [
+    ('eager', {}),
+    ('script', {'script': True}),
+    ('channels_last', {'channels_last': True}),
+    ('script + channels_last', {'script': True, 'channels_last': True}),
+    ('bfloat16', {'precision': 'bfloat16'}),
+    ('script + channels_last + bfloat16', {'script': True, 'channels_last': True, 'precision': 'bfloat16'}),
+    ('float16', {'precision': 'float16'}),
+]
+
+def frame_cost(obj_detect, reid_network, image, boxes):
+    obj_detect.load_image(image)
+    obj_detect.detect()
+    obj_detect.predict_boxes(None, boxes)
+    return reid_network.test_rois(image, boxes)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frames', type = int, default = 5)
+    parser.add_argument('--boxes', type = int, default = 20)
+    parser.add_argument('--threads', type = int, default = torch.get_num_threads())
+    args = parser.parse_args()
+    torch.set_num_threads(args.threads)
+
+    torch.manual_seed(0)
+    obj_detect = FRCNN_FPN(num_classes = 2, min_size = CPU_INPUT_SIZE[0], max_size = CPU_INPUT_SIZE[1]).eval()
+    reid_network = resnet50(pretrained = False, output_dim = 128).eval()
+    images = [torch.rand(1, 3, 1080, 1920) for _ in range(args.frames)]
+    tl = torch.rand(args.boxes, 2) * torch.tensor([1800., 900.])
+    boxes = torch.cat([tl, tl + torch.tensor([60., 150.])], 1)
+
+    print(f'{"configuration":>34} {"ms/frame":>9} {"feature error":>14}')
+    with torch.no_grad(), tempfile.TemporaryDirectory() as cache_dir:
+        weights_paths = [cache_dir + '/detection.pkl', cache_dir + '/reid.pkl']
+        torch.save(obj_detect.state_dict(), weights_paths[0])
+        torch.save(reid_network.state_dict(), weights_paths[1])
+        reference = None
+        for name, config in CONFIGS:
+            networks = optimize_networks(
+                copy.deepcopy(obj_detect), copy.deepcopy(reid_network), **config,
+                detection_weights_path = weights_paths[0], reid_weights_path = weights_paths[1])
+            # Warm up, which also runs the TorchScript optimizations
+            features = frame_cost(*networks, images[0], boxes)
+            frame_cost(*networks, images[0], boxes)
+            start = timeit.default_timer()
+            for image in images:
+                frame_cost(*networks, image, boxes)
+            ms = (timeit.default_timer() - start) * 1000 / len(images)
+            if reference is None:
+                reference = features
+            error = ((features - reference).norm(dim = 1) / reference.norm(dim = 1)).max()
+            print(f'{name:>34} {ms:>9.0f} {error:>14.4f}')
+
+if __name__ == "__main__":
+    main()
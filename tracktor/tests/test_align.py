@@ -0,0 +1,64 @@
+import pytest
+
+import cv2
+import numpy as np
+import torch
+from videoflow_contrib.tracktor.tracker import Track
+from videoflow_contrib.tracktor.utils import warp_pos
+
+from test_tracker import make_tracker, run, scene
+
+def textured_frames(warp_matrix, h = 540, w = 960, seed = 0):
+    '''
+    Returns two frames of shape (1, 3, h, w), the second one being the first one \
+        moved by ``warp_matrix``.
+    '''
+    rng = np.random.RandomState(seed)
+    image = cv2.GaussianBlur(rng.rand(h, w).astype(np.float32), (0, 0), 4)
+    image = (image - image.min()) / (image.max() - image.min())
+    if warp_matrix.shape[0] == 3:
+        moved = cv2.warpPerspective(image, warp_matrix, (w, h), borderMode = cv2.BORDER_REFLECT)
+    else:
+        moved = cv2.warpAffine(image, warp_matrix, (w, h), borderMode = cv2.BORDER_REFLECT)
+    return [torch.from_numpy(np.stack([f] * 3))[None] for f in (image, moved)]
+
+def make_track(i, pos):
+    return Track(torch.tensor([pos]), torch.tensor(1.), i, torch.zeros(1, 2), 10, 10, 1)
+
+def test_warp_pos_of_many_boxes_matches_single_boxes():
+    pos = torch.rand(6, 4) * 100
+    for warp_matrix in [torch.tensor([[1., 0.1, 3.], [-0.1, 1., -2.]]), torch.tensor([[1., 0., 3.], [0., 1., -2.], [1e-4, 0., 1.]])]:
+        expected = torch.cat([warp_pos(p.view(1, -1), warp_matrix) for p in pos])
+        assert torch.allclose(warp_pos(pos, warp_matrix), expected)
+
+@pytest.mark.parametrize('warp_mode, warp_matrix', [
+    ('cv2.MOTION_TRANSLATION', np.float32([[1, 0, 12], [0, 1, -7]])),
+    ('cv2.MOTION_EUCLIDEAN', cv2.getRotationMatrix2D((480, 270), 2., 1.).astype(np.float32)),
+    ('cv2.MOTION_HOMOGRAPHY', np.float32([[1, 0.01, 8], [0, 1, 4], [1e-5, 0, 1]]))
+])
+def test_align_moves_all_tracks_with_the_camera(warp_mode, warp_matrix):
+    previous, current = textured_frames(warp_matrix)
+    tracker = make_tracker([], do_align = True, warp_mode = warp_mode, align_max_size = 320)
+    boxes = [[100., 100., 160., 220.], [500., 300., 540., 380.], [800., 50., 900., 250.]]
+    tracker.tracks = [make_track(0, boxes[0]), make_track(1, boxes[1])]
+    tracker.inactive_tracks = [make_track(2, boxes[2])]
+    tracker.last_gray = tracker.align_image(previous)
+    tracker.gray = tracker.align_image(current)
+    assert max(tracker.gray.shape) == 320
+    tracker.align({'img': current})
+
+    warp_matrix = torch.from_numpy(warp_matrix)
+    expected = warp_pos(torch.tensor(boxes), warp_matrix)
+    aligned = torch.cat([t.pos for t in tracker.tracks + tracker.inactive_tracks])
+    assert torch.allclose(aligned, expected, atol = 1.)
+
+def test_align_is_skipped_when_ecc_fails():
+    frames = scene(4, 5, 0)
+    tracker = make_tracker(frames, do_align = True)
+    # Blank frames: ECC cannot converge and tracking goes on without alignment
+    results = run(tracker, len(frames))
+    assert all(len(r) == 4 for r in results)
+    assert tracker.last_gray.shape == (320, 320)
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,105 @@
+import os
+
+import pytest
+
+import torch
+from videoflow_contrib.tracktor.frcnn_fpn import FRCNN_FPN
+from videoflow_contrib.tracktor import inference
+from videoflow_contrib.tracktor.inference import optimize_networks
+from videoflow_contrib.tracktor.reid import resnet50
+
+def make_networks(tmp_path):
+    torch.manual_seed(0)
+    obj_detect = FRCNN_FPN(num_classes = 2, min_size = 240, max_size = 400).eval()
+    reid_network = resnet50(pretrained = False, output_dim = 128).eval()
+    paths = (str(tmp_path / 'detection.pkl'), str(tmp_path / 'reid.pkl'))
+    if not os.path.exists(paths[0]):
+        torch.save(obj_detect.state_dict(), paths[0])
+        torch.save(reid_network.state_dict(), paths[1])
+    return obj_detect, reid_network, paths
+
+def outputs(obj_detect, reid_network, image, boxes):
+    with torch.no_grad():
+        obj_detect.load_image(image)
+        return obj_detect.predict_boxes(None, boxes) + (reid_network.test_rois(image, boxes),)
+
+@pytest.fixture
+def inputs():
+    torch.manual_seed(1)
+    image = torch.rand(1, 3, 240, 320)
+    boxes = torch.tensor([[10., 20., 60., 140.], [100., 50., 180., 230.], [200., 0., 300., 100.]])
+    return image, boxes
+
+def test_scripted_channels_last_networks_match_eager(tmp_path, inputs):
+    obj_detect, reid_network, paths = make_networks(tmp_path)
+    expected = outputs(obj_detect, reid_network, *inputs)
+    cache_times = None
+    for _ in range(2):
+        # The second time, the scripted networks are loaded from the cache
+        obj_detect, reid_network, _ = make_networks(tmp_path)
+        obj_detect, reid_network = optimize_networks(
+            obj_detect, reid_network, channels_last = True, script = True,
+            detection_weights_path = paths[0], reid_weights_path = paths[1])
+        assert isinstance(obj_detect.backbone.module, torch.jit.ScriptModule)
+        for e, r in zip(expected, outputs(obj_detect, reid_network, *inputs)):
+            assert r.dtype == torch.float32
+            assert torch.allclose(e, r, rtol = 1e-3, atol = 1e-3)
+        cache = sorted(str(tmp_path / f) for f in os.listdir(str(tmp_path)) if f.endswith('.pt'))
+        assert [os.path.basename(f).split('.')[1] for f in cache] == ['backbone', 'cnn']
+        assert cache_times in (None, [os.path.getmtime(f) for f in cache])
+        cache_times = [os.path.getmtime(f) for f in cache]
+
+def read_only(monkeypatch, *dirs):
+    '''
+    Makes temporary files fail to be created in ``dirs``
+    '''
+    mkstemp = inference.tempfile.mkstemp
+    def checked_mkstemp(dir, **kwargs):
+        if any(os.path.abspath(dir) == os.path.abspath(str(d)) for d in dirs):
+            raise PermissionError(dir)
+        return mkstemp(dir = dir, **kwargs)
+    monkeypatch.setattr(inference.tempfile, 'mkstemp', checked_mkstemp)
+
+def script_networks(tmp_path):
+    obj_detect, reid_network, paths = make_networks(tmp_path)
+    return optimize_networks(
+        obj_detect, reid_network, script = True,
+        detection_weights_path = paths[0], reid_weights_path = paths[1])
+
+def test_unwritable_weights_dir_falls_back_to_cache_dir(tmp_path, inputs, monkeypatch):
+    expected = outputs(*make_networks(tmp_path)[:2], *inputs)
+    monkeypatch.setattr(inference, 'CACHE_DIR', str(tmp_path / 'cache'))
+    read_only(monkeypatch, tmp_path)
+    for _ in range(2):
+        # The second time, the scripted networks are loaded from CACHE_DIR
+        for e, r in zip(expected, outputs(*script_networks(tmp_path), *inputs)):
+            assert torch.allclose(e, r, rtol = 1e-3, atol = 1e-3)
+        assert not any(f.endswith('.pt') for f in os.listdir(str(tmp_path)))
+        assert len(os.listdir(str(tmp_path / 'cache'))) == 2
+
+def test_scripted_networks_stay_in_memory_without_writable_cache(tmp_path, inputs, monkeypatch):
+    expected = outputs(*make_networks(tmp_path)[:2], *inputs)
+    monkeypatch.setattr(inference, 'CACHE_DIR', str(tmp_path / 'cache'))
+    read_only(monkeypatch, tmp_path, tmp_path / 'cache')
+    with pytest.warns(UserWarning):
+        networks = script_networks(tmp_path)
+    for e, r in zip(expected, outputs(*networks, *inputs)):
+        assert torch.allclose(e, r, rtol = 1e-3, atol = 1e-3)
+    assert os.listdir(str(tmp_path / 'cache')) == []
+
+def test_bfloat16_networks_return_float32(tmp_path, inputs):
+    obj_detect, reid_network, _ = make_networks(tmp_path)
+    expected = outputs(obj_detect, reid_network, *inputs)
+    obj_detect, reid_network = optimize_networks(obj_detect, reid_network, precision = 'bfloat16')
+    result = outputs(obj_detect, reid_network, *inputs)
+    assert all(r.dtype == torch.float32 for r in result)
+    # Features keep their direction
+    assert torch.nn.functional.cosine_similarity(expected[2], result[2]).min() > 0.95
+
+def test_invalid_precision(tmp_path):
+    obj_detect, reid_network, _ = make_networks(tmp_path)
+    with pytest.raises(ValueError):
+        optimize_networks(obj_detect, reid_network, precision = 'int8')
+
+if __name__ == "__main__":
+    pytest.main([__file__])
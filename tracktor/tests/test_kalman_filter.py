@@ -0,0 +1,43 @@
+import pytest
+
+import torch
+from videoflow_contrib.tracktor.kalman_filter import KalmanFilter, mean_to_pos, pos_to_measurement
+
+def moving_boxes(nb_frames):
+    start = torch.tensor([[10., 20., 50., 100.], [300., 50., 330., 120.], [100., 400., 180., 560.]])
+    velocity = torch.tensor([[3., 1., 3., 1.], [-2., 0., -2., 0.], [1., -4., 2., -3.]])
+    return [start + f * velocity for f in range(nb_frames)], velocity
+
+@pytest.mark.parametrize('center_only', [True, False])
+def test_predicts_constant_velocity_boxes(center_only):
+    frames, velocity = moving_boxes(30)
+    kf = KalmanFilter(center_only = center_only)
+    mean, covariance = kf.initiate(frames[0])
+    for pos in frames[1:-1]:
+        mean, covariance = kf.predict(mean, covariance)
+        mean, covariance = kf.update(mean, covariance, pos)
+    mean, covariance = kf.predict(mean, covariance)
+    predicted = mean_to_pos(mean)
+    centers = pos_to_measurement(frames[-1])[:, :2]
+    assert torch.allclose(pos_to_measurement(predicted)[:, :2], centers, atol = 0.5)
+    if center_only:
+        # The size is not extrapolated, but follows the observations with some lag
+        assert torch.allclose(mean[:, 2:4], pos_to_measurement(frames[-2])[:, 2:], atol = 1.)
+    else:
+        assert torch.allclose(predicted, frames[-1], atol = 0.5)
+    assert covariance.shape == (3, 8, 8)
+    assert torch.allclose(covariance, covariance.transpose(1, 2), atol = 1e-3)
+
+def test_uncertainty_grows_without_observations():
+    frames, _ = moving_boxes(5)
+    kf = KalmanFilter()
+    mean, covariance = kf.initiate(frames[0])
+    mean, covariance = kf.update(*kf.predict(mean, covariance), frames[1])
+    variances = [covariance.diagonal(dim1 = 1, dim2 = 2)]
+    for _ in range(3):
+        mean, covariance = kf.predict(mean, covariance)
+        variances.append(covariance.diagonal(dim1 = 1, dim2 = 2))
+    assert all(torch.all(v2[:, :4] > v1[:, :4]) for v1, v2 in zip(variances, variances[1:]))
+
+if __name__ == "__main__":
+    pytest.main([__file__])
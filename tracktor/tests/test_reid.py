@@ -0,0 +1,30 @@
+import pytest
+
+import torch
+from videoflow_contrib.tracktor.reid import resnet50
+
+@pytest.fixture(scope = 'module')
+def reid_network():
+    torch.manual_seed(0)
+    return resnet50(pretrained = False, output_dim = 128).eval()
+
+def test_build_crops(reid_network):
+    image = torch.rand(1, 3, 480, 640)
+    rois = torch.tensor([
+        [10., 20., 138., 276.],       # exactly the network input size
+        [100.7, 50.2, 180.9, 400.5],  # truncated to whole pixels
+        [0., 5., 0., 80.],            # degenerate, widened to one pixel
+        [300., 10., 620., 470.]
+    ])
+    crops = reid_network.build_crops(image, rois)
+    assert crops.shape == (4, 3, 256, 128)
+    assert torch.allclose(crops[0], image[0, :, 20:276, 10:138], atol = 1e-6)
+    column = image[0, :, 5:80, 0]
+    assert torch.all(crops[2] >= column.min() - 1e-6) and torch.all(crops[2] <= column.max() + 1e-6)
+    assert crops[3].mean().item() == pytest.approx(image[0, :, 10:470, 300:620].mean().item(), abs = 1e-2)
+    with torch.no_grad():
+        assert reid_network.test_rois(image, rois).shape == (4, 128)
+        assert reid_network.build_crops(image, torch.zeros(0, 4)).shape == (0, 3, 256, 128)
+
+if __name__ == "__main__":
+    pytest.main([__file__])
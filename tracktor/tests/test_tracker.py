@@ -0,0 +1,191 @@
+import pytest
+
+import numpy as np
+import torch
+from torchvision.ops import nms
+from videoflow_contrib.tracktor import checkpoint
+from videoflow_contrib.tracktor.tracker import Track, Tracker
+
+class FakeDetector(torch.nn.Module):
+    '''
+    Returns the boxes of the next frame of a scene as detections and regresses
+    track boxes to the closest box of the current frame.
+    '''
+    def __init__(self, frames):
+        super(FakeDetector, self).__init__()
+        self.weight = torch.nn.Parameter(torch.zeros(1))
+        self.frames = [torch.from_numpy(f) for f in frames]
+        self.index = -1
+
+    def load_image(self, images):
+        self.index += 1
+
+    def detect(self, img = None):
+        boxes = self.frames[self.index]
+        return boxes[:, :4], boxes[:, 4]
+
+    def predict_boxes(self, images, boxes):
+        dets = self.frames[self.index]
+        if len(dets) == 0:
+            return boxes, torch.zeros(len(boxes))
+        distances = torch.cdist(boxes, dets[:, :4])
+        closest = distances.argmin(dim = 1)
+        found = distances[torch.arange(len(boxes)), closest] < 20
+        return torch.where(found[:, None], dets[closest, :4], boxes), found.float()
+
+class FakeReid(torch.nn.Module):
+    '''
+    Features are the width and height of the boxes, which do not change in the scenes.
+    '''
+    def __init__(self):
+        super(FakeReid, self).__init__()
+        self.weight = torch.nn.Parameter(torch.zeros(1))
+
+    def test_rois(self, image, rois):
+        return torch.stack([rois[:, 2] - rois[:, 0], rois[:, 3] - rois[:, 1]], 1) / 10
+
+def scene(nb_boxes, nb_frames, seed, hidden = ()):
+    '''
+    Returns a list of np.array of shape (nb_boxes, [xmin, ymin, xmax, ymax, score]). \
+        Box ``i`` is missing from the frames of ``hidden`` for all ``(i, frames)`` in it.
+    '''
+    rng = np.random.RandomState(seed)
+    tl = rng.uniform(0, 900, size = (nb_boxes, 2))
+    wh = rng.uniform(30, 90, size = (nb_boxes, 2))
+    v = rng.uniform(-2, 2, size = (nb_boxes, 2))
+    frames = []
+    for f in range(nb_frames):
+        boxes = np.concatenate([tl + f * v, tl + f * v + wh, np.ones((nb_boxes, 1))], axis = 1)
+        visible = np.array([not any(i == j and f in frames_j for j, frames_j in hidden) for i in range(nb_boxes)])
+        frames.append(boxes[visible].astype(np.float32))
+    return frames
+
+def make_tracker(frames, **kwargs):
+    config = dict(
+        detection_person_thresh = 0.5,
+        regression_person_thresh = 0.5,
+        detection_nms_thresh = 0.3,
+        regression_nms_thresh = 0.6,
+        public_detections = False,
+        inactive_patience = 10,
+        do_reid = True,
+        max_features_num = 10,
+        reid_sim_threshold = 2.0,
+        reid_iou_threshold = 0.0,
+        motion_model_cfg = {'enabled': False, 'n_steps': 1, 'center_only': True},
+        warp_mode = 'cv2.MOTION_EUCLIDEAN',
+        number_of_iterations = 100,
+        termination_eps = 0.00001,
+        do_align = False
+    )
+    config.update(kwargs)
+    return Tracker(FakeDetector(frames), FakeReid(), **config)
+
+def run(tracker, nb_frames):
+    image = torch.zeros(1, 3, 1000, 1000)
+    results = []
+    with torch.no_grad():
+        for _ in range(nb_frames):
+            tracker.step({'img': image})
+            results.append(tracker.get_current_tracks())
+    return results
+
+def test_tracks_keep_their_ids_on_cpu():
+    frames = scene(8, 15, 0)
+    tracker = make_tracker(frames)
+    assert tracker.device == torch.device('cpu')
+    results = run(tracker, len(frames))
+    assert all(len(r) == 8 for r in results)
+    assert np.array_equal(np.sort(results[0][:, 5]), np.sort(results[-1][:, 5]))
+
+@pytest.mark.parametrize('center_only', [True, False])
+@pytest.mark.parametrize('kalman', [False, True])
+def test_reid_after_occlusion_with_motion_model(center_only, kalman):
+    frames = scene(6, 20, 1, hidden = [(2, range(8, 11))])
+    tracker = make_tracker(frames, motion_model_cfg = {'enabled': True, 'n_steps': 2, 'center_only': center_only, 'kalman': kalman})
+    results = run(tracker, len(frames))
+    assert len(results[9]) == 5
+    assert set(results[0][:, 5]) == set(results[-1][:, 5])
+
+@pytest.mark.parametrize('kalman', [False, True])
+def test_restored_tracker_continues_tracking(kalman):
+    frames = scene(6, 20, 2, hidden = [(1, range(5, 8))])
+    motion_model_cfg = {'enabled': kalman, 'n_steps': 1, 'center_only': False, 'kalman': kalman}
+    tracker = make_tracker(frames, motion_model_cfg = motion_model_cfg)
+    run(tracker, 6)
+    restored = make_tracker(frames, motion_model_cfg = motion_model_cfg)
+    restored.obj_detect.index = tracker.obj_detect.index
+    restored.set_state(checkpoint.loads(checkpoint.dumps(tracker.get_state())))
+    for expected, result in zip(run(tracker, 14), run(restored, 14)):
+        expected, result = expected[np.argsort(expected[:, 5])], result[np.argsort(result[:, 5])]
+        assert np.allclose(expected, result)
+
+@pytest.mark.parametrize('results_window', [1, 4])
+def test_bounded_results_match_full_results(results_window):
+    frames = scene(6, 25, 4, hidden = [(0, range(6, 9)), (3, range(12, 20))])
+    expected = run(make_tracker(frames), len(frames))
+    tracker = make_tracker(frames, results_window = results_window)
+    for i, result in enumerate(run(tracker, len(frames))):
+        assert np.array_equal(result[np.argsort(result[:, 5])], expected[i][np.argsort(expected[i][:, 5])])
+    frame_ids = {f for im_indexes in tracker.get_results().values() for f in im_indexes}
+    assert frame_ids == set(range(len(frames) - results_window, len(frames)))
+
+def test_bounded_results_are_restored():
+    frames = scene(6, 20, 2, hidden = [(1, range(5, 8))])
+    tracker = make_tracker(frames, results_window = 3)
+    run(tracker, 6)
+    restored = make_tracker(frames, results_window = 3)
+    restored.obj_detect.index = tracker.obj_detect.index
+    restored.set_state(checkpoint.loads(checkpoint.dumps(tracker.get_state(include_results = True))))
+    assert np.array_equal(restored.get_current_tracks(), tracker.get_current_tracks())
+    for expected, result in zip(run(tracker, 14), run(restored, 14)):
+        assert np.allclose(expected[np.argsort(expected[:, 5])], result[np.argsort(result[:, 5])])
+    assert restored.get_results().keys() == tracker.get_results().keys()
+
+def loop_remove_covered_detections(tracks, det_pos, det_scores, nms_thresh):
+    for t in tracks:
+        keep = nms(torch.cat([t.pos, det_pos]), torch.cat([torch.tensor([2.0]), det_scores]), nms_thresh)
+        keep = keep[torch.ge(keep, 1)] - 1
+        det_pos, det_scores = det_pos[keep], det_scores[keep]
+    return det_pos, det_scores
+
+def random_boxes(rng, n):
+    tl = rng.uniform(0, 500, size = (n, 2))
+    return torch.from_numpy(np.concatenate([tl, tl + rng.uniform(20, 80, size = (n, 2))], axis = 1).astype(np.float32))
+
+@pytest.mark.parametrize('seed', range(5))
+def test_covered_detections_match_nms_per_track(seed):
+    rng = np.random.RandomState(seed)
+    tracker = make_tracker([])
+    tracker.tracks = [Track(pos.view(1, -1), torch.tensor(1.), i, torch.zeros(1, 2), 10, 10, 1) for i, pos in enumerate(random_boxes(rng, 40))]
+    det_pos, det_scores = random_boxes(rng, 80), torch.from_numpy(rng.choice([0.7, 0.9, 1.], size = 80).astype(np.float32))
+    keep = nms(det_pos, det_scores, tracker.detection_nms_thresh)
+    det_pos, det_scores = det_pos[keep], det_scores[keep]
+    expected_pos, expected_scores = loop_remove_covered_detections(tracker.tracks, det_pos, det_scores, tracker.detection_nms_thresh)
+    pos, scores = tracker.remove_covered_detections(det_pos, det_scores)
+    assert 0 < len(pos) < len(det_pos)
+    assert torch.equal(pos, expected_pos) and torch.equal(scores, expected_scores)
+
+def test_mean_features_match_per_detection_distances():
+    rng = np.random.RandomState(3)
+    tracks = []
+    for i in range(5):
+        t = Track(torch.zeros(1, 4), torch.tensor(1.), i, torch.from_numpy(rng.rand(1, 16).astype(np.float32)), 10, 4, 1)
+        for _ in range(i * 2):
+            t.add_features(torch.from_numpy(rng.rand(1, 16).astype(np.float32)))
+        tracks.append(t)
+    dets = torch.from_numpy(rng.rand(7, 16).astype(np.float32))
+    expected = torch.cat([torch.cat([t.test_features(d.view(1, -1)) for d in dets], 1) for t in tracks], 0)
+    assert torch.allclose(tracks[-1].mean_features, torch.cat(list(tracks[-1].features)).mean(0, keepdim = True))
+    assert torch.allclose(torch.cdist(torch.cat([t.mean_features for t in tracks]), dets), expected, atol = 1e-5)
+
+def test_running_mean_features_stay_exact_on_long_tracks():
+    rng = np.random.RandomState(4)
+    t = Track(torch.zeros(1, 4), torch.tensor(1.), 0, torch.from_numpy(rng.rand(1, 16).astype(np.float32)), 10, 10, 1)
+    for _ in range(5000):
+        t.add_features(torch.from_numpy(rng.normal(0, 100, (1, 16)).astype(np.float32)))
+    assert len(t.features) == 10 and t.mean_features.dtype == torch.float32
+    assert torch.allclose(t.mean_features, torch.cat(list(t.features)).mean(0, keepdim = True), atol = 1e-4)
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,30 @@
+import pytest
+
+import numpy as np
+from videoflow_contrib.tracktor import TracktorFromFrames, FrameDelay
+from videoflow_contrib.tracktor.utils import StreamingInterpolator
+
+def test_frame_delay_pairs_frames_with_interpolated_tracks():
+    delay = 3
+    frame_delay = FrameDelay(delay)
+    frame_delay.open()
+    interpolator = StreamingInterpolator(delay)
+    for i in range(10):
+        tracks = interpolator.update(np.array([[i, i, i + 1, i + 1, 1., 1.]]))
+        frame = frame_delay.process(i)
+        if tracks is None:
+            assert frame == 0
+        else:
+            assert tracks[0, 0] == frame
+
+def test_close_flushes_the_last_frames():
+    flushed = []
+    node = TracktorFromFrames(interpolate = True, flush_callback = flushed.extend)
+    node._interpolator = StreamingInterpolator(3)
+    for i in range(5):
+        node._interpolator.update(np.array([[i, i, i + 1, i + 1, 1., 1.]]))
+    node.close()
+    assert [f[0, 0] for f in flushed] == [2, 3, 4]
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,73 @@
+import pytest
+
+import numpy as np
+from scipy.interpolate import interp1d
+from videoflow_contrib.tracktor.utils import StreamingInterpolator, interpolate
+
+def random_tracks(nb_tracks, nb_frames, seed, max_gap = 5):
+    '''
+    Returns dict of track_id -> dict of frame -> np.array [xmin, ymin, xmax, ymax, score], \
+        with gaps of at most ``max_gap`` frames
+    '''
+    rng = np.random.RandomState(seed)
+    tracks = {}
+    for i in range(nb_tracks):
+        start = rng.randint(0, nb_frames // 2)
+        frames = np.arange(start, rng.randint(start + 1, nb_frames))
+        frames = frames[(rng.rand(len(frames)) > 0.3) | (frames == start)]
+        tracks[i] = {int(f): np.r_[rng.uniform(0, 500, size = 4), rng.rand()] for f in frames}
+    return tracks
+
+def loop_interpolate(tracks):
+    interpolated = {}
+    for i, track in tracks.items():
+        frames = sorted(track.keys())
+        if len(frames) == 1:
+            interpolated[i] = {frames[0]: track[frames[0]][:4]}
+            continue
+        inter = [interp1d(frames, [track[f][k] for f in frames]) for k in range(4)]
+        interpolated[i] = {f: np.array([fn(f) for fn in inter]) for f in range(frames[0], frames[-1] + 1)}
+    return interpolated
+
+def test_interpolate_matches_interp1d():
+    tracks = random_tracks(20, 60, 0)
+    expected = loop_interpolate(tracks)
+    interpolated = interpolate(tracks)
+    assert interpolated.keys() == expected.keys()
+    for i in expected:
+        assert list(interpolated[i].keys()) == list(expected[i].keys())
+        assert np.allclose(np.array(list(interpolated[i].values())), np.array(list(expected[i].values())))
+
+def frames_of(tracks, nb_frames):
+    frames = [[] for _ in range(nb_frames)]
+    for i, track in tracks.items():
+        for f, bb in track.items():
+            frames[f].append(np.r_[bb, i])
+    return [np.array(f).reshape(-1, 6) for f in frames]
+
+@pytest.mark.parametrize('max_gap', [0, 2, 10])
+def test_streaming_interpolator_fills_short_gaps(max_gap):
+    nb_frames = 60
+    tracks = random_tracks(20, nb_frames, 1)
+    interpolator = StreamingInterpolator(max_gap)
+    outputs = [interpolator.update(f) for f in frames_of(tracks, nb_frames)]
+    assert all(o is None for o in outputs[:max_gap])
+    outputs = outputs[max_gap:] + interpolator.flush()
+    assert len(outputs) == nb_frames
+
+    interpolated = interpolate(tracks)
+    for f, output in enumerate(outputs):
+        rows = {int(r[5]): r for r in output}
+        assert len(rows) == len(output)
+        for i, track in tracks.items():
+            seen = np.array(sorted(track.keys()))
+            before, after = seen[seen <= f], seen[seen >= f]
+            filled = len(before) and len(after) and after[0] - before[-1] - 1 <= max_gap
+            assert (i in rows) == bool(filled)
+            if filled:
+                assert np.allclose(rows[i][:4], interpolated[i][f])
+    # Tracks that can not be filled anymore are forgotten
+    assert len(interpolator._last_seen) == 0
+
+if __name__ == "__main__":
+    pytest.main([__file__])
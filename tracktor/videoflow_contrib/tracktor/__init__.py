@@ -1 +1 @@
-from .tracktor import TracktorFromFrames, TracktorFromBoxes
\ No newline at end of file
+from .tracktor import TracktorFromFrames, TracktorFromBoxes, FrameDelay, INACTIVE_PATIENCE
\ No newline at end of file
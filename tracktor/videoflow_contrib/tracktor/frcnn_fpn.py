@@ -8,34 +8,89 @@ from torchvision.models.detection.backbone_utils import resnet_fpn_backbone
 
 
 class FRCNN_FPN(FasterRCNN):
-
-    def __init__(self, num_classes):
+    '''
+    FasterRCNN with a FPN backbone that detects persons and regresses the boxes \
+        of existing tracks on the same frame. The frame is transformed and its \
+        backbone features are computed once, then shared by ``detect`` and \
+        ``predict_boxes``.
+
+    - Arguments:
+        - num_classes: number of classes, background included
+        - min_size, max_size: frames are resized so that their short side is \
+            ``min_size``, unless their long side becomes larger than ``max_size``.
+    '''
+
+    def __init__(self, num_classes, min_size=800, max_size=1333):
         backbone = resnet_fpn_backbone('resnet50', False)
-        super(FRCNN_FPN, self).__init__(backbone, num_classes)
-
-    def detect(self, img):
-        device = list(self.parameters())[0].device
-        img = img.to(device)
-
-        detections = self(img)[0]
+        super(FRCNN_FPN, self).__init__(
+            backbone, num_classes, min_size=min_size, max_size=max_size)
+        self._images = None
+        self._preprocessed = None
+
+    def load_image(self, images):
+        '''
+        Sets the frame of the next ``detect`` and ``predict_boxes`` calls. The \
+            transform and the backbone run on the first of them that needs it.
+
+        - Arguments:
+            - images: torch.Tensor of shape (1, 3, h, w)
+        '''
+        self._images = images
+        self._preprocessed = None
+
+    def _preprocess(self, images=None):
+        '''
+        - Returns:
+            - images: ImageList of the transformed frame
+            - features: OrderedDict of FPN features of the transformed frame
+            - original_image_sizes: list of (h, w) of the frame
+        '''
+        if images is not None and images is not self._images:
+            self.load_image(images)
+        if self._preprocessed is None:
+            device = list(self.parameters())[0].device
+            images = self._images.to(device)
+            original_image_sizes = [img.shape[-2:] for img in images]
+            images, _ = self.transform(images, None)
+            features = self.backbone(images.tensors)
+            if isinstance(features, torch.Tensor):
+                features = collections.OrderedDict([(0, features)])
+            self._preprocessed = (images, features, original_image_sizes)
+        return self._preprocessed
+
+    def detect(self, img=None):
+        '''
+        - Arguments:
+            - img: torch.Tensor of shape (1, 3, h, w). If None, the frame set \
+                with ``load_image``.
+
+        - Returns:
+            - boxes: torch.Tensor of shape (nb_boxes, 4)
+            - scores: torch.Tensor of shape (nb_boxes,)
+        '''
+        images, features, original_image_sizes = self._preprocess(img)
+        proposals, _ = self.rpn(images, features)
+        detections, _ = self.roi_heads(features, proposals, images.image_sizes)
+        detections = self.transform.postprocess(
+            detections, images.image_sizes, original_image_sizes)[0]
 
         return detections['boxes'].detach(), detections['scores'].detach()
 
     def predict_boxes(self, images, boxes):
+        '''
+        - Arguments:
+            - images: torch.Tensor of shape (1, 3, h, w). If None, the frame \
+                set with ``load_image``.
+            - boxes: torch.Tensor of shape (nb_boxes, 4)
+
+        - Returns:
+            - boxes: torch.Tensor of shape (nb_boxes, 4), regressed
+            - scores: torch.Tensor of shape (nb_boxes,)
+        '''
         device = list(self.parameters())[0].device
-        images = images.to(device)
         boxes = boxes.to(device)
+        images, features, original_image_sizes = self._preprocess(images)
 
-        targets = None
-        original_image_sizes = [img.shape[-2:] for img in images]
-
-        images, targets = self.transform(images, targets)
-
-        features = self.backbone(images.tensors)
-        if isinstance(features, torch.Tensor):
-            features = collections.OrderedDict([(0, features)])
-
-        # proposals, proposal_losses = self.rpn(images, features, targets)
         from torchvision.models.detection.transform import resize_boxes
         boxes = resize_boxes(
             boxes, original_image_sizes[0], images.image_sizes[0])
@@ -55,6 +110,3 @@ class FRCNN_FPN(FasterRCNN):
             pred_boxes, images.image_sizes[0], original_image_sizes[0])
         pred_scores = pred_scores[:, 1:].squeeze(dim=1).detach()
         return pred_boxes, pred_scores
-
-    def load_image(self, img):
-        pass
\ No newline at end of file
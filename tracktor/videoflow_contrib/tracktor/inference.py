@@ -0,0 +1,189 @@
+'''
+Faster inference of the Tracktor networks: TorchScript, channels-last memory
+format and float16/bfloat16 autocast.
+
+Only the convolutional parts, which take most of the time, are changed: the
+backbone of the detector and the CNN of the re-identification network. Their
+outputs are cast back to float32, so box regression, NMS and the tracker run
+in float32 whatever the precision.
+
+Scripted networks are saved as TorchScript next to the weights they were
+built from, or in ``CACHE_DIR`` if that directory is not writable, and loaded
+from there as long as the weights do not change.
+'''
+import hashlib
+import os
+import tempfile
+import warnings
+
+import torch
+import torch.nn as nn
+
+from .reid import build_crops
+
+PRECISIONS = ('float32', 'float16', 'bfloat16')
+
+# Where scripted networks are cached when the directory of their weights is not writable
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'videoflow_contrib', 'tracktor')
+
+class Autocast(nn.Module):
+    '''
+    Runs ``module`` with autocast to ``dtype`` and the channels-last memory format, \
+        and returns float32 outputs.
+
+    - Arguments:
+        - module: nn.Module that takes a batch of images. It returns a tensor \
+            or a dict of tensors.
+        - precision: one of ``PRECISIONS``
+        - channels_last: If True, inputs are converted to channels-last. \
+            ``module`` should already be.
+    '''
+    def __init__(self, module, precision = 'float32', channels_last = False):
+        super(Autocast, self).__init__()
+        self.module = module
+        self.dtype = getattr(torch, precision)
+        self.channels_last = channels_last
+
+    def forward(self, x):
+        if self.channels_last:
+            x = x.contiguous(memory_format = torch.channels_last)
+        with torch.autocast(x.device.type, dtype = self.dtype, enabled = self.dtype != torch.float32):
+            out = self.module(x)
+        if isinstance(out, torch.Tensor):
+            return out.float()
+        return out.__class__((k, v.float()) for k, v in out.items())
+
+class ReidInference(nn.Module):
+    '''
+    Re-identification network that computes the features of crops with \
+        ``forward_module``. It has the ``test_rois`` of ``reid.ResNet``, which is \
+        all that ``Tracker`` uses.
+
+    - Arguments:
+        - forward_module: nn.Module with the ``forward`` of ``reid.ResNet``
+    '''
+    def __init__(self, forward_module):
+        super(ReidInference, self).__init__()
+        self.forward_module = forward_module
+
+    def forward(self, x):
+        return self.forward_module(x)
+
+    def test_rois(self, image, rois):
+        return self.forward(build_crops(image, rois, next(self.parameters()).device))
+
+def check_precision(precision, device):
+    '''
+    Returns ``precision``, or ``'float32'`` with a warning if autocast to it is not \
+        supported on ``device``. Raises ``ValueError`` if it is not one of ``PRECISIONS``.
+    '''
+    if precision not in PRECISIONS:
+        raise ValueError('Invalid precision {}; must be one of {}'.format(precision, PRECISIONS))
+    if precision == 'float32':
+        return precision
+    dtype = getattr(torch, precision)
+    if device.type == 'cuda' and dtype == torch.bfloat16 and not torch.cuda.is_bf16_supported():
+        supported = False
+    else:
+        # Unsupported autocast dtypes are disabled with a warning
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            one = torch.ones(1, 1, device = device)
+            with torch.autocast(device.type, dtype = dtype):
+                supported = torch.mm(one, one).dtype == dtype
+    if not supported:
+        warnings.warn('{} is not supported on {}, using float32'.format(precision, device))
+        return 'float32'
+    return precision
+
+def _cache_paths(weights_path, name):
+    '''
+    Paths where the scripted ``name`` part of the network with weights \
+        ``weights_path`` is cached, in order of preference: next to the weights, \
+        then in ``CACHE_DIR`` under a name unique to the weights path.
+    '''
+    weights_path = os.path.abspath(weights_path)
+    stem = os.path.splitext(os.path.basename(weights_path))[0]
+    filename = '{}.{}.torch-{}.pt'.format(stem, name, torch.__version__)
+    digest = hashlib.sha1(weights_path.encode('utf-8')).hexdigest()[:16]
+    return [
+        os.path.join(os.path.dirname(weights_path), filename),
+        os.path.join(CACHE_DIR, '{}.{}'.format(digest, filename))
+    ]
+
+def _save(scripted, path):
+    '''
+    Saves ``scripted`` to ``path`` through a temporary file renamed into place, so \
+        that processes loading it never see a partial file. Returns False if the \
+        directory is not writable.
+    '''
+    tmp_path = None
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok = True)
+        fd, tmp_path = tempfile.mkstemp(dir = os.path.dirname(path), suffix = '.tmp')
+        os.close(fd)
+        scripted.save(tmp_path)
+        os.replace(tmp_path, path)
+        return True
+    except (OSError, RuntimeError):
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+
+def _script(module, weights_path, name, channels_last):
+    '''
+    Scripts ``module``. If ``weights_path`` is given, the result is cached (see \
+        ``_cache_paths``) and loaded from the cache instead, unless the weights \
+        are newer. If no cache path is writable, the scripted module is only \
+        kept in memory.
+    '''
+    device = next(module.parameters()).device
+    memory_format = torch.channels_last if channels_last else torch.contiguous_format
+    if weights_path is None:
+        return torch.jit.script(module.to(memory_format = memory_format))
+
+    paths = _cache_paths(weights_path, name)
+    weights_time = os.path.getmtime(weights_path)
+    for path in paths:
+        if os.path.exists(path) and os.path.getmtime(path) >= weights_time:
+            try:
+                return torch.jit.load(path, map_location = device).to(memory_format = memory_format).eval()
+            except (OSError, RuntimeError):
+                pass
+    scripted = torch.jit.script(module)
+    if not any(_save(scripted, path) for path in paths):
+        warnings.warn('Could not cache the scripted {} in {}'.format(name, ' or '.join(paths)))
+    return scripted.to(memory_format = memory_format).eval()
+
+def optimize_networks(obj_detect, reid_network, precision = 'float32', channels_last = False, script = False,
+                    detection_weights_path = None, reid_weights_path = None):
+    '''
+    - Arguments:
+        - obj_detect: FRCNN_FPN in eval mode. Its backbone is replaced.
+        - reid_network: reid.ResNet in eval mode
+        - precision: one of ``PRECISIONS``. The convolutions run with autocast to \
+            it when it is supported by the device of the networks.
+        - channels_last: If True, convolutions use the channels-last memory format
+        - script: If True, the backbone and the re-identification CNN are compiled \
+            with TorchScript
+        - detection_weights_path, reid_weights_path: files the weights were loaded \
+            from. If given, the scripted networks are cached next to them, or in \
+            ``CACHE_DIR``.
+
+    - Returns:
+        - obj_detect: FRCNN_FPN
+        - reid_network: ReidInference, or ``reid_network`` if nothing is changed
+    '''
+    device = next(obj_detect.parameters()).device
+    precision = check_precision(precision, device)
+    if precision == 'float32' and not channels_last and not script:
+        return obj_detect, reid_network
+
+    memory_format = torch.channels_last if channels_last else torch.contiguous_format
+    backbone = obj_detect.backbone.to(memory_format = memory_format)
+    reid_cnn = reid_network.to(memory_format = memory_format)
+    if script:
+        backbone = _script(backbone, detection_weights_path, 'backbone', channels_last)
+        reid_cnn = _script(reid_cnn, reid_weights_path, 'cnn', channels_last)
+    obj_detect.backbone = Autocast(backbone, precision, channels_last)
+    return obj_detect, ReidInference(Autocast(reid_cnn, precision, channels_last))
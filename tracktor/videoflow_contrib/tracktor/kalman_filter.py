@@ -0,0 +1,104 @@
+'''
+Constant velocity Kalman filter on boxes, for all the tracks of a frame at once.
+
+The 8-dimensional state of a box is (cx, cy, w, h, vcx, vcy, vw, vh): the
+center, width and height of the box and their velocities. The box itself
+(cx, cy, w, h) is observed directly. Noises are relative to the height of the
+boxes, as in the Kalman filter of Deep SORT.
+
+Means are tensors of shape (nb_tracks, 8) and covariances of shape
+(nb_tracks, 8, 8), so that tracks can keep views on their own rows.
+'''
+import torch
+
+class KalmanFilter(object):
+    '''
+    - Arguments:
+        - center_only: If True, only the center of the boxes moves with its \
+            velocity; their size is kept as is by ``predict``.
+        - std_weight_position: standard deviation of the box noise, relative \
+            to the height of the box
+        - std_weight_velocity: standard deviation of the velocity noise, \
+            relative to the height of the box
+    '''
+    def __init__(self, center_only = False, std_weight_position = 1. / 20, std_weight_velocity = 1. / 160):
+        self._motion_mat = torch.eye(8)
+        nb_moving = 2 if center_only else 4
+        self._motion_mat[range(nb_moving), range(4, 4 + nb_moving)] = 1.
+        self._std_weight_position = std_weight_position
+        self._std_weight_velocity = std_weight_velocity
+
+    def _noise(self, heights, position_weight, velocity_weight):
+        '''
+        Diagonal covariances of shape (n, 8, 8) from heights of shape (n, 1)
+        '''
+        std = torch.cat([
+            position_weight * self._std_weight_position * heights.expand(-1, 4),
+            velocity_weight * self._std_weight_velocity * heights.expand(-1, 4)
+        ], dim = 1)
+        return torch.diag_embed(std ** 2)
+
+    def initiate(self, pos):
+        '''
+        - Arguments:
+            - pos: tensor of shape (n, [xmin, ymin, xmax, ymax])
+
+        - Returns:
+            - mean: tensor of shape (n, 8), with zero velocities
+            - covariance: tensor of shape (n, 8, 8)
+        '''
+        measurement = pos_to_measurement(pos)
+        mean = torch.cat([measurement, torch.zeros_like(measurement)], dim = 1)
+        covariance = self._noise(measurement[:, 3:], 2., 10.)
+        return mean, covariance
+
+    def predict(self, mean, covariance):
+        '''
+        Moves the states one frame ahead.
+
+        - Arguments:
+            - mean: tensor of shape (n, 8)
+            - covariance: tensor of shape (n, 8, 8)
+
+        - Returns:
+            - mean, covariance: the predicted states
+        '''
+        motion_mat = self._motion_mat.to(mean.device)
+        motion_cov = self._noise(mean[:, 3:4], 1., 1.)
+        mean = mean @ motion_mat.t()
+        covariance = motion_mat @ covariance @ motion_mat.t() + motion_cov
+        return mean, covariance
+
+    def update(self, mean, covariance, pos):
+        '''
+        Corrects the states with observed boxes.
+
+        - Arguments:
+            - mean: tensor of shape (n, 8)
+            - covariance: tensor of shape (n, 8, 8)
+            - pos: tensor of shape (n, [xmin, ymin, xmax, ymax])
+
+        - Returns:
+            - mean, covariance: the corrected states
+        '''
+        measurement = pos_to_measurement(pos)
+        std = self._std_weight_position * mean[:, 3:4].expand(-1, 4)
+        projected_cov = covariance[:, :4, :4] + torch.diag_embed(std ** 2)
+        # The covariances are symmetric, so K = P H^T S^-1 = (S^-1 H P)^T
+        kalman_gain = torch.linalg.solve(projected_cov, covariance[:, :4, :]).transpose(1, 2)
+        innovation = measurement - mean[:, :4]
+        mean = mean + (kalman_gain @ innovation.unsqueeze(2)).squeeze(2)
+        covariance = covariance - kalman_gain @ projected_cov @ kalman_gain.transpose(1, 2)
+        return mean, covariance
+
+def pos_to_measurement(pos):
+    '''
+    (n, [xmin, ymin, xmax, ymax]) -> (n, [cx, cy, w, h])
+    '''
+    return torch.cat([(pos[:, :2] + pos[:, 2:]) / 2, pos[:, 2:] - pos[:, :2]], dim = 1)
+
+def mean_to_pos(mean):
+    '''
+    (n, [cx, cy, w, h, ...]) -> (n, [xmin, ymin, xmax, ymax])
+    '''
+    return torch.cat([mean[:, :2] - mean[:, 2:4] / 2, mean[:, :2] + mean[:, 2:4] / 2], dim = 1)
@@ -7,7 +7,7 @@ import torchvision.models as models
 import torch.utils.model_zoo as model_zoo
 from torchvision.models.resnet import Bottleneck
 import torchvision.models as models
-from torchvision.transforms import Resize, Compose, ToPILImage, ToTensor
+from torchvision.ops import roi_align
 
 import numpy as np
 import random
@@ -78,29 +78,10 @@ class ResNet(models.ResNet):
         return out
 
     def build_crops(self, image, rois):
-        res = []
-        trans = Compose([ToPILImage(), Resize((256,128)), ToTensor()])
-        for r in rois:
-            x0 = int(r[0])
-            y0 = int(r[1])
-            x1 = int(r[2])
-            y1 = int(r[3])
-            if x0 == x1:
-                if x0 != 0:
-                    x0 -= 1
-                else:
-                    x1 += 1
-            if y0 == y1:
-                if y0 != 0:
-                    y0 -= 1
-                else:
-                    y1 += 1
-            im = image[0,:,y0:y1,x0:x1]
-            im = trans(im)
-            res.append(im)
-        res = torch.stack(res, 0)
-        res = res.cuda()
-        return res
+        """Crops the rois out of the image, resized to the 256x128 input of the
+        network. See ``build_crops``.
+        """
+        return build_crops(image, rois, next(self.parameters()).device)
 
     def sum_losses(self, batch, loss, margin, prec_at_k):
         """For Pretraining
@@ -112,11 +93,12 @@ class ResNet(models.ResNet):
             size (N)
         """
 
+        device = next(self.parameters()).device
         inp = batch[0][0]
-        inp = Variable(inp).cuda()
+        inp = Variable(inp).to(device)
 
         labels = batch[1][0]
-        labels = labels.cuda()
+        labels = labels.to(device)
 
         embeddings = self.forward(inp)
         
@@ -136,8 +118,8 @@ class ResNet(models.ResNet):
             out_pos = self.compare(e0, e1, train=True)
             out_neg = self.compare(e0, e2, train=True)
 
-            tar_pos = Variable(torch.ones(out_pos.size(0)).view(-1,1).cuda())
-            tar_neg = Variable(torch.zeros(out_pos.size(0)).view(-1,1).cuda())
+            tar_pos = Variable(torch.ones(out_pos.size(0)).view(-1,1).to(device))
+            tar_neg = Variable(torch.zeros(out_pos.size(0)).view(-1,1).to(device))
 
             loss_pos = F.binary_cross_entropy_with_logits(out_pos, tar_pos)
             loss_neg = F.binary_cross_entropy_with_logits(out_neg, tar_neg)
@@ -214,11 +196,11 @@ class ResNet(models.ResNet):
             neg_dist = dist * Variable(mask_anchor_negative.float())
 
             # now get the weights for each anchor, detach because it should be a constant weighting factor
-            pos_weights = Variable(torch.zeros(dist.size()).cuda())
-            neg_weights = Variable(torch.zeros(dist.size()).cuda())
+            pos_weights = Variable(torch.zeros(dist.size()).to(device))
+            neg_weights = Variable(torch.zeros(dist.size()).to(device))
             for i in range(dist.size(0)):
                 # make by line
-                mask = torch.zeros(dist.size()).byte().cuda()
+                mask = torch.zeros(dist.size()).byte().to(device)
                 mask[i] = 1
                 pos_weights[mask_anchor_positive & mask] = F.softmax(pos_dist[mask_anchor_positive & mask], 0)
                 neg_weights[mask_anchor_negative & mask] = F.softmin(neg_dist[mask_anchor_negative & mask], 0)
@@ -257,7 +239,7 @@ class ResNet(models.ResNet):
                 num_ges += prec_at_k
             k_loss = torch.Tensor(1)
             k_loss[0] = num_hit / num_ges
-            losses['prec_at_k'] = Variable(k_loss.cuda())
+            losses['prec_at_k'] = Variable(k_loss.to(device))
 
         losses['total_loss'] = total_loss
 
@@ -271,6 +253,21 @@ class ResNet(models.ResNet):
         self.load_state_dict(updated_state_dict)
 
 
+def build_crops(image, rois, device):
+    """Crops the rois out of the image, resized to the 256x128 input of the
+    reid network, on ``device``. All rois are cropped by a single roi_align,
+    which averages the pixels of each output cell when a roi is downscaled.
+    """
+    # Whole pixels, at least one wide and high, as the boxes were cropped
+    # with slices before
+    x0, y0, x1, y1 = rois.to(device).float().trunc().unbind(1)
+    x0, x1 = x0 - ((x0 == x1) & (x0 != 0)).float(), x1 + ((x0 == x1) & (x0 == 0)).float()
+    y0, y1 = y0 - ((y0 == y1) & (y0 != 0)).float(), y1 + ((y0 == y1) & (y0 == 0)).float()
+    boxes = torch.stack([x0, y0, x1, y1], 1)
+    return roi_align(
+        image[:1].to(device), [boxes], output_size=(256, 128),
+        spatial_scale=1., sampling_ratio=-1, aligned=True)
+
 def resnet50(pretrained=False, **kwargs):
     """Constructs a ResNet-50 model.
     Args:
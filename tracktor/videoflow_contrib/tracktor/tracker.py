@@ -1,11 +1,13 @@
 from collections import deque
+import cv2
 import numpy as np
 import torch
 import torch.nn.functional as F
 from torch.autograd import Variable
 from scipy.optimize import linear_sum_assignment
-from torchvision.ops.boxes import clip_boxes_to_image, nms
+from torchvision.ops.boxes import box_iou, clip_boxes_to_image, nms
 
+from .kalman_filter import KalmanFilter, mean_to_pos, pos_to_measurement
 from .utils import (
     bbox_overlaps,
     warp_pos,
@@ -18,6 +20,21 @@ from .utils import (
 class Tracker:
     '''
     The main tracking file. Here is where the magic happens
+
+    - Arguments:
+        - motion_model_cfg: dict with ``enabled``, ``n_steps`` and ``center_only``. \
+            If its optional ``kalman`` is True, tracks are moved by a constant \
+            velocity Kalman filter (see ``kalman_filter``) instead of their average \
+            velocity over the last ``n_steps`` frames.
+        - results_window: If None, ``results`` keeps the boxes of every frame, \
+            which grows with the length of the video. Otherwise only the boxes of \
+            the last ``results_window`` frames (at least the current one) are kept.
+        - warp_mode: ECC motion type used by ``align`` when ``do_align``, as a cv2 \
+            constant or its name (``'cv2.MOTION_EUCLIDEAN'``, ``'cv2.MOTION_HOMOGRAPHY'``, ...)
+        - number_of_iterations, termination_eps: stop criteria of ECC
+        - align_max_size: ECC runs on grayscale frames downscaled so that their \
+            longest side is at most ``align_max_size`` pixels. Along with \
+            ``number_of_iterations``, this bounds the cost of ``align``.
     ''' 
     def __init__(self, 
                 obj_detect, 
@@ -36,7 +53,9 @@ class Tracker:
                 warp_mode,
                 number_of_iterations,
                 termination_eps,
-                do_align = False
+                do_align = False,
+                results_window = None,
+                align_max_size = 320
         ):
 
         self.obj_detect = obj_detect
@@ -53,15 +72,37 @@ class Tracker:
         self.reid_iou_threshold = reid_iou_threshold
         self.do_align = do_align
         self.motion_model_cfg = motion_model_cfg
+        self.kalman_filter = None
+        if motion_model_cfg['enabled'] and motion_model_cfg.get('kalman', False):
+            self.kalman_filter = KalmanFilter(center_only = motion_model_cfg['center_only'])
+        if isinstance(warp_mode, str):
+            warp_mode = getattr(cv2, warp_mode.split('.')[-1])
         self.warp_mode = warp_mode
         self.number_of_iterations = number_of_iterations
         self.termination_eps = termination_eps
+        self.align_max_size = align_max_size
+        if results_window is not None and results_window < 1:
+            raise ValueError('results_window must be None or at least 1')
+        self.results_window = results_window
 
         self.tracks = []
         self.inactive_tracks = []
         self.track_num = 0
         self.im_index = 0
         self.results = {}
+        self.current_tracks = np.array([])
+        # Ids of the tracks written to ``results`` for each kept frame, oldest first
+        self._result_ids = deque()
+        # Downscaled grayscale frames used by ``align``
+        self.gray = None
+        self.last_gray = None
+
+    @property
+    def device(self):
+        '''
+        The device of the detector, on which the tracker keeps all its tensors
+        '''
+        return next(self.obj_detect.parameters()).device
     
     def reset(self, hard = True):
         self.tracks = []
@@ -70,7 +111,11 @@ class Tracker:
         if hard:
             self.track_num = 0
             self.results = {}
+            self.current_tracks = np.array([])
+            self._result_ids.clear()
             self.im_index = 0
+            self.gray = None
+            self.last_gray = None
     
     def tracks_to_inactive(self, tracks):
         self.tracks = [t for t in self.tracks if t not in tracks]
@@ -83,6 +128,8 @@ class Tracker:
         Initializes new Track objects and saves them
         '''
         num_new = new_det_pos.size(0)
+        if self.kalman_filter is not None:
+            kf_means, kf_covariances = self.kalman_filter.initiate(new_det_pos)
         for i in range(num_new):
             self.tracks.append(Track(
                     new_det_pos[i].view(1, -1),
@@ -94,8 +141,31 @@ class Tracker:
                     self.motion_model_cfg['n_steps'] if self.motion_model_cfg['n_steps'] > 0 else 1
                 )
             )
+            if self.kalman_filter is not None:
+                self.tracks[-1].kf_mean = kf_means[i]
+                self.tracks[-1].kf_covariance = kf_covariances[i]
         self.track_num += num_new
     
+    def remove_covered_detections(self, det_pos, det_scores):
+        '''
+        Removes the detections that overlap an active track by more than \
+            ``detection_nms_thresh``. Running NMS on each track with a score above \
+            the ones of the detections removes the same detections, since those \
+            left after NMS do not suppress each other.
+
+        - Arguments:
+            - det_pos: tensor of shape (nb_dets, 4) of detections after NMS
+            - det_scores: tensor of shape (nb_dets,)
+
+        - Returns:
+            - det_pos, det_scores: the detections not covered by a track, in the same order
+        '''
+        if len(self.tracks) == 0 or det_pos.nelement() == 0:
+            return det_pos, det_scores
+        covered = box_iou(det_pos, self.get_pos()).gt(self.detection_nms_thresh).any(dim = 1)
+        keep = torch.logical_not(covered)
+        return det_pos[keep], det_scores[keep]
+
     def regress_tracks(self, blob):
         '''
         Regresses the position of the tracks and also checks their scores
@@ -114,7 +184,7 @@ class Tracker:
                 s.append(scores[i])
                 t.pos = pos[i].view(1, -1)
         
-        return torch.Tensor(s[::-1]).cuda()
+        return torch.Tensor(s[::-1]).to(self.device)
     
     def get_pos(self):
         '''
@@ -125,7 +195,7 @@ class Tracker:
         elif len(self.tracks) > 1:
             pos = torch.cat([t.pos for t in self.tracks], 0)
         else:
-            pos = torch.zeros(0).cuda()
+            pos = torch.zeros(0, device = self.device)
         return pos
     
     def get_features(self):
@@ -137,7 +207,7 @@ class Tracker:
         elif len(self.tracks) > 1:
             features = torch.cat([t.features for t in self.tracks], 0)
         else:
-            features = torch.zeros(0).cuda()
+            features = torch.zeros(0, device = self.device)
         return features
     
     def get_inactive_features(self):
@@ -149,30 +219,27 @@ class Tracker:
         elif len(self.inactive_tracks) > 1:
             features = torch.cat([t.features for t in self.inactive_tracks], 0)
         else:
-            features = torch.zeros(0).cuda()
+            features = torch.zeros(0, device = self.device)
         return features
     
     def reid(self, blob, new_det_pos, new_det_scores):
         '''
         Tries to ReID inactive tracks with provided detections
         '''
-        new_det_features = [torch.zeros(0).cuda() for _ in range(len(new_det_pos))]
+        new_det_features = [torch.zeros(0, device = self.device) for _ in range(len(new_det_pos))]
         if self.do_reid:
             new_det_features = self.reid_network.test_rois(
                 blob['img'], new_det_pos
             ).data
 
             if len(self.inactive_tracks) >= 1:
-                dist_mat, pos = [], []
-                for t in self.inactive_tracks:
-                    dist_mat.append(torch.cat([t.test_features(feat.view(1, -1)) for feat in new_det_features], dim = 1))
-                    pos.append(t.pos)
-                if len(dist_mat) > 1:
-                    dist_mat = torch.cat(dist_mat, 0)
-                    pos = torch.cat(pos, 0)
-                else:
-                    dist_mat = dist_mat[0]
-                    pos = pos[0]
+                # Distances from the mean features of each inactive track to
+                # each detection
+                dist_mat = torch.cdist(
+                    torch.cat([t.mean_features for t in self.inactive_tracks], 0),
+                    new_det_features
+                )
+                pos = torch.cat([t.pos for t in self.inactive_tracks], 0)
 
                 # Calculate IoU distances
                 iou = bbox_overlaps(pos, new_det_pos)
@@ -199,16 +266,18 @@ class Tracker:
                 
                 for t in remove_inactive:
                     self.inactive_tracks.remove(t)
+                if self.kalman_filter is not None and len(remove_inactive):
+                    self.kalman_update(remove_inactive)
                 
-                keep = torch.Tensor([i for i in range(new_det_pos.size(0)) if i not in assigned]).long().cuda()
+                keep = torch.tensor([i for i in range(new_det_pos.size(0)) if i not in assigned], dtype = torch.long, device = self.device)
                 if keep.nelement() > 0:
                     new_det_pos = new_det_pos[keep]
                     new_det_scores = new_det_scores[keep]
                     new_det_features = new_det_features[keep]
                 else:
-                    new_det_pos = torch.zeros(0).cuda()
-                    new_det_scores = torch.zeros(0).cuda()
-                    new_det_features = torch.zeros(0).cuda()
+                    new_det_pos = torch.zeros(0, device = self.device)
+                    new_det_scores = torch.zeros(0, device = self.device)
+                    new_det_features = torch.zeros(0, device = self.device)
                 
         return new_det_pos, new_det_scores, new_det_features
 
@@ -227,12 +296,83 @@ class Tracker:
         for t, f in zip(self.tracks, new_features):
             t.add_features(f.view(1, -1))
     
+    def align_image(self, img):
+        '''
+        - Arguments:
+            - img: tensor of shape (1, 3, h, w)
+
+        - Returns:
+            - gray: np.array of shape (h', w') float32, ``img`` in grayscale and \
+                downscaled so that its longest side is at most ``align_max_size``
+        '''
+        img = img[0]
+        gray = img[0] * 0.299 + img[1] * 0.587 + img[2] * 0.114
+        scale = self.align_max_size / max(gray.shape)
+        if scale < 1:
+            size = (max(1, round(gray.size(0) * scale)), max(1, round(gray.size(1) * scale)))
+            gray = F.interpolate(gray[None, None], size = size, mode = 'area')[0, 0]
+        return gray.float().cpu().numpy()
+
+    def estimate_warp(self, scale):
+        '''
+        Estimates with ECC the camera motion from ``last_gray`` to ``gray``
+
+        - Arguments:
+            - scale: size of ``gray`` over the size of the full frame
+
+        - Returns:
+            - warp_matrix: tensor of shape (2, 3), or (3, 3) for a homography, in \
+                the coordinates of the full frame. None if ECC did not converge.
+        '''
+        if self.warp_mode == cv2.MOTION_HOMOGRAPHY:
+            warp_matrix = np.eye(3, 3, dtype = np.float32)
+        else:
+            warp_matrix = np.eye(2, 3, dtype = np.float32)
+        criteria = (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, self.number_of_iterations, self.termination_eps)
+        try:
+            _, warp_matrix = cv2.findTransformECC(
+                self.last_gray, self.gray, warp_matrix, self.warp_mode, criteria, None, 5)
+        except cv2.error:
+            return None
+
+        # From downscaled to full frame coordinates: S^-1 W S with S = diag(s, s, 1)
+        warp_matrix[:2, 2] /= scale
+        if warp_matrix.shape[0] == 3:
+            warp_matrix[2, :2] *= scale
+        return torch.from_numpy(warp_matrix)
+
     def align(self, blob):
         '''
         Aligns the positions of active and inactive tracks depending on camera motion
         '''
-        # TODO: To implement later. Not needed right now.
-        pass
+        if self.last_gray is None or self.last_gray.shape != self.gray.shape:
+            return
+        warp_matrix = self.estimate_warp(self.gray.shape[1] / blob['img'].size(-1))
+        if warp_matrix is None:
+            return
+
+        # All the boxes are warped at once
+        tracks = self.tracks + self.inactive_tracks if self.do_reid else self.tracks
+        boxes = [t.pos for t in tracks]
+        warp_last_pos = self.motion_model_cfg['enabled'] and self.kalman_filter is None
+        if warp_last_pos:
+            boxes += [p for t in self.tracks for p in t.last_pos]
+        warped = warp_pos(torch.cat(boxes, 0), warp_matrix)
+        for i, t in enumerate(tracks):
+            t.pos = warped[i:i + 1]
+        if warp_last_pos:
+            i = len(tracks)
+            for t in self.tracks:
+                for j in range(len(t.last_pos)):
+                    t.last_pos[j] = warped[i:i + 1]
+                    i += 1
+
+        if self.kalman_filter is not None:
+            mean = torch.stack([t.kf_mean for t in tracks])
+            measurement = pos_to_measurement(warp_pos(mean_to_pos(mean), warp_matrix))
+            mean = torch.cat([measurement, mean[:, 4:]], dim = 1)
+            for i, t in enumerate(tracks):
+                t.kf_mean = mean[i]
 
     def motion_step(self, track):
         '''
@@ -244,12 +384,42 @@ class Tracker:
         else:
             track.pos = track.pos + track.last_v
     
+    def kalman_predict(self, tracks):
+        '''
+        Moves the given tracks to the position predicted by the Kalman filter
+        '''
+        mean, covariance = self.kalman_filter.predict(
+            torch.stack([t.kf_mean for t in tracks]),
+            torch.stack([t.kf_covariance for t in tracks])
+        )
+        pos = mean_to_pos(mean)
+        for i, t in enumerate(tracks):
+            t.kf_mean, t.kf_covariance = mean[i], covariance[i]
+            t.pos = pos[i:i + 1]
+
+    def kalman_update(self, tracks):
+        '''
+        Corrects the Kalman filter states of the given tracks with their current positions
+        '''
+        mean, covariance = self.kalman_filter.update(
+            torch.stack([t.kf_mean for t in tracks]),
+            torch.stack([t.kf_covariance for t in tracks]),
+            torch.cat([t.pos for t in tracks], 0)
+        )
+        for i, t in enumerate(tracks):
+            t.kf_mean, t.kf_covariance = mean[i], covariance[i]
+
     def motion(self):
         '''
-        Applies a simple linear motion model that considers the last n_steps steps
+        Applies a simple linear motion model that considers the last n_steps steps, \
+            or the Kalman filter if there is one
         '''
-        # TODO: Maybe this algorithm can be improved by using Kalman Filter instead of linear motion
-        # here
+        if self.kalman_filter is not None:
+            tracks = self.tracks + self.inactive_tracks if self.do_reid else self.tracks
+            if len(tracks):
+                self.kalman_predict(tracks)
+            return
+
         for t in self.tracks:
             last_pos = list(t.last_pos)
 
@@ -263,7 +433,7 @@ class Tracker:
         
         if self.do_reid:
             for t in self.inactive_tracks:
-                if t.tas_v.nelement() > 0:
+                if t.last_v.nelement() > 0:
                     self.motion_step(t)
     
     def step(self, blob):
@@ -274,15 +444,22 @@ class Tracker:
         for t in self.tracks:
             # add current position to last_pos list
             t.last_pos.append(t.pos.clone())
+
+        if self.do_align:
+            self.gray = self.align_image(blob['img'])
+
+        # The detector transforms the frame and computes its backbone
+        # features once, for both detection and regression
+        self.obj_detect.load_image(blob['img'])
         
         # 1. Look for new detections
         if self.public_detections:
             boxes, scores = blob['boxes'], blob['scores']
             if boxes.nelement() == 0:
-                boxes = scores = torch.zeros(0).cuda()
+                boxes = scores = torch.zeros(0, device = self.device)
             else:
-                boxes = boxes.cuda()
-                scores = scores.cuda()
+                boxes = boxes.to(self.device)
+                scores = scores.to(self.device)
         else:
             boxes, scores = self.obj_detect.detect(blob['img'])
         
@@ -290,18 +467,18 @@ class Tracker:
             boxes = clip_boxes_to_image(boxes, blob['img'].shape[-2:])
             inds = torch.gt(scores, self.detection_person_thresh).nonzero().view(-1)
         else:
-            inds = torch.zeros(0).cuda()
+            inds = torch.zeros(0, device = self.device)
         
         if inds.nelement() > 0:
             det_pos = boxes[inds]
             det_scores = scores[inds]
         else:
-            det_pos = torch.zeros(0).cuda()
-            det_scores = torch.zeros(0).cuda()
+            det_pos = torch.zeros(0, device = self.device)
+            det_scores = torch.zeros(0, device = self.device)
         
         # 2. Predict tracks
         num_tracks = 0
-        nms_inp_reg = torch.zeros(0).cuda()
+        nms_inp_reg = torch.zeros(0, device = self.device)
         if len(self.tracks):
             # 2.1 Align
             if self.do_align:
@@ -319,33 +496,18 @@ class Tracker:
                 keep = nms(self.get_pos(), person_scores, self.regression_nms_thresh)
                 self.tracks_to_inactive([self.tracks[i] for i in list(range(len(self.tracks))) if i not in keep])
                 if keep.nelement() > 0:
+                    if self.kalman_filter is not None:
+                        self.kalman_update(self.tracks)
                     if self.do_reid:
                         new_features = self.get_appearances(blob)
                         self.add_features(new_features)
         
         # 3. Create new tracks
-        # !!! Here NMS is used to filter out detections that are already covered by tracks. This is
-		# !!! done by iterating through the active tracks one by one, assigning them a bigger score
-		# !!! than 1 (maximum score for detections) and then filtering the detections with NMS.
-		# !!! In the paper this is done by calculating the overlap with existing tracks, but the
-		# !!! result stays the same.
         if det_pos.nelement() > 0:
             keep = nms(det_pos, det_scores, self.detection_nms_thresh)
             det_pos = det_pos[keep]
             det_scores = det_scores[keep]
-
-            # Check with every track in a single run (problem if tracks delete each other)
-            for t in self.tracks:
-                nms_track_pos = torch.cat([t.pos, det_pos])
-                nms_track_scores = torch.cat(
-                    [torch.tensor([2.0]).to(det_scores.device), det_scores]
-                )
-                keep = nms(nms_track_pos, nms_track_scores, self.detection_nms_thresh)
-                keep = keep[torch.ge(keep, 1)] - 1
-                det_pos = det_pos[keep]
-                det_scores = det_scores[keep]
-                if keep.nelement() == 0:
-                    break
+            det_pos, det_scores = self.remove_covered_detections(det_pos, det_scores)
         
         if det_pos.nelement() > 0:
             new_det_pos = det_pos
@@ -359,10 +521,16 @@ class Tracker:
             
         
         # 4. Generate results
+        current_tracks = []
         for t in self.tracks:
             if t.id not in self.results.keys():
                 self.results[t.id] = {}
-            self.results[t.id][self.im_index] = np.concatenate([t.pos[0].clone().cpu().numpy(), np.array([t.score.clone().cpu().numpy().item()])])
+            bbox_and_score = np.concatenate([t.pos[0].clone().cpu().numpy(), np.array([t.score.clone().cpu().numpy().item()])])
+            self.results[t.id][self.im_index] = bbox_and_score
+            current_tracks.append(np.concatenate([bbox_and_score, np.array([t.id])]))
+        self.current_tracks = np.array(current_tracks)
+        self._result_ids.append([t.id for t in self.tracks])
+        self._drop_old_results()
         
         for t in self.inactive_tracks:
             t.count_inactive += 1
@@ -373,39 +541,182 @@ class Tracker:
 
         self.im_index += 1
         self.last_image = blob['img'][0]
+        if self.do_align:
+            self.last_gray = self.gray
     
+    def _drop_old_results(self):
+        '''
+        Removes from ``results`` the frames that are out of ``results_window``
+        '''
+        if self.results_window is None:
+            self._result_ids.clear()
+            return
+        while len(self._result_ids) > self.results_window:
+            frame_id = self.im_index - len(self._result_ids) + 1
+            for track_id in self._result_ids.popleft():
+                im_indexes = self.results[track_id]
+                del im_indexes[frame_id]
+                if not im_indexes:
+                    del self.results[track_id]
+
     def get_current_tracks(self):
         '''
         - Returns:
             -tracks: np.array of shape (nb_tracks, [xmin, ymin, xmax, ymax, score, track_id])
         '''
-        to_return = []
-        for track_id, im_indexes in self.results.items():
-            frame_id = self.im_index - 1
-            if frame_id in im_indexes:
-                bbox_and_score = im_indexes[frame_id]
-                to_return.append(np.concatenate([bbox_and_score, np.array([track_id])]))
-        return np.array(to_return)
+        return self.current_tracks
 
     def get_results(self):
         return self.results
+
+    def get_state(self, include_results = False):
+        '''
+        Returns a snapshot of the tracker that can be restored with ``set_state``,
+        possibly in another process. Use ``checkpoint.dumps`` to serialize it.
+
+        - Arguments:
+            - include_results: If True, the results of all the frames are included. \
+                Otherwise only the results of the last frame are, which is all that \
+                ``get_current_tracks`` needs and keeps the snapshot cheap.
+
+        - Returns:
+            - state: dict of str -> np.array
+        '''
+        tracks = self.tracks + self.inactive_tracks
+        features = [f for t in tracks for f in t.features]
+        last_pos = [p for t in tracks for p in t.last_pos]
+        last_v = [t.last_v.reshape(-1).cpu() for t in tracks]
+        kf_tracks = tracks if self.kalman_filter is not None else []
+
+        results = []
+        for track_id, im_indexes in self.results.items():
+            for frame_id, bbox_and_score in im_indexes.items():
+                if include_results or frame_id == self.im_index - 1:
+                    results.append((track_id, frame_id, bbox_and_score))
+
+        return {
+            'track_num': np.array(self.track_num),
+            'im_index': np.array(self.im_index),
+            'active': np.array([True] * len(self.tracks) + [False] * len(self.inactive_tracks)),
+            'ids': np.array([t.id for t in tracks], dtype = int),
+            'pos': _to_numpy([t.pos for t in tracks]).reshape(-1, 4),
+            'score': np.array([float(t.score) for t in tracks], dtype = np.float32),
+            'count_inactive': np.array([t.count_inactive for t in tracks], dtype = int),
+            'feature_counts': np.array([len(t.features) for t in tracks], dtype = int),
+            'features': _to_numpy(features),
+            'last_pos_counts': np.array([len(t.last_pos) for t in tracks], dtype = int),
+            'last_pos': _to_numpy(last_pos).reshape(-1, 4),
+            'last_v_sizes': np.array([v.nelement() for v in last_v], dtype = int),
+            'last_v': torch.cat(last_v).numpy() if len(last_v) else np.zeros((0,), dtype = np.float32),
+            'kf_mean': _to_numpy([t.kf_mean.view(1, -1) for t in kf_tracks]).reshape(-1, 8),
+            'kf_covariance': _to_numpy([t.kf_covariance.view(1, -1) for t in kf_tracks]).reshape(-1, 8, 8),
+            'last_gray': self.last_gray if self.last_gray is not None else np.zeros((0, 0), dtype = np.float32),
+            'result_ids': np.array([r[0] for r in results], dtype = int),
+            'result_frames': np.array([r[1] for r in results], dtype = int),
+            'result_boxes': np.array([r[2] for r in results], dtype = np.float32).reshape(-1, 5)
+        }
+
+    def set_state(self, state):
+        '''
+        Restores a snapshot returned by ``get_state``. The tracker must have been
+        created with the same arguments as the one that produced the snapshot.
+        '''
+        device = self.device
+        self.track_num = int(state['track_num'])
+        self.im_index = int(state['im_index'])
+        self.last_gray = state['last_gray'] if state['last_gray'].size else None
+
+        feature_offsets = np.cumsum(np.r_[0, state['feature_counts']])
+        last_pos_offsets = np.cumsum(np.r_[0, state['last_pos_counts']])
+        last_v_offsets = np.cumsum(np.r_[0, state['last_v_sizes']])
+        features = torch.from_numpy(state['features']).to(device)
+        last_pos = torch.from_numpy(state['last_pos']).to(device)
+        last_v = torch.from_numpy(state['last_v']).to(device)
+        mm_steps = self.motion_model_cfg['n_steps'] if self.motion_model_cfg['n_steps'] > 0 else 1
+        if self.kalman_filter is not None:
+            kf_mean = torch.from_numpy(state['kf_mean']).to(device)
+            kf_covariance = torch.from_numpy(state['kf_covariance']).to(device)
+
+        self.tracks, self.inactive_tracks = [], []
+        for i in range(len(state['ids'])):
+            t = Track(
+                torch.from_numpy(state['pos'][i:i + 1]).to(device),
+                torch.tensor(state['score'][i]).to(device),
+                int(state['ids'][i]),
+                features[feature_offsets[i]:feature_offsets[i] + 1],
+                self.inactive_patience,
+                self.max_features_num,
+                mm_steps
+            )
+            for j in range(feature_offsets[i] + 1, feature_offsets[i + 1]):
+                t.add_features(features[j:j + 1])
+            t.last_pos.clear()
+            for j in range(last_pos_offsets[i], last_pos_offsets[i + 1]):
+                t.last_pos.append(last_pos[j:j + 1])
+            v = last_v[last_v_offsets[i]:last_v_offsets[i + 1]]
+            if v.nelement() > 0:
+                t.last_v = v if self.motion_model_cfg['center_only'] else v.view(1, -1)
+            t.count_inactive = int(state['count_inactive'][i])
+            if self.kalman_filter is not None:
+                t.kf_mean, t.kf_covariance = kf_mean[i], kf_covariance[i]
+            if state['active'][i]:
+                self.tracks.append(t)
+            else:
+                self.inactive_tracks.append(t)
+
+        self.results = {}
+        for track_id, frame_id, bbox_and_score in zip(state['result_ids'], state['result_frames'], state['result_boxes']):
+            self.results.setdefault(int(track_id), {})[int(frame_id)] = bbox_and_score
+
+        self._result_ids.clear()
+        if self.results_window is not None:
+            first_frame = self.im_index - self.results_window
+            for frame_id in range(max(0, first_frame), self.im_index):
+                self._result_ids.append([
+                    track_id for track_id, im_indexes in self.results.items() if frame_id in im_indexes
+                ])
+            for track_id in list(self.results.keys()):
+                for frame_id in [f for f in self.results[track_id] if f < first_frame]:
+                    del self.results[track_id][frame_id]
+                if not self.results[track_id]:
+                    del self.results[track_id]
+        frame_id = self.im_index - 1
+        self.current_tracks = np.array([
+            np.concatenate([im_indexes[frame_id], np.array([track_id])])
+            for track_id, im_indexes in self.results.items() if frame_id in im_indexes
+        ])
     
 
+def _to_numpy(tensors):
+    '''
+    Concatenates a list of tensors along the first dimension into an np.array
+    '''
+    if len(tensors) == 0:
+        return np.zeros((0, 0), dtype = np.float32)
+    return torch.cat([t.reshape(1, -1) if t.dim() < 2 else t for t in tensors], 0).cpu().numpy()
+
 class Track(object):
     '''
-    This class contains all necessary for every individual track.
+    This class contains all necessary for every individual track. \
+        ``mean_features`` is the mean of the last ``max_features_num`` \
+        appearance features, kept up to date by ``add_features`` from a running sum.
     '''
     def __init__(self, pos, score, track_id, features, inactive_patience, max_features_num, mm_steps):
         self.id = track_id
         self.pos = pos
         self.score = score
         self.features = deque([features])
+        self.mean_features = features.view(1, -1)
+        # In float64, so that rounding errors do not build up over long tracks
+        self._features_sum = self.mean_features.double()
         self.ims = deque([])
         self.count_inactive = 0
         self.inactive_patience = inactive_patience
         self.max_features_num = max_features_num
         self.last_pos = deque([pos.clone()], maxlen = mm_steps + 1)
         self.last_v = torch.Tensor([])
+        self.kf_mean = None
+        self.kf_covariance = None
         self.gt_id = None
     
     def has_positive_area(self):
@@ -416,20 +727,16 @@ class Track(object):
         Adds new appearance features to the object
         '''
         self.features.append(features)
+        self._features_sum = self._features_sum + features.view(1, -1)
         if len(self.features) > self.max_features_num:
-            self.features.popleft()
+            self._features_sum = self._features_sum - self.features.popleft().view(1, -1)
+        self.mean_features = (self._features_sum / len(self.features)).to(features.dtype)
     
     def test_features(self, test_features):
         '''
         Compares test_features to features of this Track object
         '''
-        if len(self.features) > 1:
-            features = torch.cat(list(self.features), dim = 0)
-        else:
-            features = self.features[0]
-        
-        features = features.mean(0, keepdim = True)
-        dist = F.pairwise_distance(features, test_features, keepdim = True)
+        dist = F.pairwise_distance(self.mean_features, test_features, keepdim = True)
         return dist
     
     def reset_last_pos(self):
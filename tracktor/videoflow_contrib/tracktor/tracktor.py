@@ -2,29 +2,169 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import absolute_import
 
+from collections import deque
+
 import torch
 import numpy as np
 from torchvision.transforms import ToTensor
 from videoflow.core.node import OneTaskProcessorNode
+from videoflow.core.constants import GPU
 from videoflow.utils.downloader import get_file
 
 from .tracker import Tracker
 from .frcnn_fpn import FRCNN_FPN
 from .reid import resnet50
+from .inference import optimize_networks
+from .utils import StreamingInterpolator
 
 URL_DETECTION_MODEL = 'https://github.com/videoflow/videoflow-contrib/releases/download/tracktor/detection.pth'
 URL_REID_MODEL = 'https://github.com/videoflow/videoflow-contrib/releases/download/tracktor/reid.pth'
 
+# Tracks are kept this many frames after they are lost, which is also the
+# longest gap that interpolation fills
+INACTIVE_PATIENCE = 10
+
+# Detector input resize (short side, max long side): FasterRCNN defaults on
+# GPU, about 2.5x fewer pixels on CPU
+GPU_INPUT_SIZE = (800, 1333)
+CPU_INPUT_SIZE = (480, 800)
+
+def _load_networks(device_type, min_size = None, max_size = None, nb_threads = None,
+                script = False, precision = 'float32', channels_last = False):
+    '''
+    Loads the detection and re-identification networks on the device of ``device_type``.
+
+    - Arguments:
+        - device_type: ``gpu`` or ``cpu``
+        - min_size, max_size: detector input resize. Defaults to ``GPU_INPUT_SIZE`` \
+            or ``CPU_INPUT_SIZE``.
+        - nb_threads: on CPU, number of threads used by torch. If None, torch's \
+            default (one per physical core).
+        - script, precision, channels_last: see ``inference.optimize_networks``. \
+            Scripted networks are cached next to the downloaded weights.
+    
+    - Returns:
+        - obj_detect: FRCNN_FPN
+        - reid_network: reid.ResNet, or inference.ReidInference
+    '''
+    if device_type == GPU:
+        device = torch.device('cuda')
+        default_min_size, default_max_size = GPU_INPUT_SIZE
+    else:
+        device = torch.device('cpu')
+        default_min_size, default_max_size = CPU_INPUT_SIZE
+        if nb_threads is not None:
+            torch.set_num_threads(nb_threads)
+
+    #1. Load detection model
+    detection_model_path = get_file('detection.pkl', URL_DETECTION_MODEL)
+    obj_detect = FRCNN_FPN(
+        num_classes = 2,
+        min_size = min_size or default_min_size,
+        max_size = max_size or default_max_size
+    )
+    obj_detect.load_state_dict(
+        torch.load(detection_model_path, map_location = lambda storage, loc: storage)
+    )
+    obj_detect.eval()
+    obj_detect.to(device)
+
+    #2. Load re-identification model
+    reid_model_path = get_file('reid.pkl', URL_REID_MODEL)
+    reid_network = resnet50(pretrained = False, **{'output_dim': 128})
+    reid_network.load_state_dict(
+        torch.load(reid_model_path, map_location = lambda storage, loc: storage)
+    )
+    reid_network.eval()
+    reid_network.to(device)
+
+    return optimize_networks(
+        obj_detect,
+        reid_network,
+        precision = precision,
+        channels_last = channels_last,
+        script = script,
+        detection_weights_path = detection_model_path,
+        reid_weights_path = reid_model_path
+    )
+
+def _flush_interpolator(interpolator, flush_callback, logger):
+    '''
+    Gives the frames that ``interpolator`` still holds to ``flush_callback``, or \
+        logs that they are dropped.
+    '''
+    frames = interpolator.flush()
+    if flush_callback is not None:
+        flush_callback(frames)
+    elif len(frames):
+        logger.warning(f'Dropped the interpolated tracks of the last {len(frames)} frames; '
+                        'pass flush_callback to get them')
+
+class FrameDelay(OneTaskProcessorNode):
+    '''
+    Returns its input of ``delay`` calls before, and its first input during the \
+        first ``delay`` calls. With ``delay = INACTIVE_PATIENCE``, it pairs frames \
+        with the tracks of Tracktor nodes that interpolate, for example for annotators.
+
+    - Arguments:
+        - delay: number of calls by which inputs are delayed
+    '''
+    def __init__(self, delay = INACTIVE_PATIENCE):
+        self._delay = delay
+        self._inputs = None
+        super(FrameDelay, self).__init__()
+
+    def open(self):
+        self._inputs = deque(maxlen = self._delay + 1)
+
+    def process(self, inp):
+        self._inputs.append(inp)
+        return self._inputs[0]
+
 class TracktorFromFrames(OneTaskProcessorNode):
     '''
     Tracktor algorithm with REID taken from
     https://github.com/phil-bergmann/tracking_wo_bnw
+
+    - Arguments:
+        - interpolate: If True, the boxes of tracks lost for at most ``INACTIVE_PATIENCE`` \
+            frames are filled in by linear interpolation. The tracks of each frame \
+            are then returned ``INACTIVE_PATIENCE`` frames later, and empty before: \
+            pair them with the frames delayed by ``FrameDelay(INACTIVE_PATIENCE)``.
+        - flush_callback: If given with ``interpolate``, called by ``close`` with the \
+            list of the tracks of the last ``INACTIVE_PATIENCE`` frames, which cannot \
+            be passed down the flow once it has stopped.
+        - device_type: ``gpu`` or ``cpu``. The networks and the tracker run on it.
+        - min_size, max_size: detector input resize. If None, ``GPU_INPUT_SIZE`` \
+            or ``CPU_INPUT_SIZE`` depending on the device.
+        - nb_threads: on CPU, number of threads used by torch. If None, torch's default.
+        - align: If True, track boxes follow the camera motion, estimated with ECC \
+            between consecutive frames. Use it with moving cameras.
+        - align_max_size: longest side of the downscaled frames on which the camera \
+            motion is estimated. Lower is faster.
+        - script: If True, the networks are compiled with TorchScript once and \
+            cached next to their weights, or in ``inference.CACHE_DIR``.
+        - precision: ``float32``, ``float16`` or ``bfloat16``. The convolutions run \
+            with autocast to it where the device supports it.
+        - channels_last: If True, convolutions use the channels-last memory format.
     '''
 
-    def __init__(self, interpolate = False):
+    def __init__(self, interpolate = False, device_type = GPU, min_size = None, max_size = None,
+                nb_threads = None, align = False, align_max_size = 320, script = False,
+                precision = 'float32', channels_last = False, flush_callback = None):
         self._tracker = None
         self._interpolate = interpolate
-        super(TracktorFromFrames, self).__init__(device_type = 'gpu')
+        self._interpolator = None
+        self._flush_callback = flush_callback
+        self._min_size = min_size
+        self._max_size = max_size
+        self._nb_threads = nb_threads
+        self._align = align
+        self._align_max_size = align_max_size
+        self._script = script
+        self._precision = precision
+        self._channels_last = channels_last
+        super(TracktorFromFrames, self).__init__(device_type = device_type)
     
     def _transform(self, pic):
         if pic.ndim == 2:
@@ -39,25 +179,11 @@ class TracktorFromFrames(OneTaskProcessorNode):
             return img
         
     def open(self):
-        #1. Load detection model
-        detection_model_path = get_file('detection.pkl', URL_DETECTION_MODEL)
-        obj_detect = FRCNN_FPN(num_classes = 2)
-        obj_detect.load_state_dict(
-            torch.load(detection_model_path, map_location = lambda storage, loc: storage)
-        )
-        obj_detect.eval()
-        obj_detect.cuda()
-
-        #2. Load re-identification model
-        reid_model_path = get_file('reid.pkl', URL_REID_MODEL)
-        reid_network = resnet50(pretrained = False, **{'output_dim': 128})
-        reid_network.load_state_dict(
-            torch.load(reid_model_path, map_location = lambda storage, loc: storage)
-        )
-        reid_network.eval()
-        reid_network.cuda()
+        obj_detect, reid_network = _load_networks(
+            self.device_type, self._min_size, self._max_size, self._nb_threads,
+            self._script, self._precision, self._channels_last)
 
-        #3. Creater tracker
+        #2. Create tracker
         self._tracker = Tracker(
             obj_detect, 
             reid_network, 
@@ -66,7 +192,7 @@ class TracktorFromFrames(OneTaskProcessorNode):
             detection_nms_thresh = 0.3,
             regression_nms_thresh = 0.6,
             public_detections = False,
-            inactive_patience = 10,
+            inactive_patience = INACTIVE_PATIENCE,
             do_reid = True,
             max_features_num = 10,
             reid_sim_threshold = 2.0,
@@ -79,8 +205,16 @@ class TracktorFromFrames(OneTaskProcessorNode):
             warp_mode = 'cv2.MOTION_EUCLIDEAN',
             number_of_iterations = 100,
             termination_eps = 0.00001,
-            do_align = False
+            do_align = self._align,
+            results_window = 1,
+            align_max_size = self._align_max_size
         )
+        if self._interpolate:
+            self._interpolator = StreamingInterpolator(INACTIVE_PATIENCE)
+
+    def close(self):
+        if self._interpolator is not None:
+            _flush_interpolator(self._interpolator, self._flush_callback, self._logger)
 
     def process(self, frame):
         '''
@@ -94,16 +228,36 @@ class TracktorFromFrames(OneTaskProcessorNode):
 
         t_frame = self._transform(frame)
         t_frame.unsqueeze_(0)
-        self._tracker.step({'img': t_frame})
+        with torch.no_grad():
+            self._tracker.step({'img': t_frame})
         results = self._tracker.get_current_tracks()
+        if self._interpolator is not None:
+            results = self._interpolator.update(results)
+            if results is None:
+                results = np.zeros((0, 6))
         return results
     
 
 class TracktorFromBoxes(OneTaskProcessorNode):
-    def __init__(self, interpolate = False):
+    '''
+    ``TracktorFromFrames`` on given detections. It takes the same arguments.
+    '''
+    def __init__(self, interpolate = False, device_type = GPU, min_size = None, max_size = None,
+                nb_threads = None, align = False, align_max_size = 320, script = False,
+                precision = 'float32', channels_last = False, flush_callback = None):
         self._tracker = None
         self._interpolate = interpolate
-        super(TracktorFromBoxes, self).__init__(device_type = 'gpu')
+        self._interpolator = None
+        self._flush_callback = flush_callback
+        self._min_size = min_size
+        self._max_size = max_size
+        self._nb_threads = nb_threads
+        self._align = align
+        self._align_max_size = align_max_size
+        self._script = script
+        self._precision = precision
+        self._channels_last = channels_last
+        super(TracktorFromBoxes, self).__init__(device_type = device_type)
     
     def _transform_image(self, pic):
         if pic.ndim == 2:
@@ -132,23 +286,9 @@ class TracktorFromBoxes(OneTaskProcessorNode):
         return bboxes, scores
     
     def open(self):
-        #1. Load detection model
-        detection_model_path = get_file('detection.pkl', URL_DETECTION_MODEL)
-        obj_detect = FRCNN_FPN(num_classes = 2)
-        obj_detect.load_state_dict(
-            torch.load(detection_model_path, map_location = lambda storage, loc: storage)
-        )
-        obj_detect.eval()
-        obj_detect.cuda()
-
-        #1. Load re-identification model
-        reid_model_path = get_file('reid.pkl', URL_REID_MODEL)
-        reid_network = resnet50(pretrained = False, **{'output_dim': 128})
-        reid_network.load_state_dict(
-            torch.load(reid_model_path, map_location = lambda storage, loc: storage)
-        )
-        reid_network.eval()
-        reid_network.cuda()
+        obj_detect, reid_network = _load_networks(
+            self.device_type, self._min_size, self._max_size, self._nb_threads,
+            self._script, self._precision, self._channels_last)
 
         #2. Create tracker
         self._tracker = Tracker(
@@ -159,7 +299,7 @@ class TracktorFromBoxes(OneTaskProcessorNode):
             detection_nms_thresh = 0.3,
             regression_nms_thresh = 0.6,
             public_detections = True,
-            inactive_patience = 10,
+            inactive_patience = INACTIVE_PATIENCE,
             do_reid = True,
             max_features_num = 10,
             reid_sim_threshold = 2.0,
@@ -172,8 +312,16 @@ class TracktorFromBoxes(OneTaskProcessorNode):
             warp_mode = 'cv2.MOTION_EUCLIDEAN',
             number_of_iterations = 100,
             termination_eps = 0.00001,
-            do_align = False
+            do_align = self._align,
+            results_window = 1,
+            align_max_size = self._align_max_size
         )
+        if self._interpolate:
+            self._interpolator = StreamingInterpolator(INACTIVE_PATIENCE)
+
+    def close(self):
+        if self._interpolator is not None:
+            _flush_interpolator(self._interpolator, self._flush_callback, self._logger)
 
     def process(self, frame, bounding_boxes):
         '''
@@ -189,12 +337,17 @@ class TracktorFromBoxes(OneTaskProcessorNode):
         t_frame = self._transform_image(frame)
         t_bboxes, t_scores = self._transform_bboxes(bounding_boxes)
         t_frame.unsqueeze_(0)
-        self._tracker.step(
-            {
-                'img': t_frame,
-                'boxes': t_bboxes,
-                'scores': t_scores
-            }
-        )
+        with torch.no_grad():
+            self._tracker.step(
+                {
+                    'img': t_frame,
+                    'boxes': t_bboxes,
+                    'scores': t_scores
+                }
+            )
         results = self._tracker.get_current_tracks()
+        if self._interpolator is not None:
+            results = self._interpolator.update(results)
+            if results is None:
+                results = np.zeros((0, 6))
         return results
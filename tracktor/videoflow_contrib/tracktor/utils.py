@@ -1,12 +1,10 @@
 import os
-from collections import defaultdict
+from collections import OrderedDict, defaultdict, deque
 from os import path as osp
 
 import numpy as np
 import torch
 
-from scipy.interpolate import interp1d
-
 def bbox_overlaps(boxes, query_boxes):
     """
     Parameters
@@ -36,36 +34,101 @@ def bbox_overlaps(boxes, query_boxes):
     return out_fn(overlaps)
 
 def interpolate(tracks):
+    '''
+    Fills the frames missing between the first and the last frame of each track \
+        by linear interpolation of its boxes.
+
+    - Arguments:
+        - tracks: dict of track_id -> dict of frame -> np.array [xmin, ymin, xmax, ymax, ...], \
+            as returned by ``Tracker.get_results``
+
+    - Returns:
+        - interpolated: dict of track_id -> dict of frame -> np.array [xmin, ymin, xmax, ymax]
+    '''
     interpolated = {}
     for i, track in tracks.items():
-        interpolated[i] = {}
-        frames = []
-        x0 = []
-        y0 = []
-        x1 = []
-        y1 = []
-
-        for f, bb in track.items():
-            frames.append(f)
-            x0.append(bb[0])
-            y0.append(bb[1])
-            x1.append(bb[2])
-            y1.append(bb[3])
-
-        if len(frames) > 1:
-            x0_inter = interp1d(frames, x0)
-            y0_inter = interp1d(frames, y0)
-            x1_inter = interp1d(frames, x1)
-            y1_inter = interp1d(frames, y1)
-
-            for f in range(min(frames), max(frames) + 1):
-                bb = np.array([x0_inter(f), y0_inter(f), x1_inter(f), y1_inter(f)])
-                interpolated[i][f] = bb
-        else:
-            interpolated[i][frames[0]] = np.array([x0[0], y0[0], x1[0], y1[0]])
+        frames = np.fromiter(track.keys(), dtype = int, count = len(track))
+        boxes = np.array([bb[:4] for bb in track.values()], dtype = np.float64)
+        order = np.argsort(frames)
+        frames, boxes = frames[order], boxes[order]
+
+        all_frames = np.arange(frames[0], frames[-1] + 1)
+        all_boxes = np.stack([np.interp(all_frames, frames, boxes[:, k]) for k in range(4)], axis = 1)
+        interpolated[i] = dict(zip(all_frames.tolist(), all_boxes))
 
     return interpolated
 
+class StreamingInterpolator(object):
+    '''
+    Online version of ``interpolate``: the tracks of each frame are returned \
+        ``max_gap`` frames later, with the boxes of the tracks that were missing for \
+        at most ``max_gap`` frames filled by linear interpolation. The work per frame \
+        is proportional to the number of tracks in it, plus the boxes filled.
+
+    - Arguments:
+        - max_gap: longest gap that is filled, and delay of the output in frames
+    '''
+    def __init__(self, max_gap):
+        self.max_gap = max_gap
+        self.reset()
+
+    def reset(self):
+        # Frames not returned yet, oldest first: list of rows [xmin, ymin, xmax, ymax, score, track_id]
+        self._frames = deque()
+        self._first_frame = 0
+        # track_id -> (frame, row) of the last frame where the track was seen,
+        # least recently seen first
+        self._last_seen = OrderedDict()
+
+    def update(self, tracks):
+        '''
+        - Arguments:
+            - tracks: np.array of shape (nb_tracks, [xmin, ymin, xmax, ymax, score, track_id]), \
+                the tracks of the next frame, as returned by ``Tracker.get_current_tracks``
+
+        - Returns:
+            - tracks: np.array of shape (nb_tracks, 6) of the frame ``max_gap`` frames \
+                before, or None during the first ``max_gap`` frames
+        '''
+        frame = self._first_frame + len(self._frames)
+        tracks = np.asarray(tracks, dtype = np.float64).reshape(-1, 6)
+        self._frames.append([tracks])
+        for row in tracks:
+            track_id = int(row[5])
+            if track_id in self._last_seen:
+                last_frame, last_row = self._last_seen[track_id]
+                gap = frame - last_frame - 1
+                if 0 < gap <= self.max_gap:
+                    alphas = np.arange(1, gap + 1)[:, None] / (gap + 1)
+                    filled = last_row + alphas * (row - last_row)
+                    filled[:, 5] = track_id
+                    for k in range(gap):
+                        self._frames[last_frame + 1 + k - self._first_frame].append(filled[k:k + 1])
+            self._last_seen[track_id] = (frame, row)
+            self._last_seen.move_to_end(track_id)
+
+        if len(self._frames) <= self.max_gap:
+            return None
+        return self._pop()
+
+    def flush(self):
+        '''
+        - Returns:
+            - frames: list of np.array of shape (nb_tracks, 6), the frames not returned yet
+        '''
+        frames = []
+        while len(self._frames):
+            frames.append(self._pop())
+        return frames
+
+    def _pop(self):
+        tracks = np.concatenate(self._frames.popleft(), axis = 0)
+        self._first_frame += 1
+        # Tracks not seen since before the returned frame can not be filled anymore
+        while len(self._last_seen) and next(iter(self._last_seen.values()))[0] < self._first_frame - 1:
+            self._last_seen.popitem(last = False)
+        return tracks
+
 def bbox_transform_inv(boxes, deltas):
     # Input should be both tensor or both Variable and on the same device
     if len(boxes) == 0:
@@ -116,7 +179,7 @@ def get_center(pos):
     y1 = pos[0, 1]
     x2 = pos[0, 2]
     y2 = pos[0, 3]
-    return torch.Tensor([(x2 + x1) / 2, (y2 + y1) / 2]).cuda()
+    return torch.stack([(x2 + x1) / 2, (y2 + y1) / 2])
 
 def get_width(pos):
     return pos[0, 2] - pos[0, 0]
@@ -127,17 +190,29 @@ def get_height(pos):
 
 
 def make_pos(cx, cy, width, height):
-    return torch.Tensor([[
+    return torch.stack([
         cx - width / 2,
         cy - height / 2,
         cx + width / 2,
         cy + height / 2
-    ]]).cuda()
+    ]).view(1, -1)
 
 
 def warp_pos(pos, warp_matrix):
-    p1 = torch.Tensor([pos[0, 0], pos[0, 1], 1]).view(3, 1)
-    p2 = torch.Tensor([pos[0, 2], pos[0, 3], 1]).view(3, 1)
-    p1_n = torch.mm(warp_matrix, p1).view(1, 2)
-    p2_n = torch.mm(warp_matrix, p2).view(1, 2)
-    return torch.cat((p1_n, p2_n), 1).view(1, -1).cuda()
\ No newline at end of file
+    '''
+    Warps boxes by moving their top left and bottom right corners.
+
+    - Arguments:
+        - pos: tensor of shape (nb_boxes, [xmin, ymin, xmax, ymax])
+        - warp_matrix: tensor of shape (2, 3) for an affine warp, or (3, 3) \
+            for a homography
+
+    - Returns:
+        - pos: tensor of shape (nb_boxes, 4), on the device of ``pos``
+    '''
+    warp_matrix = warp_matrix.to(pos)
+    corners = pos.reshape(-1, 2)
+    warped = corners @ warp_matrix[:, :2].t() + warp_matrix[:, 2]
+    if warp_matrix.size(0) == 3:
+        warped = warped[:, :2] / warped[:, 2:]
+    return warped.reshape(-1, 4)